@@ -1,23 +1,54 @@
+import argparse
 import os
 import subprocess
+import sys
+import time
 import traceback
 from pathlib import Path
+from typing import Optional
 
 import inquirer
 from loguru import logger
 from managers.apps_manager import AppsManager
+from managers.aur_build_manager import AurBuildManager
+from managers.bundle_manager import BundleManager
 from managers.chaotic_aur_manager import ChaoticAurManager
+from managers.custom_apps.grub import GrubConfigurer
+from managers.custom_apps.plymouth import PlymouthConfigurer
 from managers.drivers_manager import ChdwManager
 from managers.filesystem_manager import FileSystemManager
 from managers.package_manager import PackageManager
+from managers.peer_cache_manager import PeerCacheManager
 from managers.post_install_manager import PostInstallation
+from managers.prefetch_manager import PackagePrefetcher
 from packages import BASE, CUSTOM
 from question import Question
+from utils.aur_rpc import AurRpc
+from utils.bootloader import BootloaderManager
+from utils.command_runner import CommandRunner
 from utils.config_backup import ConfigBackup
-from utils.schemes import BuildOptions, NotInstalledPackages, TerminalShell
+from utils.grub_config import GrubConfigEditor
+from utils.initramfs import InitramfsManager
+from utils.mkinitcpio_config import MkinitcpioConfigEditor
+from utils.pacman_conf import PacmanConfTransaction
+from utils.pacman_db import SyncDatabase
+from utils.plan import InstallPlan, ScratchCopy, run_unprivileged, unified_diff
+from utils.privileged_helper import PrivilegedHelper, run_sudo
+from utils.schemes import AurHelper, BuildOptions, NotInstalledPackages, TerminalShell
+from utils.snapshot_backup import SnapshotBackup
+from utils.step_journal import StepJournal
 
 class Builder:
     not_installed_packages = NotInstalledPackages()
+    PACKAGES_FILE = Path(__file__).parent / "packages.py"
+
+    def __init__(
+        self,
+        bundle: Optional[BundleManager] = None,
+        peer_cache: Optional[PeerCacheManager] = None,
+    ):
+        self.bundle = bundle
+        self.peer_cache = peer_cache
 
     def run(self) -> None:
         logger.success(
@@ -26,30 +57,16 @@ class Builder:
         self.build_options: BuildOptions = Question.get_answers()
         logger.info(f"User Responses to Questions: {self.build_options}")
 
-        # Убираем пакеты в зависимости от выбора пользователя
-        if self.build_options.terminal_shell != TerminalShell.ZSH:
-            BASE.pacman.common.remove("zsh")
-            BASE.pacman.common.remove("zsh-syntax-highlighting")
-            BASE.pacman.common.remove("zsh-autosuggestions")
-            BASE.pacman.common.remove("zsh-history-substring-search")
-
-        if self.build_options.terminal_shell != TerminalShell.FISH:
-            BASE.pacman.common.remove("fish")
+        self._apply_package_choices()
 
-        if not self.build_options.install_grub:
-            BASE.aur.common.remove("update-grub")
-
-        if not self.build_options.install_plymouth:
-            BASE.pacman.common.remove("plymouth")
+        # Из бандла всё ставится локально, Chaotic AUR не нужен
+        if self.bundle is not None and self.build_options.use_chaotic_aur:
+            logger.info("Installing from a package bundle, Chaotic AUR will not be used")
+            self.build_options.use_chaotic_aur = False
 
-        if not self.build_options.install_sddm:
-            BASE.pacman.common.remove("sddm")
-        
-        # If dracut is already installed on the system, avoid installing mkinitcpio
-        if PackageManager.check_package_installed("dracut"):
-            if "mkinitcpio" in BASE.pacman.common:
-                BASE.pacman.common.remove("mkinitcpio")
-                logger.info("Detected dracut; skipping mkinitcpio installation.")
+        if self.bundle is not None and self.peer_cache is not None:
+            logger.info("Installing from a package bundle, LAN peers will not be used")
+            self.peer_cache = None
 
         # Проверка существующей установки
         if self._check_existing_installation():
@@ -59,76 +76,120 @@ class Builder:
             ):
                 return
 
+        # Один процесс с правами root на всю установку вместо sudo на каждый файл
+        PrivilegedHelper.start()
+
         # Создаём временный маркер начала установки
         self._create_installation_marker()
+        self.journal = StepJournal(self._user_dir()).load()
+        self._source_revision = self._get_source_revision()
+        self._deferred_steps: list[tuple[str, str, set]] = []
+        self._chwd = ChdwManager()
+        self._chwd_prepared = False
+
+        if self.peer_cache is not None:
+            self.peer_cache.start()
 
         try:
             if self.build_options.make_backup:
-                logger.info(
-                    "The process of creating a backup of configurations is started!"
-                )
-                FileSystemManager.make_backup()
-                logger.warning(
-                    "A backup of all your configuration files is located "
-                    'in the root of the meowrch at the path "./backup/"'
-                )
-                logger.warning("Check the backup before you start the installation")
-                input("Press Enter to continue with the installation: ")
-
-            FileSystemManager.create_default_folders()
-            FileSystemManager.copy_dotfiles(
-                exclude_bspwm=not self.build_options.install_bspwm,
-                exclude_hyprland=not self.build_options.install_hyprland,
-            )
+                self._step("make_backup", self._make_backup)
 
             # Backup all critical system configs before any modifications
-            ConfigBackup.backup_all()
-
-            # Включаем multilib и обновляем базу данных
-            PackageManager.update_pacman_conf(enable_multilib=True)
-            PackageManager.update_database()
-
-            # Установка Chaotic AUR
-            if self.build_options.use_chaotic_aur:
-                logger.info("Setting up Chaotic AUR...")
-                ChaoticAurManager.install()
-
-            PackageManager.install_aur_helper(self.build_options.aur_helper)
+            self._step("config_backup", ConfigBackup.backup_all)
+
+            # Настраиваем pacman.conf (multilib, Chaotic AUR, репозиторий chwd) и обновляем базу данных
+            self._step("pacman_setup", self._setup_pacman, self.build_options.use_chaotic_aur)
+            # Пиры должны стоять первыми и в новых репозиториях
+            self._activate_peers()
+
+            # Базы синхронизированы, пакеты распределяются между репозиториями и AUR один раз.
+            # Недоступные пакеты входят в хэш шага: когда они появятся, шаг повторится
+            pacman, aur, unavailable = self._route_packages(*self._collect_selected_packages())
+            packages_inputs = (
+                (pacman, aur),
+                unavailable,
+                self.build_options.aur_helper,
+                self.build_options.use_chaotic_aur,
+                # Незакоммиченные правки списков пакетов не меняют ревизию git
+                StepJournal.hash_files(self.PACKAGES_FILE),
+            )
+            # Скачиваем пакеты и AUR исходники в фоне, пока идут следующие шаги
+            prefetcher = self._start_prefetch(packages_inputs)
+
+            self._step(
+                "dotfiles",
+                self._copy_dotfiles,
+                self.build_options.install_bspwm,
+                self.build_options.install_hyprland,
+            )
 
-            self.packages_installation()
+            self._step(
+                "aur_helper",
+                self._install_aur_helper,
+                self.build_options.aur_helper,
+                self.build_options.use_chaotic_aur,
+            )
+            with CommandRunner.phase("prefetch_wait"):
+                prefetcher.wait()
+            # Скорость канала измерена на первых загрузках
+            if prefetcher.parallel_downloads is not None:
+                PackageManager.set_parallel_downloads(prefetcher.parallel_downloads)
+            self._step("packages", lambda: self.packages_installation(pacman, aur), *packages_inputs)
 
             # Установка драйверов через chwd
-            ChdwManager().install()
+            self._step("drivers", lambda: self._chwd.install(prepared=self._chwd_prepared))
 
+            # Шаги, меняющие загрузку, считаются завершёнными только после пересборки образов
             if self.build_options.install_grub:
-                AppsManager.configure_grub()
+                self._step("grub", AppsManager.configure_grub, deferred=True)
 
             if self.build_options.install_sddm:
-                AppsManager.configure_sddm()
+                self._step("sddm", AppsManager.configure_sddm)
 
             if self.build_options.install_plymouth:
-                AppsManager.configure_plymouth(
-                    allow_grub_config=self.build_options.install_grub
+                self._step(
+                    "plymouth",
+                    lambda: AppsManager.configure_plymouth(
+                        allow_grub_config=self.build_options.install_grub
+                    ),
+                    self.build_options.install_grub,
+                    deferred=True,
                 )
 
-            AppsManager.configure_firefox(
-                darkreader=self.build_options.ff_darkreader,
-                ublock=self.build_options.ff_ublock,
-                twp=self.build_options.ff_twp,
-                unpaywall=self.build_options.ff_unpaywall,
-                vot=self.build_options.ff_vot,
+            self._step(
+                "firefox",
+                lambda: AppsManager.configure_firefox(
+                    darkreader=self.build_options.ff_darkreader,
+                    ublock=self.build_options.ff_ublock,
+                    twp=self.build_options.ff_twp,
+                    unpaywall=self.build_options.ff_unpaywall,
+                    vot=self.build_options.ff_vot,
+                ),
+                self.build_options.ff_darkreader,
+                self.build_options.ff_ublock,
+                self.build_options.ff_twp,
+                self.build_options.ff_unpaywall,
+                self.build_options.ff_vot,
             )
-            AppsManager.configure_code()
+            self._step("code", AppsManager.configure_code)
 
             if self.build_options.install_hyprland:
-                AppsManager.configure_mewline()
+                self._step("mewline", AppsManager.configure_mewline)
+
+            self._step("pawlette", AppsManager.configure_pawlette)
 
-            AppsManager.configure_pawlette()
+            # Пересобираем initramfs и grub.cfg один раз за всю установку
+            self._flush_post_actions()
 
-            self.daemons_setting()
-            PostInstallation.apply(self.build_options)
+            self._step("daemons", self.daemons_setting, self.build_options.install_sddm)
+            self._step(
+                "post_installation",
+                lambda: PostInstallation.apply(self.build_options),
+                self.build_options.terminal_shell,
+            )
 
             self._remove_installation_marker()
+            self.journal.forget()
 
             logger.warning(
                 "The script was unable to automatically install these packages."
@@ -139,27 +200,330 @@ class Builder:
             logger.success(
                 "Meowrch has been successfully installed! Restart your PC to apply the changes."
             )
+
+            # Остальные машины в сети могут ещё качать пакеты с этой (--share-linger)
+            if self.peer_cache is not None:
+                self.peer_cache.linger()
         except BaseException:
             logger.error(f"Installation failed: {traceback.format_exc()}")
+            # Не оставляем изменённые конфиги без пересобранных образов
+            self._flush_post_actions()
             self._cleanup_failed_installation()
             raise
+        finally:
+            if self.peer_cache is not None:
+                self.peer_cache.deactivate()
+                self.peer_cache.stop()
+            PrivilegedHelper.stop()
+            CommandRunner.write_report(Path("build_timings.json"))
+
+    def plan(self) -> InstallPlan:
+        """Compute what an installation with the default answers would change.
+
+        Nothing is installed, copied or written: config edits are made by the
+        regular editors on scratch copies and reported as diffs.
+        """
+        started = time.monotonic()
+        self.build_options = Question.get_default_answers()
+        self._apply_package_choices()
+        plan = InstallPlan()
+
+        pacman, aur = self._collect_selected_packages()
+        index = PackageManager.local_index
+        if index.available():
+            plan.pacman_packages = [p for p in pacman if not index.is_satisfied(p)]
+            plan.aur_packages = [p for p in aur if not index.is_satisfied(p)]
+        else:
+            plan.pacman_packages, plan.aur_packages = pacman, aur
+            plan.notes.append("Local pacman database not found, all selected packages are listed")
+
+        plan.dotfiles = FileSystemManager.diff_dotfiles(
+            exclude_bspwm=not self.build_options.install_bspwm,
+            exclude_hyprland=not self.build_options.install_hyprland,
+        )
+        self._plan_config_edits(plan)
+        self._plan_services(plan)
+
+        plan.notes.append("Answers: survey defaults")
+        plan.notes.append(f"Planned in {time.monotonic() - started:.2f}s")
+        return plan
+
+    def _plan_config_edits(self, plan: InstallPlan) -> None:
+        pacman_conf = Path("/etc/pacman.conf")
+        if pacman_conf.is_file():
+            before = pacman_conf.read_text()
+            after = "".join(
+                PackageManager.render_pacman_conf(
+                    before.splitlines(keepends=True), enable_multilib=True
+                )
+            )
+            if self.build_options.use_chaotic_aur:
+                after = ChaoticAurManager.render_pacman_conf(after)
+            diff = unified_diff(str(pacman_conf), before, after)
+            if diff:
+                plan.config_edits[str(pacman_conf)] = diff
+
+        # Редакторы работают с копиями конфигов, оригиналы не трогаются
+        mkinitcpio_conf = Path("/etc/mkinitcpio.conf")
+        if self.build_options.install_plymouth and mkinitcpio_conf.is_file():
+            if InitramfsManager().detect_tool() == "mkinitcpio":
+                with ScratchCopy(mkinitcpio_conf) as scratch:
+                    editor = MkinitcpioConfigEditor(scratch.copy)
+                    editor._run_sudo = run_unprivileged
+                    InitramfsManager().configure_mkinitcpio_for_plymouth(editor)
+                    if scratch.diff():
+                        plan.config_edits[str(mkinitcpio_conf)] = scratch.diff()
+            else:
+                plan.notes.append("dracut detected, a plymouth dracut config will be written")
+
+        grub_conf = Path("/etc/default/grub")
+        if (
+            self.build_options.install_grub
+            and grub_conf.is_file()
+            and BootloaderManager().detect_bootloader_type() == "grub"
+        ):
+            with ScratchCopy(grub_conf) as scratch:
+                editor = GrubConfigEditor(scratch.copy)
+                editor._run_sudo = run_unprivileged
+                if self.build_options.install_plymouth:
+                    editor.add_cmdline_params(
+                        PlymouthConfigurer().required_grub_params, update_grub=False
+                    )
+                theme_setting = f"GRUB_THEME={GrubConfigurer().theme_path}/theme.txt"
+                scratch.copy.write_text(
+                    GrubConfigurer.render_theme_setting(scratch.copy.read_text(), theme_setting)
+                )
+                if scratch.diff():
+                    plan.config_edits[str(grub_conf)] = scratch.diff()
+
+    def _plan_services(self, plan: InstallPlan) -> None:
+        daemons, user_daemons = self._daemons()
+        system_units = list(daemons["enable"])
+        if self.build_options.install_plymouth:
+            system_units.append("plymouth-wait-for-animation.service")
+
+        plan.services = [u for u in system_units if not self._unit_enabled(u)]
+        plan.user_services = [
+            u for u in user_daemons["enable"] if not self._unit_enabled(u, user=True)
+        ]
+
+    @staticmethod
+    def _unit_enabled(unit: str, user: bool = False) -> bool:
+        command = ["systemctl", "--user"] if user else ["systemctl"]
+        try:
+            return subprocess.run(
+                [*command, "is-enabled", "--quiet", unit],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                timeout=5,
+            ).returncode == 0
+        except Exception:
+            return False
+
+    def _apply_package_choices(self) -> None:
+        # Убираем пакеты в зависимости от выбора пользователя
+        if self.build_options.terminal_shell != TerminalShell.ZSH:
+            BASE.pacman.common.remove("zsh")
+            BASE.pacman.common.remove("zsh-syntax-highlighting")
+            BASE.pacman.common.remove("zsh-autosuggestions")
+            BASE.pacman.common.remove("zsh-history-substring-search")
 
+        if self.build_options.terminal_shell != TerminalShell.FISH:
+            BASE.pacman.common.remove("fish")
 
-    def packages_installation(self) -> None:
+        if not self.build_options.install_grub:
+            BASE.aur.common.remove("update-grub")
+
+        if not self.build_options.install_plymouth:
+            BASE.pacman.common.remove("plymouth")
+
+        if not self.build_options.install_sddm:
+            BASE.pacman.common.remove("sddm")
+        
+        # If dracut is already installed on the system, avoid installing mkinitcpio
+        if PackageManager.check_package_installed("dracut"):
+            if "mkinitcpio" in BASE.pacman.common:
+                BASE.pacman.common.remove("mkinitcpio")
+                logger.info("Detected dracut; skipping mkinitcpio installation.")
+
+    def _step(self, name: str, func, *inputs, deferred: bool = False) -> None:
+        """Run an installation step unless the journal says it is already done
+
+        A step whose function returns False is considered incomplete and will be
+        repeated on the next run.
+        """
+        inputs_hash = StepJournal.hash_inputs(self._source_revision, *inputs)
+        if self.journal.is_done(name, inputs_hash):
+            logger.info(f'Step "{name}" was completed by a previous run, skipping it')
+            return
+
+        requested = AppsManager.post_actions.requests()
+        with CommandRunner.phase(name):
+            completed = func() is not False
+
+        if not completed:
+            logger.warning(f'Step "{name}" did not complete, it will be repeated on the next run')
+            return
+
+        if deferred:
+            # Отложенные пересборки, которые запросил этот шаг
+            actions = {
+                action
+                for action, count in AppsManager.post_actions.requests().items()
+                if count > requested.get(action, 0)
+            }
+            self._deferred_steps.append((name, inputs_hash, actions))
+        else:
+            self.journal.mark_done(name, inputs_hash)
+
+    def _flush_post_actions(self) -> None:
+        """Run the deferred regenerations and journal the steps that requested them
+
+        A step stays undone when one of its regenerations failed, so the next
+        run edits the configs again and rebuilds the images.
+        """
+        with CommandRunner.phase("post_actions"):
+            failed = set(AppsManager.flush_post_actions())
+        for name, inputs_hash, actions in self._deferred_steps:
+            if actions & failed:
+                logger.warning(f'Step "{name}" did not complete, it will be repeated on the next run')
+            else:
+                self.journal.mark_done(name, inputs_hash)
+        self._deferred_steps.clear()
+
+    def _make_backup(self) -> None:
+        logger.info("The process of creating a backup of configurations is started!")
+        snapshot = FileSystemManager.make_backup()
+        if snapshot is not None:
+            logger.warning(
+                "A backup of all your configuration files is located "
+                f'in the root of the meowrch at the path "./{snapshot}/"'
+            )
+            logger.warning('It can be restored with "python Builder/install.py --restore-backup"')
+        logger.warning("Check the backup before you start the installation")
+        input("Press Enter to continue with the installation: ")
+
+    def _setup_pacman(self) -> bool:
+        # Все правки pacman.conf собираются в одну транзакцию и пишутся один раз
+        transaction = PacmanConfTransaction().stage(
+            "meowrch options and multilib",
+            lambda conf: PackageManager.configure_pacman_conf(conf, enable_multilib=True),
+        )
+        if self.bundle is not None:
+            transaction.stage("package bundle", self.bundle.configure_pacman_conf)
+            return transaction.commit() and self.bundle.sync()
+
+        chaotic_ready = True
+        if self.build_options.use_chaotic_aur:
+            logger.info("Setting up Chaotic AUR...")
+            chaotic_ready = ChaoticAurManager.install(transaction=transaction)
+        # Репозиторий chwd должен существовать до того, как pacman его увидит
+        self._chwd_prepared = self._chwd.prepare(transaction)
+
+        if not transaction.commit():
+            self._chwd_prepared = False
+            return False
+        PackageManager.rank_mirrors()
+        PackageManager.update_database()
+        # Нужны фоновой загрузке AUR исходников, которая идёт параллельно со следующими шагами
+        PackageManager.install_packages(["git", "base-devel"])
+        return chaotic_ready
+
+    def _install_aur_helper(self) -> None:
+        aur_helper = self.build_options.aur_helper
+        # Хелпер, собранный на эталонной машине, ставится из бандла
+        if self.bundle is not None and self.bundle.contains(aur_helper.value):
+            PackageManager.install_packages([aur_helper.value])
+            return
+        PackageManager.install_aur_helper(
+            aur_helper, use_chaotic_aur=self.build_options.use_chaotic_aur
+        )
+
+    def _copy_dotfiles(self) -> None:
+        FileSystemManager.create_default_folders()
+        FileSystemManager.copy_dotfiles(
+            exclude_bspwm=not self.build_options.install_bspwm,
+            exclude_hyprland=not self.build_options.install_hyprland,
+        )
+
+    def _activate_peers(self) -> None:
+        # Не шаг журнала: записи пиров удаляются из pacman.conf в конце каждого запуска
+        if self.peer_cache is not None:
+            self.peer_cache.activate()
+
+    @staticmethod
+    def _get_source_revision() -> str:
+        """Revision of the meowrch sources, part of every step's inputs"""
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "HEAD"],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.strip()
+        except Exception:
+            version_file = Path("VERSION")
+            return version_file.read_text().strip() if version_file.exists() else ""
+
+    def _start_prefetch(self, packages_inputs: tuple) -> PackagePrefetcher:
+        """Start downloading the routed repository packages and AUR sources"""
+        prefetcher = PackagePrefetcher(sync_db=self.sync_db)
+
+        # Пакеты уже лежат в бандле
+        if self.bundle is not None:
+            return prefetcher
+
+        # Пакеты уже установлены прошлым запуском, качать нечего
+        packages_hash = StepJournal.hash_inputs(self._source_revision, *packages_inputs)
+        if self.journal.is_done("packages", packages_hash):
+            return prefetcher
+
+        # Пакеты из Chaotic AUR уже перенесены в список pacman, в aur только то, что собирается
+        (pacman, aur), *_ = packages_inputs
+        prefetcher.start(pacman, aur)
+        return prefetcher
+
+    def packages_installation(self, pacman: list[str], aur: list[str]) -> bool:
+        """Install the routed packages
+
+        Returns:
+            bool: Whether every available package was installed. Packages that
+                exist nowhere are reported but do not keep the step incomplete.
+        """
         logger.info("Starting the package installation process")
-        pacman, aur = self._collect_selected_packages()
 
         # Устанавливаем pacman пакеты
-        self.not_installed_packages.pacman.extend(
-            PackageManager.install_packages(pacman)
-        )
+        failed_pacman = PackageManager.install_packages(pacman, single_transaction=True)
 
-        # Устанавливаем aur пакеты
-        self.not_installed_packages.aur.extend(
-            PackageManager.install_packages(aur, aur=self.build_options.aur_helper)
+        # Собираем aur пакеты параллельно, то что не собралось - через AUR хелпер
+        not_built = AurBuildManager(sync_db=self.sync_db).install(aur)
+        failed_aur = PackageManager.install_packages(
+            not_built, aur=self.build_options.aur_helper, single_transaction=True
         )
 
+        self.not_installed_packages.pacman.extend(failed_pacman)
+        self.not_installed_packages.aur.extend(failed_aur)
         logger.success("The installation process of all packages is complete!")
+        return not (failed_pacman or failed_aur)
+
+    @staticmethod
+    def make_bundle(path: Path) -> bool:
+        """Bundle every catalogue package installed on this machine"""
+        return BundleManager(path).create(Builder._catalogue_packages())
+
+    @staticmethod
+    def _catalogue_packages() -> list[str]:
+        packages: list[str] = []
+        for distribution in (BASE.pacman, BASE.aur):
+            packages.extend(distribution.common)
+            packages.extend(distribution.bspwm_packages)
+            packages.extend(distribution.hyprland_packages)
+
+        for category in CUSTOM.values():
+            packages.extend(category.keys())
+
+        packages.extend(helper.value for helper in AurHelper)
+        return list(dict.fromkeys(packages))
 
     def _collect_selected_packages(self):
         pacman: list[str] = []
@@ -187,9 +551,46 @@ class Builder:
         aur = list(dict.fromkeys(aur))
         return pacman, aur
 
-    def daemons_setting(self) -> None:
-        logger.info("The daemons are starting to run...")
+    def _route_packages(self, pacman: list[str], aur: list[str]):
+        """Check the selection against the sync DBs and the AUR before installing.
 
+        Packages that moved between the repositories and the AUR are handed to
+        the right installer, packages that exist nowhere are reported right away
+        instead of failing a transaction.
+
+        Returns:
+            tuple: Repository packages, AUR packages and unavailable packages
+        """
+        # Репозитории могли измениться (Chaotic AUR), читаем базы заново
+        self.sync_db = SyncDatabase()
+        sync_db = self.sync_db
+        if not sync_db.db_path.is_dir():
+            logger.warning("Sync databases not found, skipping package pre-validation")
+            return pacman, aur, []
+
+        try:
+            sync_db.load()
+            not_in_repos = [p for p in pacman + aur if not sync_db.has_package(p)]
+            try:
+                aur_packages = set(AurRpc().existing(not_in_repos)) if not_in_repos else set()
+            except Exception as e:
+                logger.warning(f"Could not query the AUR, assuming it provides the rest: {e}")
+                aur_packages = None
+
+            routed_pacman, routed_aur, missing = sync_db.route(pacman, aur, aur_packages)
+        except Exception:
+            logger.error(f"Package pre-validation failed: {traceback.format_exc()}")
+            return pacman, aur, []
+
+        for package in missing:
+            if package in aur:
+                self.not_installed_packages.aur.append(package)
+            else:
+                self.not_installed_packages.pacman.append(package)
+
+        return routed_pacman, routed_aur, missing
+
+    def _daemons(self) -> tuple[dict, dict]:
         daemons = {
             "enable": ["NetworkManager", "bluetooth.service"],
             "start": ["bluetooth.service"],
@@ -202,6 +603,11 @@ class Builder:
             "enable": ["battery-monitor.timer"],
             "start": ["battery-monitor.timer"],
         }
+        return daemons, user_daemons
+
+    def daemons_setting(self) -> None:
+        logger.info("The daemons are starting to run...")
+        daemons, user_daemons = self._daemons()
 
         error_msg = 'Daemon "{name}" {action} error: {err}'
 
@@ -233,9 +639,13 @@ class Builder:
 
         logger.success("The setting of the daemons is complete!")
 
+    @staticmethod
+    def _user_dir() -> Path:
+        return Path(f"/usr/local/share/meowrch/users/{os.getenv('USER')}")
+
     def _remove_installation_marker(self) -> None:
-        base_dir = Path(f"/usr/local/share/meowrch/users/{os.getenv('USER')}")
-        subprocess.run(["sudo", "rm", "-f", str(base_dir / ".installing")], check=False)
+        base_dir = self._user_dir()
+        run_sudo(["rm", "-f", str(base_dir / ".installing")], check=False)
 
     def _check_existing_installation(self) -> bool:
         version_file = Path(
@@ -245,13 +655,14 @@ class Builder:
 
     def _create_installation_marker(self) -> None:
         base_dir = Path(f"/usr/local/share/meowrch/users/{os.getenv('USER')}")
-        subprocess.run(["sudo", "mkdir", "-p", str(base_dir)], check=True)
+        run_sudo(["mkdir", "-p", str(base_dir)], check=True)
 
         # Временный файл для отслеживания процесса
-        subprocess.run(
-            ["sudo", "tee", str(base_dir / ".installing")],
-            input=b"installation_in_progress",
+        run_sudo(
+            ["tee", str(base_dir / ".installing")],
+            input="installation_in_progress",
             stdout=subprocess.DEVNULL,
+            text=True,
             check=True,
         )
 
@@ -259,12 +670,103 @@ class Builder:
         base_dir = Path(f"/usr/local/share/meowrch/users/{os.getenv('USER')}")
 
         # Удаляем временный маркер
-        subprocess.run(["sudo", "rm", "-f", str(base_dir / ".installing")], check=False)
+        run_sudo(["rm", "-f", str(base_dir / ".installing")], check=False)
 
         logger.warning("Installation markers cleaned up due to failure")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Meowrch installer")
+    parser.add_argument(
+        "--plan",
+        nargs="?",
+        const="text",
+        choices=["text", "json"],
+        help="print what the installation would change and exit without changing anything",
+    )
+    parser.add_argument(
+        "--bundle",
+        type=Path,
+        metavar="DIR",
+        help="install packages offline from a bundle made with --make-bundle",
+    )
+    parser.add_argument(
+        "--make-bundle",
+        type=Path,
+        metavar="DIR",
+        help="collect the packages installed on this machine into a bundle and exit",
+    )
+    parser.add_argument(
+        "--share-cache",
+        action="store_true",
+        help="share downloaded and built packages with other installers on the LAN",
+    )
+    parser.add_argument(
+        "--peer",
+        action="append",
+        default=[],
+        metavar="HOST[:PORT]",
+        help="package cache peer to use in addition to the discovered ones (implies --share-cache)",
+    )
+    parser.add_argument(
+        "--share-linger",
+        type=int,
+        default=0,
+        metavar="SECONDS",
+        help="keep sharing the package cache for this long after the installation (with --share-cache)",
+    )
+    parser.add_argument(
+        "--list-backups",
+        action="store_true",
+        help="list the backup snapshots in ./backup and exit",
+    )
+    parser.add_argument(
+        "--restore-backup",
+        nargs="?",
+        const="latest",
+        metavar="SNAPSHOT",
+        help="restore a backup snapshot (the latest by default) into the home directory and exit",
+    )
+    parser.add_argument(
+        "--export-backup",
+        nargs="+",
+        metavar=("FILE", "SNAPSHOT"),
+        help="export a backup snapshot (the latest by default) as a tar.zst archive and exit",
+    )
+    parser.add_argument(
+        "--force-initramfs",
+        action="store_true",
+        help="rebuild the initramfs images even if their inputs did not change since the last build",
+    )
+    args = parser.parse_args()
+    if args.export_backup and len(args.export_backup) > 2:
+        parser.error("--export-backup takes FILE and an optional SNAPSHOT")
+
+    if args.list_backups or args.restore_backup or args.export_backup:
+        backups = SnapshotBackup()
+        if args.list_backups:
+            for snapshot in backups.list_snapshots():
+                print(snapshot.name)
+            sys.exit(0)
+
+        name = args.restore_backup or (args.export_backup[1] if len(args.export_backup) > 1 else "latest")
+        snapshot = backups.find(name)
+        if snapshot is None:
+            logger.error(f'Backup snapshot "{name}" not found in {backups.snapshots}')
+            sys.exit(1)
+        if args.restore_backup:
+            backups.restore(snapshot)
+        else:
+            backups.export(snapshot, Path(args.export_backup[0]))
+        sys.exit(0)
+
+    if args.plan:
+        logger.remove()
+        logger.add(sys.stderr, level="WARNING")
+        plan = Builder().plan()
+        print(plan.to_json() if args.plan == "json" else plan.render())
+        sys.exit(0)
+
     logger.add(
         sink="build_debug.log",
         format="{time} | {level} | {message}",
@@ -272,5 +774,20 @@ if __name__ == "__main__":
         encoding="utf-8",
     )
 
-    builder = Builder()
+    if args.make_bundle:
+        sys.exit(0 if Builder.make_bundle(args.make_bundle) else 1)
+
+    bundle = None
+    if args.bundle:
+        bundle = BundleManager(args.bundle)
+        if not bundle.load():
+            sys.exit(1)
+
+    peer_cache = None
+    if args.share_cache or args.peer:
+        peer_cache = PeerCacheManager(args.peer, linger_seconds=args.share_linger)
+
+    AppsManager.force_initramfs = args.force_initramfs
+
+    builder = Builder(bundle=bundle, peer_cache=peer_cache)
     builder.run()
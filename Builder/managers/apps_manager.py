@@ -1,3 +1,5 @@
+from typing import List
+
 from .custom_apps.firefox import FirefoxConfigurer
 from .custom_apps.grub import GrubConfigurer
 from .custom_apps.pawlette import PawletteConfigurer
@@ -6,11 +8,25 @@ from .custom_apps.sddm import SDDMConfigurer
 from .custom_apps.vscode import VSCodeConfigurer
 from .custom_apps.mewline import MewlineConfigurer
 
+try:
+    from Builder.utils.post_actions import PostAction, PostActionQueue
+except ImportError:
+    from utils.post_actions import PostAction, PostActionQueue
+
 
 class AppsManager:
+    # Общая очередь: initramfs и grub.cfg пересобираются один раз в конце
+    post_actions = PostActionQueue()
+    # --force-initramfs: пересобрать initramfs, даже если входные данные не изменились
+    force_initramfs = False
+
     @staticmethod
     def configure_plymouth(allow_grub_config: bool = True) -> None:
-        PlymouthConfigurer(allow_grub_config=allow_grub_config).setup()
+        PlymouthConfigurer(
+            allow_grub_config=allow_grub_config,
+            post_actions=AppsManager.post_actions,
+            force_initramfs=AppsManager.force_initramfs,
+        ).setup()
 
     @staticmethod
     def configure_sddm() -> None:
@@ -38,7 +54,7 @@ class AppsManager:
 
     @staticmethod
     def configure_grub() -> None:
-        GrubConfigurer().setup()
+        GrubConfigurer(post_actions=AppsManager.post_actions).setup()
 
     @staticmethod
     def configure_pawlette() -> None:
@@ -46,4 +62,9 @@ class AppsManager:
 
     @staticmethod
     def configure_mewline() -> None:
-        MewlineConfigurer().setup()
\ No newline at end of file
+        MewlineConfigurer().setup()
+
+    @staticmethod
+    def flush_post_actions() -> List[PostAction]:
+        """Run the deferred regenerations, returns the ones that failed"""
+        return AppsManager.post_actions.flush()
@@ -0,0 +1,368 @@
+import os
+import shutil
+import subprocess
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from loguru import logger
+
+from .package_manager import PackageManager
+
+try:
+    from Builder.utils.aur_rpc import AurRpc
+    from Builder.utils.aur_workspace import AurWorkspace
+    from Builder.utils.command_runner import CommandRunner
+    from Builder.utils.pacman_db import LocalPackageIndex, SyncDatabase, strip_version
+except ImportError:
+    from utils.aur_rpc import AurRpc
+    from utils.aur_workspace import AurWorkspace
+    from utils.command_runner import CommandRunner
+    from utils.pacman_db import LocalPackageIndex, SyncDatabase, strip_version
+
+
+@dataclass
+class AurBuildUnit:
+    """One AUR git repository (pkgbase) and the package names needed from it"""
+    pkgbase: str
+    packages: List[str] = field(default_factory=list)
+    depends_on: Set[str] = field(default_factory=set)
+    explicit: bool = False
+    artifacts: List[Path] = field(default_factory=list)
+
+
+class AurBuildManager:
+    """Builds AUR packages in parallel and installs them with pacman -U.
+
+    Independent packages are cloned and built with makepkg concurrently in a
+    bounded worker pool. Packages are scheduled in dependency layers: a layer is
+    only built once everything it depends on has been built and installed.
+    Artifacts that nothing else depends on are installed together in a single
+    ``pacman -U`` transaction at the end. Clones and built packages are kept
+    in the persistent AurWorkspace, so unchanged PKGBUILDs are not rebuilt.
+    Built packages are never taken from LAN peers: nothing signs them, and
+    they are installed as root.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        workspace: Optional[AurWorkspace] = None,
+        rpc: Optional[AurRpc] = None,
+        sync_db: Optional[SyncDatabase] = None,
+        local_index: Optional[LocalPackageIndex] = None,
+    ):
+        self.max_workers = max_workers or max(1, min(4, (os.cpu_count() or 2) // 2))
+        self.workspace = workspace or AurWorkspace()
+        self.rpc = rpc or AurRpc()
+        self.sync_db = sync_db or SyncDatabase()
+        self.local_index = local_index or PackageManager.local_index
+
+    def install(self, packages: List[str]) -> List[str]:
+        """Build and install AUR packages
+
+        Args:
+            packages (List[str]): Names of the AUR packages to install
+
+        Returns:
+            List[str]: List of packages that could not be installed
+        """
+        packages = [p for p in dict.fromkeys(packages) if not self.local_index.is_installed(p)]
+        if not packages:
+            logger.info("All AUR packages are already installed")
+            return []
+
+        logger.info(f"Starting the parallel build of {len(packages)} AUR packages with {self.max_workers} workers")
+
+        try:
+            units, repo_deps, failed = self.resolve(packages)
+        except Exception:
+            logger.error(f"Failed to resolve AUR dependencies: {traceback.format_exc()}")
+            return packages
+
+        if repo_deps and not self._install_repo_dependencies(repo_deps):
+            logger.error("Could not install the repository dependencies of the AUR packages")
+            return packages
+
+        failed_bases: Set[str] = {base for base, unit in units.items() if set(unit.packages) & failed}
+        pending_install: List[AurBuildUnit] = []
+        needed_by_others = {dep for unit in units.values() for dep in unit.depends_on}
+
+        for layer in self._layers(units, failed_bases):
+            buildable: List[AurBuildUnit] = []
+            for base in layer:
+                if base in failed_bases:
+                    continue
+                if units[base].depends_on & failed_bases:
+                    logger.warning(f'Skipping "{base}": one of its AUR dependencies failed')
+                    failed_bases.add(base)
+                    continue
+                buildable.append(units[base])
+
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                results = list(pool.map(CommandRunner.bind(self._build), buildable))
+
+            built_dependencies: List[AurBuildUnit] = []
+            for unit, ok in zip(buildable, results):
+                if not ok:
+                    failed_bases.add(unit.pkgbase)
+                elif unit.pkgbase in needed_by_others:
+                    built_dependencies.append(unit)
+                else:
+                    pending_install.append(unit)
+
+            # Later layers need these installed before makepkg can build them
+            if built_dependencies:
+                for base in self._install_artifacts(built_dependencies):
+                    failed_bases.add(base)
+
+        for base in self._install_artifacts(pending_install):
+            failed_bases.add(base)
+
+        self.workspace.evict()
+
+        not_installed = list(failed)
+        for base in failed_bases:
+            not_installed.extend(units[base].packages)
+
+        not_installed = [p for p in dict.fromkeys(not_installed) if p in packages]
+        if not_installed:
+            logger.warning(f"AUR packages that could not be built: {', '.join(not_installed)}")
+        else:
+            logger.success("All AUR packages have been built and installed!")
+        return not_installed
+
+    def prefetch_sources(self, packages: List[str]) -> None:
+        """Clone AUR repositories and download their sources without building
+
+        The checkouts land in the AUR workspace, so a later install() only has
+        to fetch them and finds the sources already downloaded.
+        """
+        packages = [p for p in dict.fromkeys(packages) if not self.local_index.is_installed(p)]
+        if not packages:
+            return
+
+        try:
+            info = self.rpc.info(packages)
+        except Exception as e:
+            logger.warning(f"Could not query the AUR, skipping source prefetch: {e}")
+            return
+
+        pkgbases = list(dict.fromkeys(r.get("PackageBase") or name for name, r in info.items()))
+        logger.info(f"Prefetching sources of {len(pkgbases)} AUR packages")
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            fetched = sum(pool.map(CommandRunner.bind(self._prefetch), pkgbases))
+        if fetched < len(pkgbases):
+            logger.info(
+                f"Sources of {len(pkgbases) - fetched} AUR packages were not prefetched, "
+                "they will be downloaded at build time"
+            )
+
+    def _prefetch(self, pkgbase: str) -> bool:
+        try:
+            repo_path, _ = self.workspace.checkout(pkgbase)
+            CommandRunner.run(
+                ["makepkg", "--verifysource", "--noconfirm"],
+                cwd=repo_path,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                text=True,
+                check=True,
+            )
+            return True
+        except subprocess.CalledProcessError as e:
+            logger.info(f'Source prefetch of "{pkgbase}" failed: {e.stderr}')
+        except Exception:
+            logger.info(f'Source prefetch of "{pkgbase}" failed: {traceback.format_exc()}')
+        return False
+
+    def resolve(self, packages: List[str]):
+        """Resolve AUR packages and their dependencies into build units
+
+        Returns:
+            Tuple: (units by pkgbase, repository dependencies to install,
+            names that could not be resolved)
+        """
+        info: Dict[str, dict] = {}
+        provided: Dict[str, str] = {}
+        repo_deps: List[str] = []
+        unresolved: Set[str] = set()
+        pending = list(packages)
+
+        while pending:
+            batch = [p for p in dict.fromkeys(pending) if p not in info and p not in unresolved]
+            pending = []
+            if not batch:
+                break
+
+            results = self.rpc.info(batch)
+            for name in batch:
+                if name not in results:
+                    logger.warning(f'Package "{name}" was not found in the AUR')
+                    unresolved.add(name)
+                    continue
+                info[name] = results[name]
+                for item in results[name].get("Provides", []):
+                    provided.setdefault(strip_version(item), name)
+
+            for name in batch:
+                for dep in self._dependencies(info.get(name, {})):
+                    if dep in info or dep in provided or dep in unresolved:
+                        continue
+                    if self.local_index.is_satisfied(dep):
+                        continue
+                    if self.sync_db.has_package(dep):
+                        repo_deps.append(dep)
+                        continue
+                    pending.append(dep)
+
+        units: Dict[str, AurBuildUnit] = {}
+        for name, result in info.items():
+            base = result.get("PackageBase") or name
+            unit = units.setdefault(base, AurBuildUnit(pkgbase=base))
+            unit.packages.append(name)
+            unit.explicit = unit.explicit or name in packages
+
+        failed: Set[str] = set(unresolved)
+        for name, result in info.items():
+            unit = units[result.get("PackageBase") or name]
+            for dep in self._dependencies(result):
+                target = dep if dep in info else provided.get(dep)
+                if target is not None:
+                    target_base = info[target].get("PackageBase") or target
+                    if target_base != unit.pkgbase:
+                        unit.depends_on.add(target_base)
+                elif dep in unresolved:
+                    logger.warning(f'"{name}" depends on "{dep}", which could not be found')
+                    failed.add(name)
+
+        return units, list(dict.fromkeys(repo_deps)), failed
+
+    @staticmethod
+    def _dependencies(result: dict) -> List[str]:
+        return [strip_version(d) for d in result.get("Depends", []) + result.get("MakeDepends", [])]
+
+    @staticmethod
+    def _layers(units: Dict[str, AurBuildUnit], failed_bases: Set[str]) -> List[List[str]]:
+        """Group pkgbases into layers that only depend on earlier layers (Kahn's algorithm)"""
+        remaining = {base: set(unit.depends_on) & set(units) for base, unit in units.items()}
+        layers: List[List[str]] = []
+
+        while remaining:
+            layer = [base for base, deps in remaining.items() if not deps]
+            if not layer:
+                logger.error(f"Dependency cycle between AUR packages: {', '.join(sorted(remaining))}")
+                failed_bases.update(remaining)
+                break
+            layers.append(layer)
+            for base in layer:
+                del remaining[base]
+            for deps in remaining.values():
+                deps.difference_update(layer)
+
+        return layers
+
+    def _install_repo_dependencies(self, packages: List[str]) -> bool:
+        logger.info(f"Installing repository dependencies of AUR packages: {', '.join(packages)}")
+        try:
+            CommandRunner.run(
+                ["sudo", "pacman", "-S", "--noconfirm", "--needed", "--asdeps"] + packages,
+                check=True,
+            )
+            return True
+        except subprocess.CalledProcessError as e:
+            logger.error(f"Error installing AUR build dependencies: {e.stderr}")
+            return False
+
+    def _build(self, unit: AurBuildUnit) -> bool:
+        """Clone and build one pkgbase. Runs inside the worker pool."""
+        error_msg = f'Error while building AUR package "{unit.pkgbase}": {{err}}'
+        try:
+            repo_path, commit = self.workspace.checkout(unit.pkgbase)
+
+            # Этот коммит PKGBUILD уже собирался, пересборка не нужна
+            cached = [
+                p for p in self.workspace.cached_artifacts(unit.pkgbase, commit)
+                if self._artifact_name(p) in unit.packages
+            ]
+            if {self._artifact_name(p) for p in cached} >= set(unit.packages):
+                unit.artifacts = cached
+                logger.success(f'AUR package "{unit.pkgbase}" is unchanged, reusing the built package')
+                return True
+
+            log_path = repo_path / "meowrch-build.log"
+            logger.info(f'Building "{unit.pkgbase}" (log: {log_path})')
+
+            with open(log_path, "w") as log:
+                CommandRunner.run(
+                    ["makepkg", "-f", "--noconfirm", "--nocheck"],
+                    cwd=repo_path,
+                    stdout=log,
+                    stderr=subprocess.STDOUT,
+                    check=True,
+                )
+
+            packagelist = CommandRunner.run(
+                ["makepkg", "--packagelist"],
+                cwd=repo_path,
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.split()
+
+            artifacts = [
+                Path(p) for p in packagelist
+                if Path(p).exists() and self._artifact_name(Path(p)) in unit.packages
+            ]
+            if not artifacts:
+                logger.error(error_msg.format(err="makepkg produced no packages"))
+                return False
+
+            unit.artifacts = self.workspace.store(unit.pkgbase, commit, artifacts)
+
+            logger.success(f'AUR package "{unit.pkgbase}" has been built')
+            return True
+        except subprocess.CalledProcessError as e:
+            logger.error(error_msg.format(err=e.stderr or f"exit code {e.returncode}"))
+        except Exception:
+            logger.error(error_msg.format(err=traceback.format_exc()))
+        return False
+
+    @staticmethod
+    def _artifact_name(path: Path) -> str:
+        """Package name from a file like ``name-pkgver-pkgrel-arch.pkg.tar.zst``"""
+        return path.name.split(".pkg.tar")[0].rsplit("-", 3)[0]
+
+    def _install_artifacts(self, units: List[AurBuildUnit]) -> List[str]:
+        """Install built packages in one pacman -U transaction, returns failed pkgbases"""
+        if not units:
+            return []
+
+        by_path = {str(path): unit for unit in units for path in unit.artifacts}
+        logger.info(f"Installing {len(by_path)} built AUR packages in one transaction")
+
+        # Packages pulled in only as dependencies are marked as such, like makepkg -s does
+        dependencies = {str(path) for unit in units if not unit.explicit for path in unit.artifacts}
+
+        def pacman_upgrade(paths: List[str]) -> bool:
+            try:
+                # Один pacman -U на всё: прерванный запуск не оставляет слой установленным наполовину
+                CommandRunner.run(["sudo", "pacman", "-U", "--noconfirm", "--needed"] + paths, check=True)
+            except subprocess.CalledProcessError as e:
+                logger.warning(f"pacman -U failed: {e.stderr if e.stderr else 'Unknown error'}")
+                return False
+
+            as_deps = [self._artifact_name(Path(p)) for p in paths if p in dependencies]
+            if as_deps:
+                try:
+                    CommandRunner.run(["sudo", "pacman", "-D", "--asdeps"] + as_deps, check=True)
+                except subprocess.CalledProcessError as e:
+                    # Пакеты уже установлены, меняется только причина установки
+                    logger.warning(f"Unable to mark AUR packages as dependencies: {e.stderr or e}")
+            return True
+
+        failed_paths = PackageManager._bisect_install(list(by_path), install_batch=pacman_upgrade)
+        return list(dict.fromkeys(by_path[p].pkgbase for p in failed_paths))
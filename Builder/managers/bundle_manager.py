@@ -0,0 +1,257 @@
+import datetime
+import json
+import shutil
+import subprocess
+import traceback
+from collections import deque
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from loguru import logger
+
+try:
+    from Builder.utils.command_runner import CommandRunner
+    from Builder.utils.pacman_conf import PacmanConf, PacmanConfTransaction
+    from Builder.utils.pacman_db import LocalPackageIndex, PackageRecord, SyncDatabase, strip_version
+except ImportError:
+    from utils.command_runner import CommandRunner
+    from utils.pacman_conf import PacmanConf, PacmanConfTransaction
+    from utils.pacman_db import LocalPackageIndex, PackageRecord, SyncDatabase, strip_version
+
+
+class BundleManager:
+    """Offline package bundle: a directory of packages plus a repo-add database.
+
+    A bundle is produced on a reference machine from its package caches and
+    contains the whole dependency closure of the meowrch package selection,
+    built AUR packages included. On the target machine the bundle is added to
+    pacman.conf as a ``file://`` repository in front of ``[core]`` (like
+    ChdwManager does for chwd), so every package resolves from it and no
+    download is needed.
+
+    Repository packages are bundled with their ``.sig`` files and pacman
+    still requires valid package signatures for them. Only the locally built
+    AUR packages, which have no signature, go into a second repository that
+    is trusted as is. Repository packages whose signature is not cached are
+    left out and are downloaded as usual.
+    """
+
+    REPO_NAME = "meowrch-bundle"
+    LOCAL_REPO_NAME = "meowrch-bundle-local"
+    MANIFEST_NAME = "bundle.json"
+    PACMAN_CONF = Path("/etc/pacman.conf")
+    SYNC_DB_PATH = Path("/var/lib/pacman/sync")
+    CACHE_DIRS = [
+        Path("/var/cache/pacman/pkg"),
+        Path.home() / ".cache" / "meowrch" / "aur",
+        Path("/var/cache/meowrch/aur-helpers"),
+        Path.home() / ".cache" / "yay",
+        Path.home() / ".cache" / "paru",
+    ]
+
+    def __init__(
+        self,
+        path: Path,
+        local_index: Optional[LocalPackageIndex] = None,
+        sync_db: Optional[SyncDatabase] = None,
+    ):
+        self.path = path.resolve()
+        self.repo_db_path = self.path / f"{self.REPO_NAME}.db.tar.zst"
+        self.local_repo_db_path = self.path / f"{self.LOCAL_REPO_NAME}.db.tar.zst"
+        self.local_index = local_index or LocalPackageIndex()
+        self.sync_db = sync_db or SyncDatabase()
+        self.packages: List[str] = []
+
+    ##==> Создание бандла на эталонной машине
+    ##############################################
+    def create(self, packages: List[str], cache_dirs: Optional[List[Path]] = None) -> bool:
+        """Collect the installed packages and their dependencies into a bundle
+
+        Args:
+            packages: Packages to bundle; the ones not installed here are skipped
+            cache_dirs: Directories searched for the package files
+
+        Returns:
+            bool: True if the bundle database was created
+        """
+        logger.info(f"Creating package bundle in {self.path}")
+        records, not_installed = self.resolve_closure(packages)
+        files = self._find_package_files(cache_dirs or self.CACHE_DIRS)
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        signed: List[Path] = []
+        unsigned: List[Path] = []
+        bundled_records: List[PackageRecord] = []
+        missing_files: List[str] = []
+        missing_signatures: List[str] = []
+
+        for record in records:
+            src = files.get(self._file_stem(record))
+            if src is None:
+                missing_files.append(f"{record.name}-{record.version}")
+                continue
+            sig = src.with_name(src.name + ".sig")
+            if not sig.exists() and self.sync_db.get_repo(record.name) is not None:
+                # Пакет из репозитория без подписи не должен попасть в доверенный репозиторий
+                missing_signatures.append(f"{record.name}-{record.version}")
+                continue
+
+            dst = self.path / src.name
+            if not dst.exists():
+                shutil.copy2(src, dst)
+            if sig.exists():
+                shutil.copy2(sig, dst.with_name(sig.name))
+                signed.append(dst)
+            else:
+                unsigned.append(dst)
+            bundled_records.append(record)
+
+        if not_installed:
+            logger.warning(f"Not installed on this machine, not bundled: {', '.join(not_installed)}")
+        if missing_files:
+            logger.warning(f"No cached package file, not bundled: {', '.join(missing_files)}")
+        if missing_signatures:
+            logger.warning(f"No cached signature, not bundled: {', '.join(missing_signatures)}")
+        if not signed and not unsigned:
+            logger.error("No packages to add to the bundle")
+            return False
+
+        # Основная база нужна всегда: по ней load() узнаёт бандл
+        if not (self._repo_add(self.repo_db_path, signed) and self._repo_add(self.local_repo_db_path, unsigned)):
+            return False
+
+        self.packages = sorted({name for r in bundled_records for name in [r.name, *r.provides]})
+        manifest = {
+            "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "packages": self.packages,
+            "unsigned": sorted(p.name for p in unsigned),
+            "not_bundled": sorted(not_installed + missing_files + missing_signatures),
+        }
+        (self.path / self.MANIFEST_NAME).write_text(json.dumps(manifest, indent=2))
+
+        logger.success(
+            f"Bundle with {len(signed) + len(unsigned)} package(s) created in {self.path} "
+            f"({len(unsigned)} unsigned AUR package(s))"
+        )
+        return True
+
+    def _repo_add(self, db_path: Path, packages: List[Path]) -> bool:
+        """Create a repository database; an empty one when there are no packages"""
+        error_msg = "Bundle repository creation error: {err}"
+        try:
+            db_path.unlink(missing_ok=True)
+            CommandRunner.run(
+                ["repo-add", "-q", str(db_path), *[str(p) for p in packages]],
+                cwd=str(self.path),
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            return True
+        except subprocess.CalledProcessError as e:
+            logger.error(error_msg.format(err=e.stderr))
+        except Exception:
+            logger.error(error_msg.format(err=traceback.format_exc()))
+        return False
+
+    def resolve_closure(self, packages: List[str]) -> Tuple[List[PackageRecord], List[str]]:
+        """Installed packages and all their runtime dependencies
+
+        Returns:
+            Tuple[List[PackageRecord], List[str]]: records in discovery order and
+            the requested packages that are not installed
+        """
+        records: Dict[str, PackageRecord] = {}
+        not_installed: List[str] = []
+        requested: Set[str] = set(packages)
+        queue = deque(packages)
+
+        while queue:
+            name = queue.popleft()
+            record = self.local_index.get_record(name)
+            if record is None:
+                if name in requested:
+                    not_installed.append(name)
+                continue
+            if record.name in records:
+                continue
+            records[record.name] = record
+            queue.extend(strip_version(dep) for dep in record.depends)
+
+        return list(records.values()), not_installed
+
+    @staticmethod
+    def _file_stem(record: PackageRecord) -> str:
+        return f"{record.name}-{record.version}-{record.arch}.pkg.tar"
+
+    @staticmethod
+    def _find_package_files(cache_dirs: List[Path]) -> Dict[str, Path]:
+        """Map "<name>-<version>-<arch>.pkg.tar" to the first cached file"""
+        files: Dict[str, Path] = {}
+        for cache_dir in cache_dirs:
+            if not cache_dir.is_dir():
+                continue
+            for path in cache_dir.rglob("*.pkg.tar*"):
+                if path.name.endswith(".sig") or ".pkg.tar" not in path.name:
+                    continue
+                stem = path.name[: path.name.index(".pkg.tar") + len(".pkg.tar")]
+                files.setdefault(stem, path)
+        return files
+
+    ##==> Установка из бандла
+    ##############################################
+    def load(self) -> bool:
+        """Check the bundle directory and read its manifest"""
+        if not self.repo_db_path.exists():
+            logger.error(f"{self.path} is not a package bundle: {self.repo_db_path.name} not found")
+            return False
+        try:
+            manifest = json.loads((self.path / self.MANIFEST_NAME).read_text())
+            self.packages = manifest.get("packages", [])
+        except (OSError, ValueError) as e:
+            logger.warning(f"Bundle manifest is unreadable: {e}")
+            self.packages = []
+        logger.info(f"Using package bundle {self.path} ({len(self.packages)} package(s))")
+        return True
+
+    def contains(self, package: str) -> bool:
+        return strip_version(package) in self.packages
+
+    def configure_pacman_conf(self, conf: PacmanConf) -> None:
+        # Бандл должен стоять перед [core], чтобы pacman брал пакеты из него.
+        # Подписи пакетов проверяются; база file:// репозитория не подписана
+        conf.add_section(
+            self.REPO_NAME,
+            [("SigLevel", "PackageRequired DatabaseOptional"), ("Server", f"file://{self.path}")],
+            before="core",
+        )
+        # Собранные локально AUR пакеты не подписаны; в старых бандлах этой базы нет
+        if not self.local_repo_db_path.exists():
+            return
+        conf.add_section(
+            self.LOCAL_REPO_NAME,
+            [("SigLevel", "Optional TrustAll"), ("Server", f"file://{self.path}")],
+            before="core",
+        )
+
+    def activate(self) -> bool:
+        """Add the bundle as the first repository and sync its database"""
+        transaction = PacmanConfTransaction(self.PACMAN_CONF)
+        return transaction.stage("package bundle", self.configure_pacman_conf).commit() and self.sync()
+
+    def sync(self) -> bool:
+        """Sync the databases once the bundle repository is in pacman.conf"""
+        error_msg = "Bundle repository activation error: {err}"
+        try:
+            # Без сети остальные базы не обновятся, это ожидаемо
+            CommandRunner.run(["sudo", "pacman", "-Sy"], check=False)
+        except Exception:
+            logger.error(error_msg.format(err=traceback.format_exc()))
+            return False
+
+        if not (self.SYNC_DB_PATH / f"{self.REPO_NAME}.db").exists():
+            logger.error("The bundle repository database was not synchronized")
+            return False
+
+        logger.success("Package bundle repository is active")
+        return True
@@ -1,7 +1,16 @@
 import subprocess
 import time
+from typing import List, Optional
+
 from loguru import logger
 
+try:
+    from Builder.utils.mirror_probe import MirrorProbe
+    from Builder.utils.pacman_conf import PacmanConf, PacmanConfTransaction
+except ImportError:
+    from utils.mirror_probe import MirrorProbe
+    from utils.pacman_conf import PacmanConf, PacmanConfTransaction
+
 
 class ChaoticAurManager:
     """Менеджер для работы с Chaotic AUR - неофициальным репозиторием с бинарными AUR пакетами"""
@@ -11,15 +20,40 @@ class ChaoticAurManager:
         """Проверяет, установлен ли Chaotic AUR"""
         try:
             with open('/etc/pacman.conf', 'r') as f:
-                content = f.read()
-                return '[chaotic-aur]' in content
+                return PacmanConf(f.read()).has_section("chaotic-aur")
         except Exception:
             return False
     
+    MIRRORS = [
+        "https://cdn-mirror.chaotic.cx/chaotic-aur",
+        "https://mirror.chaotic.cx/chaotic-aur",
+        "https://lonewolf-builder.chaotic.cx",
+    ]
+
     @staticmethod
-    def install(max_retries: int = 3) -> bool:
-        """Устанавливает Chaotic AUR репозиторий"""
+    def rank_mirrors(probe: Optional[MirrorProbe] = None) -> List[str]:
+        """Упорядочивает зеркала по скорости загрузки chaotic-keyring"""
+        ranked, _ = (probe or MirrorProbe(time_budget=5.0)).rank(
+            {
+                mirror: f"{mirror}/chaotic-keyring.pkg.tar.zst"
+                for mirror in ChaoticAurManager.MIRRORS
+            }
+        )
+        return ranked
+
+    @staticmethod
+    def install(max_retries: int = 3, transaction: Optional[PacmanConfTransaction] = None) -> bool:
+        """Устанавливает Chaotic AUR репозиторий
+
+        Args:
+            transaction: Общая транзакция pacman.conf. Секция репозитория
+                только добавляется в неё, запись файла и обновление баз
+                остаются за вызывающим
+        """
         logger.info("Installing Chaotic AUR repository...")
+
+        # Пробуем зеркала начиная с самого быстрого
+        mirrors = ChaoticAurManager.rank_mirrors()
         
         for attempt in range(max_retries):
             try:
@@ -35,13 +69,6 @@ class ChaoticAurManager:
                     "sudo", "pacman-key", "--lsign-key", "3056513887B78AEB"
                 ], check=True, timeout=60)
                 
-                # Пробуем разные зеркала
-                mirrors = [
-                    "https://cdn-mirror.chaotic.cx/chaotic-aur",
-                    "https://mirror.chaotic.cx/chaotic-aur",
-                    "https://lonewolf-builder.chaotic.cx"
-                ]
-                
                 for mirror in mirrors:
                     try:
                         logger.info(f"Trying mirror: {mirror}")
@@ -59,6 +86,11 @@ class ChaoticAurManager:
                     logger.error("All mirrors failed!")
                     return False
                 
+                if transaction is not None:
+                    transaction.stage("Chaotic AUR", ChaoticAurManager.configure_pacman_conf)
+                    logger.success("Chaotic AUR keyring installed, the repository is staged for pacman.conf")
+                    return True
+
                 # Добавляем репозиторий в pacman.conf
                 ChaoticAurManager._add_to_pacman_conf()
                 
@@ -90,38 +122,25 @@ class ChaoticAurManager:
         logger.error(f"Failed to install Chaotic AUR after {max_retries} attempts")
         return False
     
+    @staticmethod
+    def configure_pacman_conf(conf: PacmanConf) -> None:
+        """Добавляет секцию Chaotic AUR в модель pacman.conf"""
+        conf.add_section(
+            "chaotic-aur",
+            [("Include", "/etc/pacman.d/chaotic-mirrorlist")],
+            comment="Chaotic AUR - Binary AUR packages",
+        )
+
+    @staticmethod
+    def render_pacman_conf(content: str) -> str:
+        """Возвращает содержимое pacman.conf с секцией Chaotic AUR"""
+        conf = PacmanConf(content)
+        ChaoticAurManager.configure_pacman_conf(conf)
+        return conf.render()
+
     @staticmethod
     def _add_to_pacman_conf() -> None:
         """Добавляет Chaotic AUR в /etc/pacman.conf"""
-        pacman_conf_path = "/etc/pacman.conf"
-        temp_path = "/tmp/meowrch-pacman-chaotic.conf"
-        
-        chaotic_section = """
-# Chaotic AUR - Binary AUR packages
-[chaotic-aur]
-Include = /etc/pacman.d/chaotic-mirrorlist
-"""
-        
-        try:
-            with open(pacman_conf_path, 'r') as f:
-                content = f.read()
-            
-            # Проверяем, что Chaotic AUR еще не добавлен
-            if '[chaotic-aur]' not in content:
-                # Добавляем в конец файла
-                content += chaotic_section
-                
-                with open(temp_path, 'w') as f:
-                    f.write(content)
-                
-                subprocess.run([
-                    "sudo", "mv", temp_path, pacman_conf_path
-                ], check=True)
-                
-                logger.info("Chaotic AUR section added to pacman.conf")
-            else:
-                logger.info("Chaotic AUR already present in pacman.conf")
-                
-        except Exception as e:
-            logger.error(f"Error updating pacman.conf: {e}")
-            raise
\ No newline at end of file
+        transaction = PacmanConfTransaction().stage("Chaotic AUR", ChaoticAurManager.configure_pacman_conf)
+        if not transaction.commit():
+            raise RuntimeError("Chaotic AUR could not be added to pacman.conf")
@@ -8,6 +8,11 @@ import uuid
 
 from loguru import logger
 
+try:
+    from Builder.utils.command_runner import CommandRunner
+except ImportError:
+    from utils.command_runner import CommandRunner
+
 from .base import AppConfigurer
 
 
@@ -130,10 +135,10 @@ class FirefoxConfigurer(AppConfigurer):
         theme_repo_path = os.path.join(chrome_dir, "firefox-gnome-theme")
         if os.path.exists(theme_repo_path):
             logger.info("Updating existing Firefox GNOME Theme...")
-            subprocess.run(["git", "pull"], cwd=theme_repo_path, check=True)
+            CommandRunner.run(["git", "pull"], cwd=theme_repo_path, check=True)
         else:
             logger.info("Cloning Firefox GNOME Theme repository...")
-            subprocess.run(
+            CommandRunner.run(
                 [
                     "git",
                     "clone",
@@ -382,12 +387,12 @@ fi
 
         # Enable and start the timer
         try:
-            subprocess.run(["systemctl", "--user", "daemon-reload"], check=True)
-            subprocess.run(
+            CommandRunner.run(["systemctl", "--user", "daemon-reload"], check=True)
+            CommandRunner.run(
                 ["systemctl", "--user", "enable", "firefox-theme-update.timer"],
                 check=True,
             )
-            subprocess.run(
+            CommandRunner.run(
                 ["systemctl", "--user", "start", "firefox-theme-update.timer"],
                 check=True,
             )
@@ -418,7 +423,7 @@ fi
                 logger.info(f"Downloading {plugin_file}...")
                 plugin_path = os.path.join(extension_dir, plugin_file)
                 cmd = ["curl", "-L", "--silent", "--fail", "-o", plugin_path, url]
-                result = subprocess.run(
+                result = CommandRunner.run(
                     cmd, check=False, capture_output=True, text=True
                 )
 
@@ -445,7 +450,7 @@ fi
         places_db_path = os.path.join(path_profile, "places.sqlite")
 
         # Ensure Firefox is not running before modifying database
-        subprocess.run(["pkill", "firefox"], check=False)
+        CommandRunner.run(["pkill", "firefox"], check=False)
         time.sleep(2)  # Increased wait time
 
         try:
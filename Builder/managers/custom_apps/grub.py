@@ -3,21 +3,30 @@ import shutil
 import subprocess
 import traceback
 from pathlib import Path
+from typing import Optional
 
 from loguru import logger
+
 try:
+    from Builder.utils.copy_engine import copy_tree_privileged
     from Builder.utils.grub_config import GrubConfigEditor
+    from Builder.utils.post_actions import PostAction, PostActionQueue
+    from Builder.utils.privileged_helper import run_sudo
 except ImportError:
+    from utils.copy_engine import copy_tree_privileged
     from utils.grub_config import GrubConfigEditor
+    from utils.post_actions import PostAction, PostActionQueue
+    from utils.privileged_helper import run_sudo
 
 from .base import AppConfigurer
 
 
 class GrubConfigurer(AppConfigurer):
-    def __init__(self):
+    def __init__(self, post_actions: Optional[PostActionQueue] = None):
         self.theme_path = "/boot/grub/themes/meowrch"
         self.theme_src = Path("./misc/grub_theme")
-        self.grub_editor = GrubConfigEditor()
+        self.post_actions = post_actions
+        self.grub_editor = GrubConfigEditor(post_actions=post_actions)
 
     def _bootloader_type(self) -> str:
         """Detect the bootloader type: 'grub', 'systemd-boot', or 'unknown'"""
@@ -81,12 +90,16 @@ class GrubConfigurer(AppConfigurer):
             logger.warning(f"Skipping GRUB theme copy: destination directory {dest_dir} does not exist.")
             return
 
-        subprocess.run(
-            ["sudo", "cp", "-r", str(self.theme_src), self.theme_path], check=True
-        )
+        copy_tree_privileged(self.theme_src, Path(self.theme_path))
 
     def _update_grub(self) -> None:
-        """Update GRUB configuration"""
+        """Update GRUB configuration (deferred when a PostActionQueue is set)"""
+        if self.post_actions is not None:
+            self.post_actions.schedule(PostAction.GRUB_CONFIG, self._regenerate_grub_config)
+            return
+        self._regenerate_grub_config()
+
+    def _regenerate_grub_config(self) -> None:
         # Only regenerate if /boot is mounted and grub directory exists
         if not Path("/boot/grub").exists():
             logger.warning("Skipping GRUB config generation: /boot/grub directory does not exist.")
@@ -100,6 +113,16 @@ class GrubConfigurer(AppConfigurer):
         else:
             logger.warning("Skipping GRUB config generation: no grub-mkconfig or update-grub found.")
         
+    @staticmethod
+    def render_theme_setting(content: str, theme_setting: str) -> str:
+        """Return /etc/default/grub content with the given GRUB_THEME line"""
+        # Удаляем существующие строки GRUB_THEME
+        lines = [line for line in content.splitlines() if not line.startswith("GRUB_THEME")]
+
+        # Добавляем новую настройку
+        lines.append(theme_setting)
+        return '\n'.join(lines) + '\n'
+
     def _add_grub_theme_setting(self, theme_setting: str) -> None:
         """Add GRUB_THEME setting to configuration file
         
@@ -110,31 +133,21 @@ class GrubConfigurer(AppConfigurer):
         
         try:
             # Читаем текущий файл
-            content = subprocess.run(
-                ["sudo", "cat", str(grub_config_file)],
+            content = run_sudo(
+                ["cat", str(grub_config_file)],
                 capture_output=True,
                 text=True,
                 check=True
             ).stdout
-            
-            # Удаляем существующие строки GRUB_THEME
-            lines = [line for line in content.splitlines() if not line.startswith("GRUB_THEME")]
-            
-            # Добавляем новую настройку
-            lines.append(theme_setting)
-            
-            # Записываем обратно через временный файл
-            import tempfile
-            with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='_grub') as tmp:
-                tmp.write('\n'.join(lines) + '\n')
-                tmp.flush()
-                
-                subprocess.run(
-                    ["sudo", "cp", tmp.name, str(grub_config_file)], 
-                    check=True
-                )
-                
-            Path(tmp.name).unlink(missing_ok=True)
+
+            # Записываем обратно; помощник пишет файл атомарно
+            run_sudo(
+                ["tee", str(grub_config_file)],
+                input=self.render_theme_setting(content, theme_setting),
+                stdout=subprocess.DEVNULL,
+                text=True,
+                check=True
+            )
             logger.info(f"Added GRUB theme setting: {theme_setting}")
             
         except subprocess.CalledProcessError as e:
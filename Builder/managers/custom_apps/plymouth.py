@@ -8,29 +8,42 @@ from typing import List, Optional
 from loguru import logger
 try:
     from Builder.utils.bootloader import BootloaderManager
+    from Builder.utils.command_runner import CommandRunner
     from Builder.utils.grub_config import GrubConfigEditor
     from Builder.utils.mkinitcpio_config import MkinitcpioConfigEditor
     from Builder.utils.initramfs import InitramfsManager
+    from Builder.utils.post_actions import PostAction, PostActionQueue
+    from Builder.utils.privileged_helper import run_sudo
 except ImportError:
     from utils.bootloader import BootloaderManager
+    from utils.command_runner import CommandRunner
     from utils.grub_config import GrubConfigEditor
     from utils.mkinitcpio_config import MkinitcpioConfigEditor
     from utils.initramfs import InitramfsManager
+    from utils.post_actions import PostAction, PostActionQueue
+    from utils.privileged_helper import run_sudo
 
 class PlymouthConfigurer:
-    def __init__(self, allow_grub_config: bool = True):
+    def __init__(
+        self,
+        allow_grub_config: bool = True,
+        post_actions: Optional[PostActionQueue] = None,
+        force_initramfs: bool = False,
+    ):
         self.theme_name = "meowrch"
         self.services_src = Path("./misc/services")
         self.theme_src = Path("./misc/plymouth_theme")
         self.theme_dest = Path("/usr/share/plymouth/themes/")
         self.allow_grub_config = allow_grub_config
+        self.post_actions = post_actions
+        self.force_initramfs = force_initramfs
         self.initramfs_tool: Optional[str] = None
         self.dracut_conf_dir = Path("/etc/dracut.conf.d")
         self.dracut_conf_file = self.dracut_conf_dir / "90-plymouth-meowrch.conf"
         
         # Инициализируем редакторы конфигурации
-        self.grub_editor = GrubConfigEditor()
-        self.mkinitcpio_editor = MkinitcpioConfigEditor()
+        self.grub_editor = GrubConfigEditor(post_actions=post_actions)
+        self.mkinitcpio_editor = MkinitcpioConfigEditor(post_actions=post_actions, force_rebuild=force_initramfs)
         self.bootloader_manager = BootloaderManager()
         self.initramfs_manager = InitramfsManager()
         
@@ -68,8 +81,8 @@ class PlymouthConfigurer:
 
     def _run_sudo(self, command: List[str], input: Optional[str] = None) -> str:
         """Run command with sudo"""
-        result = subprocess.run(
-            ["sudo"] + command,
+        result = run_sudo(
+            command,
             input=input,
             text=True,
             capture_output=True,
@@ -151,22 +164,38 @@ class PlymouthConfigurer:
         logger.success(f'Installed "{self.theme_name}" Plymouth theme')
 
     def run_post_commands(self):
-        """Run post-installation commands"""
+        """Run post-installation commands
+
+        When a shared PostActionQueue is set, the regenerations are only
+        scheduled and run once by the Builder at the end of the installation.
+        """
         bootloader = self._bootloader_type()
         logger.info(f"Detected bootloader: {bootloader}")
-        # Regenerate bootloader configuration when appropriate
-        self.bootloader_manager.regenerate_grub_config(
-            run_sudo=self._run_sudo,
-            allow_grub_config=self.allow_grub_config,
-            bootloader_type=bootloader,
-        )
 
-        # Always rebuild initramfs after changes
-        self.initramfs_manager.rebuild_initramfs(
-            tool=self.initramfs_tool,
-            run_sudo=self._run_sudo,
-            dracut_conf_dir=self.dracut_conf_dir,
-        )
+        def regenerate_grub():
+            # Regenerate bootloader configuration when appropriate
+            self.bootloader_manager.regenerate_grub_config(
+                run_sudo=self._run_sudo,
+                allow_grub_config=self.allow_grub_config,
+                bootloader_type=bootloader,
+            )
+
+        def rebuild_initramfs():
+            # Skipped when the images were built from the same inputs
+            self.initramfs_manager.rebuild_initramfs(
+                tool=self.initramfs_tool,
+                run_sudo=self._run_sudo,
+                dracut_conf_dir=self.dracut_conf_dir,
+                force=self.force_initramfs,
+            )
+
+        if self.post_actions is not None:
+            self.post_actions.schedule(PostAction.GRUB_CONFIG, regenerate_grub)
+            self.post_actions.schedule(PostAction.INITRAMFS, rebuild_initramfs)
+            return
+
+        regenerate_grub()
+        rebuild_initramfs()
 
     def update_dracut_config(self):
         """Configure dracut to include plymouth module."""
@@ -4,6 +4,11 @@ from pathlib import Path
 
 from loguru import logger
 
+try:
+    from Builder.utils.copy_engine import copy_tree_privileged
+except ImportError:
+    from utils.copy_engine import copy_tree_privileged
+
 from .base import AppConfigurer
 
 
@@ -43,9 +48,7 @@ class SDDMConfigurer(AppConfigurer):
         )
 
     def _install_theme(self) -> None:
-        subprocess.run(
-            ["sudo", "cp", "-r", "./misc/sddm_theme", self.theme_path], check=True
-        )
+        copy_tree_privileged(Path("./misc/sddm_theme"), Path(self.theme_path))
 
     def granting_permissions(self) -> None:
         ##==> Выдаем права sddm
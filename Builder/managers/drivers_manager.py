@@ -5,6 +5,15 @@ import traceback
 from typing import Optional, Dict
 from loguru import logger
 
+try:
+    from Builder.utils.command_runner import CommandRunner
+    from Builder.utils.pacman_conf import PacmanConf, PacmanConfTransaction
+    from Builder.utils.privileged_helper import run_sudo
+except ImportError:
+    from utils.command_runner import CommandRunner
+    from utils.pacman_conf import PacmanConf, PacmanConfTransaction
+    from utils.privileged_helper import run_sudo
+
 
 class ChdwManager:
     CACHYOS_REPO_URL = "https://mirror.cachyos.org/repo/x86_64/cachyos"
@@ -30,7 +39,7 @@ class ChdwManager:
 
     def _run_sudo(self, cmd: list, **kwargs) -> subprocess.CompletedProcess:
         """Run command with sudo, prompting for password if needed"""
-        return subprocess.run(["sudo"] + cmd, **kwargs)
+        return run_sudo(cmd, **kwargs)
 
     def setup_repo_directory(self) -> bool:
         try:
@@ -56,7 +65,7 @@ class ChdwManager:
         try:
             logger.info(f"Searching for package: {package_name}")
             cmd = ["curl", "-s", f"{self.CACHYOS_REPO_URL}/"]
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+            result = CommandRunner.run(cmd, capture_output=True, text=True, check=True)
             
             lines = result.stdout.split('\n')
             pattern = rf'({package_name}-[\d\.\-a-zA-Z_]+\.pkg\.tar\.zst)(?!\.sig)'
@@ -159,57 +168,19 @@ class ChdwManager:
             logger.debug(traceback.format_exc())
             return False
 
+    def configure_pacman_conf(self, conf: PacmanConf) -> None:
+        """Add the local repository in front of [core]"""
+        conf.add_section(
+            self.LOCAL_REPO_NAME,
+            [("SigLevel", "Optional TrustAll"), ("Server", f"file://{self.repo_path}")],
+            before="core",
+        )
+
     def update_pacman_conf(self) -> bool:
         """Add local repository to pacman.conf"""
         logger.info("Updating pacman.conf")
-        
-        repo_entry = f"""
-[{self.LOCAL_REPO_NAME}]
-SigLevel = Optional TrustAll
-Server = file://{self.repo_path}
-"""
-        
-        try:
-            with open(self.PACMAN_CONF, 'r') as f:
-                content = f.read()
-            
-            # Check if repository is already added
-            if self.LOCAL_REPO_NAME in content:
-                logger.info("Repository already added to pacman.conf")
-                return True
-            
-            # Add repository before [core]
-            if '[core]' in content:
-                content = content.replace('[core]', repo_entry + '\n[core]')
-            else:
-                # If [core] not found, add to the end
-                content += '\n' + repo_entry
-            
-            # Create backup
-            backup = self.PACMAN_CONF.with_suffix('.conf.backup')
-            self._run_sudo(["cp", str(self.PACMAN_CONF), str(backup)], check=True)
-            logger.info(f"Backup created: {backup}")
-            
-            # Write updated config
-            # Use tee to write with sudo
-            proc = subprocess.Popen(
-                ["sudo", "tee", str(self.PACMAN_CONF)],
-                stdin=subprocess.PIPE,
-                stdout=subprocess.DEVNULL,
-                text=True
-            )
-            proc.communicate(input=content)
-            
-            if proc.returncode != 0:
-                raise subprocess.CalledProcessError(proc.returncode, "tee")
-            
-            logger.info("pacman.conf updated successfully")
-            return True
-            
-        except (IOError, subprocess.CalledProcessError) as e:
-            logger.error(f"pacman.conf update error: {e}")
-            logger.debug(traceback.format_exc())
-            return False
+        transaction = PacmanConfTransaction(self.PACMAN_CONF)
+        return transaction.stage("local chwd repository", self.configure_pacman_conf).commit()
 
     def install_chwd(self) -> bool:
         """Install chwd package via pacman"""
@@ -297,24 +268,43 @@ Server = file://{self.repo_path}
             logger.debug(traceback.format_exc())
             return False
 
-    def install(self) -> bool:
+    def prepare(self, transaction: PacmanConfTransaction) -> bool:
+        """Create the local repository and stage its pacman.conf entry
+
+        The caller commits the transaction together with its own edits and
+        then runs install(prepared=True).
+        """
+        logger.info("Preparing the local chwd repository")
+        if not self._run_steps(self._repo_steps()):
+            return False
+        transaction.stage("local chwd repository", self.configure_pacman_conf)
+        return True
+
+    def install(self, prepared: bool = False) -> bool:
         logger.info("Starting chwd installation")
-        
-        steps = [
-            ("Creating repository directory", self.setup_repo_directory),
-            ("Downloading packages", self._download_all_packages),
-            ("Creating local repository", self.create_local_repo),
-            ("Updating pacman.conf", self.update_pacman_conf),
+
+        steps = [] if prepared else self._repo_steps() + [("Updating pacman.conf", self.update_pacman_conf)]
+        steps += [
             ("Installing chwd", self.install_chwd),
             ("Auto-configuring drivers", self.auto_configure_drivers),
             ("Setting up update checker", self.setup_update_checker),
         ]
-        
+        return self._run_steps(steps)
+
+    def _repo_steps(self) -> list:
+        return [
+            ("Creating repository directory", self.setup_repo_directory),
+            ("Downloading packages", self._download_all_packages),
+            ("Creating local repository", self.create_local_repo),
+        ]
+
+    @staticmethod
+    def _run_steps(steps: list) -> bool:
         for step_name, step_func in steps:
             if not step_func():
                 logger.error(f"✗ Error at step: {step_name}")
                 return False
-        
+
         return True
 
     def _download_all_packages(self) -> bool:
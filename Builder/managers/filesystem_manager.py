@@ -1,13 +1,48 @@
-import os
-import shutil
+import filecmp
 import subprocess
 import traceback
 from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 
 from loguru import logger
 
+try:
+    from Builder.utils.copy_engine import CopyEngine
+    from Builder.utils.dotfile_sync import DotfileSync
+    from Builder.utils.path_rules import PathRules
+    from Builder.utils.snapshot_backup import SnapshotBackup
+except ImportError:
+    from utils.copy_engine import CopyEngine
+    from utils.dotfile_sync import DotfileSync
+    from utils.path_rules import PathRules
+    from utils.snapshot_backup import SnapshotBackup
+
 
 class FileSystemManager:
+    BACKUP_ITEMS = [
+        ".config",
+        ".local/bin",
+        ".gnome2",
+        ".local/share/nemo",
+        ".bashrc",
+        ".Xresources",
+        ".xinitrc",
+        ".icons/default/index.theme",
+        ".zshenv"
+    ]
+    # Кэши приложений в ~/.config не нужны в резервной копии
+    BACKUP_EXCLUDE = [
+        "/.config/**/Cache/",
+        "/.config/**/cache/",
+        "/.config/**/CachedData/",
+        "/.config/**/Code Cache/",
+        "/.config/**/GPUCache/",
+        "/.config/**/DawnCache/",
+        "/.config/**/Service Worker/CacheStorage/",
+        "/.config/**/Crashpad/",
+        "/.config/**/logs/",
+    ]
+
     @staticmethod
     def create_default_folders() -> None:
         logger.success("Starting the process of creating default directories")
@@ -39,109 +74,95 @@ class FileSystemManager:
 
     @staticmethod
     def copy_with_exclusions(src: Path, dst: Path, exclusions: list) -> None:
-        os.makedirs(dst, exist_ok=True)
-
-        for item in os.listdir(src):
-            item_path = os.path.join(src, item)
-            if item in exclusions:
-                continue
-
-            if os.path.isdir(item_path):
-                FileSystemManager.copy_with_exclusions(
-                    src=item_path, dst=os.path.join(dst, item), exclusions=exclusions
-                )
-            else:
-                shutil.copy2(item_path, dst)
+        """Copy a tree except the paths matching gitignore-style patterns (see PathRules)"""
+        stats = CopyEngine().copy_tree(src=src, dst=dst, rules=PathRules(exclusions))
+        logger.info(f'Copied "{src}": {stats.summary()}')
 
     @staticmethod
-    def make_backup(dst: Path = Path("./backup")) -> None:
-        dst.mkdir(parents=True, exist_ok=True)
-        home = Path.home()
-
-        backup_items = [
-            ".config",
-            ".local/bin",
-            ".gnome2",
-            ".local/share/nemo",
-            ".bashrc",
-            ".Xresources",
-            ".xinitrc",
-            ".icons/default/index.theme",
-            ".zshenv"
-        ]
+    def make_backup(dst: Path = Path("./backup")) -> Optional[Path]:
+        """Create a deduplicated snapshot of the user's configs in dst
 
-        for item in backup_items:
-            src_path = home / item
-            dst_path = dst / item
-
-            if not src_path.exists():
-                continue
-
-            logger.info(f'Starting to back up "{item}".')
-            
-            try:
-                dst_path.parent.mkdir(parents=True, exist_ok=True)
-
-                if src_path.is_dir():
-                    shutil.copytree(src=src_path, dst=dst_path, dirs_exist_ok=True)
-                else:
-                    shutil.copy(src=src_path, dst=dst_path)
-                
-                logger.success(f'Successfully backed up "{item}"')
-            
-            except Exception:
-                logger.error(
-                    f"An error occurred during copying: {traceback.format_exc()}"
-                )
+        Returns:
+            Optional[Path]: The snapshot directory, None on failure
+        """
+        logger.info(f"Creating a backup snapshot of {', '.join(FileSystemManager.BACKUP_ITEMS)}")
+        try:
+            return SnapshotBackup(dst).create(
+                Path.home(),
+                FileSystemManager.BACKUP_ITEMS,
+                PathRules(FileSystemManager.BACKUP_EXCLUDE),
+            )
+        except Exception:
+            logger.error(f"An error occurred during the backup: {traceback.format_exc()}")
+            return None
 
     @staticmethod
-    def copy_dotfiles(exclude_bspwm: bool, exclude_hyprland: bool) -> None:
-        logger.success("Starting the process of copying dotfiles")
+    def _dotfile_entries(
+        exclude_bspwm: bool, exclude_hyprland: bool
+    ) -> List[Tuple[Path, Path, PathRules]]:
+        """Sources of the dotfiles with their destinations and exclusion rules"""
         home = Path.home()
 
-        ##==> Копирование дотфайлов
-        ##############################################
+        # Только каталоги верхнего уровня ~/.config, вложенные с тем же именем не трогаются
         config_folders_exclusions = []
         if exclude_bspwm:
-            config_folders_exclusions.extend(["bspwm", "polybar"])
+            config_folders_exclusions.extend(["/bspwm/", "/polybar/"])
         if exclude_hyprland:
-            config_folders_exclusions.extend(["hypr", "waybar"])
+            config_folders_exclusions.extend(["/hypr/", "/waybar/"])
+
+        no_rules = PathRules()
+        entries = [
+            (Path("./home/.config"), home / ".config", PathRules(config_folders_exclusions)),
+            (Path("./home/.local"), home / ".local", no_rules),
+            (Path("./home/.gnome2"), home / ".gnome2", no_rules),
+            (Path("./home/.bashrc"), home / ".bashrc", no_rules),
+            (Path("./home/.face.icon"), home / ".face.icon", no_rules),
+            (Path("./home/.zshenv"), home / ".zshenv", no_rules),
+        ]
 
-        FileSystemManager.copy_with_exclusions(
-            src=Path("./home/.config"),
-            dst=home / ".config",
-            exclusions=config_folders_exclusions,
+        if not exclude_bspwm:
+            entries.append((Path("./home/.Xresources"), home / ".Xresources", no_rules))
+            entries.append((Path("./home/.xinitrc"), home / ".xinitrc", no_rules))
+
+        entries.append(
+            (
+                Path("./home/.icons/default/index.theme"),
+                home / ".icons" / "default" / "index.theme",
+                no_rules,
+            )
         )
+        return entries
 
-        shutil.copytree(
-            src=Path("./home/.local"),
-            dst=home / ".local",
-            dirs_exist_ok=True,
-        )
-        shutil.copytree(
-            src=Path("./home/.gnome2"),
-            dst=home / ".gnome2",
-            dirs_exist_ok=True,
-        )
-        shutil.copy(src=Path("./home/.bashrc"), dst=home / ".bashrc")
-        shutil.copy(src=Path("./home/.face.icon"), dst=home / ".face.icon")
-        shutil.copy(src=Path("./home/.zshenv"), dst=home / ".zshenv")
+    @staticmethod
+    def diff_dotfiles(exclude_bspwm: bool, exclude_hyprland: bool) -> Dict[str, List[str]]:
+        """Compare the dotfiles with the home directory without copying anything
 
-        if not exclude_bspwm:
-            shutil.copy(src=Path("./home/.Xresources"), dst=home / ".Xresources")
-            shutil.copy(src=Path("./home/.xinitrc"), dst=home / ".xinitrc")
+        Returns:
+            Dict[str, List[str]]: "new" and "changed" destination paths
+        """
+        diff: Dict[str, List[str]] = {"new": [], "changed": []}
+
+        def compare(src: Path, dst: Path) -> None:
+            if not dst.exists():
+                diff["new"].append(str(dst))
+            elif not filecmp.cmp(src, dst, shallow=False):
+                diff["changed"].append(str(dst))
 
-        destination = home / ".icons" / "default" / "index.theme"
-        destination.parent.mkdir(parents=True, exist_ok=True)
-        shutil.copy(src=Path("./home/.icons/default/index.theme"), dst=destination)
+        for src, dst in DotfileSync.walk(
+            FileSystemManager._dotfile_entries(exclude_bspwm, exclude_hyprland)
+        ):
+            compare(src, dst)
 
-        ##==> Выдаем права файлам в bin
+        return diff
+
+    @staticmethod
+    def copy_dotfiles(exclude_bspwm: bool, exclude_hyprland: bool) -> None:
+        logger.success("Starting the process of copying dotfiles")
+
+        ##==> Копирование дотфайлов
         ##############################################
-        error_msg = "[!] Error while making {path} executable: {err}"
-        for path in [home / ".config", home / ".local" / "bin"]:
-            try:
-                subprocess.run(["sudo", "chmod", "-R", "755", str(path)], check=True)
-            except subprocess.CalledProcessError as e:
-                logger.error(error_msg.format(path=path, err=e.stderr))
-            except Exception:
-                logger.error(error_msg.format(path=path, err=traceback.format_exc()))
+        # Пишутся только изменившиеся файлы, удалённые из репозитория - удаляются.
+        # Права выставляются каждому записанному файлу по манифесту, без chmod -R
+        DotfileSync().load().sync(
+            FileSystemManager._dotfile_entries(exclude_bspwm, exclude_hyprland)
+        )
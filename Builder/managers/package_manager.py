@@ -1,29 +1,106 @@
 import os
 import subprocess
 import traceback
-from typing import List
+from pathlib import Path
+from typing import Callable, List, Optional
 
 from loguru import logger
-from utils.schemes import AurHelper
+try:
+    from Builder.utils.aur_workspace import AurWorkspace
+    from Builder.utils.command_runner import CommandRunner
+    from Builder.utils.mirror_probe import MirrorProbe, arch_probe_url, parse_mirrorlist, render_mirrorlist
+    from Builder.utils.pacman_conf import PacmanConf, PacmanConfTransaction
+    from Builder.utils.pacman_db import LocalPackageIndex
+    from Builder.utils.privileged_helper import run_sudo
+    from Builder.utils.schemes import AurHelper
+except ImportError:
+    from utils.aur_workspace import AurWorkspace
+    from utils.command_runner import CommandRunner
+    from utils.mirror_probe import MirrorProbe, arch_probe_url, parse_mirrorlist, render_mirrorlist
+    from utils.pacman_conf import PacmanConf, PacmanConfTransaction
+    from utils.pacman_db import LocalPackageIndex
+    from utils.privileged_helper import run_sudo
+    from utils.schemes import AurHelper
 
 
 class PackageManager:
+    local_index = LocalPackageIndex()
+    # Подбирается по замеренной скорости загрузки, см. DownloadTuner
+    parallel_downloads = 5
+    # Собранные AUR хелперы, переиспользуются на следующих машинах
+    AUR_HELPER_CACHE = Path("/var/cache/meowrch/aur-helpers")
+
     @staticmethod
     def update_database() -> None:
         logger.info("Starting to update the package database.")
         error_msg = "Error updating package database: {err}"
         try:
-            subprocess.run(["sudo", "pacman", "-Sy"], check=True)
+            CommandRunner.run(["sudo", "pacman", "-Sy"], check=True)
             logger.success("The package database update was successful!")
         except subprocess.CalledProcessError as e:
             logger.error(error_msg.format(err=e.stderr))
         except Exception:
             logger.error(error_msg.format(err=traceback.format_exc()))
 
+    @staticmethod
+    def rank_mirrors(
+        mirrorlist_path: Path = Path("/etc/pacman.d/mirrorlist"),
+        probe: Optional[MirrorProbe] = None,
+        max_candidates: int = 50,
+    ) -> bool:
+        """Benchmark the mirrors and rewrite the mirrorlist fastest first
+
+        The active servers are probed; if there are none, the commented-out
+        ones shipped with pacman-mirrorlist are used as candidates. At most
+        max_candidates are probed, the other active servers stay in the list
+        after the ranked ones, and the header and comments of the file are kept.
+        """
+        logger.info("Ranking pacman mirrors...")
+        error_msg = "Error while ranking mirrors: {err}"
+        try:
+            content = mirrorlist_path.read_text()
+            active, commented = parse_mirrorlist(content)
+            candidates = (active or commented)[:max_candidates]
+            unprobed = active[max_candidates:]
+            if not candidates:
+                logger.warning("No mirrors found in the mirrorlist, ranking skipped")
+                return False
+
+            ranked, results = (probe or MirrorProbe()).rank(
+                {server: arch_probe_url(server) for server in candidates}
+            )
+            if not any(r.ok for r in results):
+                logger.warning("No mirror answered in time, keeping the mirrorlist as is")
+                return False
+
+            backup = mirrorlist_path.with_name(mirrorlist_path.name + ".meowrch-backup")
+            run_sudo(["cp", str(mirrorlist_path), str(backup)], check=True)
+            run_sudo(
+                ["tee", str(mirrorlist_path)],
+                input=render_mirrorlist(ranked, results, original=content, unprobed=unprobed),
+                stdout=subprocess.DEVNULL,
+                text=True,
+                check=True,
+            )
+            logger.success(f"Mirrorlist ranked, fastest mirror: {ranked[0]}")
+            return True
+        except subprocess.CalledProcessError as e:
+            logger.error(error_msg.format(err=e.stderr))
+        except Exception:
+            logger.error(error_msg.format(err=traceback.format_exc()))
+        return False
+
     @staticmethod
     def check_package_installed(package: str) -> bool:
+        if PackageManager.local_index.available():
+            try:
+                # Как pacman -Q: yay-bin удовлетворяет "yay"
+                return PackageManager.local_index.is_satisfied(package)
+            except Exception:
+                logger.debug(f"Local package index unavailable: {traceback.format_exc()}")
+
         try:
-            subprocess.run(
+            CommandRunner.run(
                 ["pacman", "-Q", package],
                 check=True,
                 stdout=subprocess.PIPE,
@@ -39,7 +116,7 @@ class PackageManager:
         try:
             os.makedirs(os.path.dirname(target_path), exist_ok=True)
 
-            subprocess.run(
+            CommandRunner.run(
                 ["git", "clone", repo_url, target_path],
                 check=True,
             )
@@ -52,65 +129,131 @@ class PackageManager:
             return False
 
     @staticmethod
-    def _install_aur_helper(helper_name: str, repo_url: str) -> None:
-        """Универсальная функция для установки AUR хелпера
-        
+    def _package_name_from_file(path: Path) -> str:
+        """Name of the package in a "<name>-<pkgver>-<pkgrel>-<arch>.pkg.tar.*" file"""
+        return path.name.split(".pkg.tar")[0].rsplit("-", 3)[0]
+
+    @staticmethod
+    def _install_helper_from_cache(candidates: List[str]) -> bool:
+        """Install an AUR helper package built earlier and kept in the local cache"""
+        cache = PackageManager.AUR_HELPER_CACHE
+        if not cache.is_dir():
+            return False
+
+        packages = sorted(cache.glob("*.pkg.tar*"), key=lambda p: p.stat().st_mtime, reverse=True)
+        for candidate in candidates:
+            for package in packages:
+                if package.name.endswith(".sig"):
+                    continue
+                if PackageManager._package_name_from_file(package) == candidate:
+                    CommandRunner.run(
+                        ["sudo", "pacman", "-U", "--noconfirm", "--needed", str(package)],
+                        check=True,
+                    )
+                    return True
+        return False
+
+    @staticmethod
+    def _install_helper_from_repo(package: str) -> bool:
+        """Install an AUR helper from a binary repository (Chaotic AUR)"""
+        result = CommandRunner.run(
+            ["sudo", "pacman", "-S", "--noconfirm", "--needed", package],
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        return result.returncode == 0
+
+    @staticmethod
+    def _build_aur_helper(pkgbase: str) -> bool:
+        """Build an AUR helper from its PKGBUILD, install it and cache the package
+
         Args:
-            helper_name (str): Имя хелпера для проверки установки
-            repo_url (str): URL репозитория для клонирования
+            pkgbase (str): AUR package base, e.g. "yay-bin" or "paru"
         """
-        logger.info(f'Starting the "{helper_name}" package manager installation process.')
-        target_path = f"/tmp/{helper_name}"
-        error_msg = f'Error while installing "{helper_name}": {{err}}'
-        
-        try:
-            PackageManager.install_packages(["git", "base-devel"])
+        PackageManager.install_packages(["git", "base-devel"])
+        workspace = AurWorkspace()
+        repo_path, commit = workspace.checkout(pkgbase)
+
+        # Тот же коммит PKGBUILD уже собирался на этой машине
+        built = [
+            str(p) for p in workspace.cached_artifacts(pkgbase, commit)
+            if PackageManager._package_name_from_file(p) == pkgbase
+        ]
+        if not built:
+            CommandRunner.run(["makepkg", "-sf", "--noconfirm"], cwd=repo_path, check=True)
+            packagelist = CommandRunner.run(
+                ["makepkg", "--packagelist"],
+                cwd=repo_path,
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.split()
 
-            if not PackageManager.check_package_installed(helper_name):
-                if not os.path.exists(target_path):
-                    cloned = PackageManager.clone_repository(
-                        repo_url=repo_url,
-                        target_path=target_path,
-                    )
+            # Отладочные пакеты (*-debug) не нужны
+            artifacts = [
+                Path(p) for p in packagelist
+                if os.path.exists(p) and PackageManager._package_name_from_file(Path(p)) == pkgbase
+            ]
+            if not artifacts:
+                return False
+            built = [str(p) for p in workspace.store(pkgbase, commit, artifacts)]
 
-                    if not cloned:
-                        return
+        CommandRunner.run(["sudo", "pacman", "-U", "--noconfirm", *built], check=True)
 
-                subprocess.run(["makepkg", "-si", "--noconfirm"], cwd=target_path, check=True)
+        # Сохраняем собранный пакет для следующих машин
+        try:
+            run_sudo(["mkdir", "-p", str(PackageManager.AUR_HELPER_CACHE)], check=True)
+            for path in built:
+                run_sudo(["cp", path, str(PackageManager.AUR_HELPER_CACHE)], check=True)
         except subprocess.CalledProcessError as e:
-            logger.error(error_msg.format(err=e.stderr))
-            exit(1)
-        except Exception:
-            logger.error(error_msg.format(err=traceback.format_exc()))
-            exit(1)
-
-        logger.success(f'Package "{helper_name}" has been successfully installed!')
+            logger.warning(f"Could not cache the built {pkgbase} package: {e.stderr}")
+        return True
 
     @staticmethod
-    def install_aur_helper(aur_helper: AurHelper) -> None:
+    def install_aur_helper(aur_helper: AurHelper, use_chaotic_aur: bool = False) -> None:
         """Универсальная функция для установки любого AUR хелпера
-        
+
+        Источники перебираются от самого быстрого к самому медленному:
+        собранный ранее пакет из локального кэша, бинарный пакет из Chaotic AUR,
+        PKGBUILD "-bin" и только потом сборка из исходников.
+
         Args:
             aur_helper (AurHelper): Тип AUR хелпера для установки
+            use_chaotic_aur (bool): Chaotic AUR подключён и может дать готовый пакет
         """
-        aur_helpers_config = {
-            AurHelper.YAY: "https://aur.archlinux.org/yay.git",
-            AurHelper.PARU: "https://aur.archlinux.org/paru.git",
-            AurHelper.YAY_BIN: "https://aur.archlinux.org/yay-bin.git"
-        }
-        
-        if aur_helper not in aur_helpers_config:
+        if aur_helper not in (AurHelper.YAY, AurHelper.PARU, AurHelper.YAY_BIN):
             logger.error(f"Unsupported AUR helper: {aur_helper}")
             exit(1)
 
-        yay_installed = PackageManager.check_package_installed("yay")
-        yay_bin_installed = PackageManager.check_package_installed("yay-bin")
-
-        if aur_helper.value in ["yay", "yay-bin"] and (yay_bin_installed or yay_installed):
+        name = aur_helper.value.removesuffix("-bin")
+        bin_name = f"{name}-bin"
+        if PackageManager.check_package_installed(name) or PackageManager.check_package_installed(bin_name):
             return
 
-        url = aur_helpers_config[aur_helper]
-        PackageManager._install_aur_helper(aur_helper.value, url)
+        logger.info(f'Starting the "{aur_helper.value}" package manager installation process.')
+        candidates = [bin_name] if aur_helper.value == bin_name else [name, bin_name]
+
+        sources = [("local cache", lambda: PackageManager._install_helper_from_cache(candidates))]
+        if use_chaotic_aur:
+            sources.append(("Chaotic AUR", lambda: PackageManager._install_helper_from_repo(name)))
+        sources.append((f"{bin_name} PKGBUILD", lambda: PackageManager._build_aur_helper(bin_name)))
+        if aur_helper.value != bin_name:
+            sources.append(("source build", lambda: PackageManager._build_aur_helper(name)))
+
+        error_msg = 'Error while installing "{name}" from {source}: {err}'
+        for source, install in sources:
+            try:
+                if install():
+                    logger.success(f'Package "{aur_helper.value}" has been successfully installed from {source}!')
+                    return
+                logger.info(f'"{aur_helper.value}" is not available from {source}')
+            except subprocess.CalledProcessError as e:
+                logger.warning(error_msg.format(name=aur_helper.value, source=source, err=e.stderr))
+            except Exception:
+                logger.warning(error_msg.format(name=aur_helper.value, source=source, err=traceback.format_exc()))
+
+        logger.error(f'Failed to install "{aur_helper.value}" from any source')
+        exit(1)
 
     @staticmethod
     def install_package(
@@ -135,9 +278,9 @@ class PackageManager:
                     aur_cmd = aur.value.replace("-bin", "")
                     env = os.environ.copy()
                     env["PKEXEC_UID"] = "99999"
-                    subprocess.run([aur_cmd, "-S", "--noconfirm", "--needed", package], check=True, env=env)
+                    CommandRunner.run([aur_cmd, "-S", "--noconfirm", "--needed", package], check=True, env=env)
                 else:
-                    subprocess.run(
+                    CommandRunner.run(
                         ["sudo", "pacman", "-S", "--noconfirm", "--needed", package],
                         check=True,
                     )
@@ -153,23 +296,32 @@ class PackageManager:
         return False
 
     @staticmethod
-    def install_packages(packages_list: List[str], aur: AurHelper = None) -> List[str]:
+    def install_packages(
+        packages_list: List[str],
+        aur: AurHelper = None,
+        single_transaction: bool = False,
+    ) -> List[str]:
         """Installs a lot of packages via pacman or some aur helper using batch processing
 
         Args:
             packages_list (List[str]): List of package names
             aur (AurHelper, optional): If you need to install via the AUR helper, you need to specify it here. Defaults to None.
+            single_transaction (bool, optional): Install the whole list in one transaction and
+                bisect it on failure instead of using fixed-size batches. Defaults to False.
 
         Returns:
             List[str]: List of packages that could not be installed
         """
+        if single_transaction:
+            return PackageManager.install_packages_transaction(packages_list, aur=aur)
+
         not_installed_packages = []
-        batch_size = 5  # Соответствует ParallelDownloads = 5
+        batch_size = PackageManager.parallel_downloads
         
         try:
             logger.info(f"Starting installation of {len(packages_list)} packages in batches of {batch_size}")
             
-            # Разделяем список пакетов на батчи по 5 штук
+            # Разделяем список пакетов на батчи по числу параллельных загрузок
             for i in range(0, len(packages_list), batch_size):
                 try:
                     batch = packages_list[i:i + batch_size]
@@ -202,6 +354,74 @@ class PackageManager:
             not_installed_packages.extend(packages_list)
 
         return not_installed_packages
+
+    @staticmethod
+    def install_packages_transaction(packages_list: List[str], aur: AurHelper = None) -> List[str]:
+        """Installs all packages in a single transaction, bisecting the list on failure
+
+        pacman resolves dependencies and runs its hooks once per transaction, so the
+        whole list is tried at once. If that fails, the list is split in halves and
+        each half is retried recursively until the packages that break the
+        transaction are isolated. With k bad packages out of n this needs about
+        k * log2(n) transactions; halves that succeed are installed on the way.
+
+        Args:
+            packages_list (List[str]): List of package names
+            aur (AurHelper, optional): If you need to install via the AUR helper, you need to specify it here. Defaults to None.
+
+        Returns:
+            List[str]: List of packages that could not be installed
+        """
+        if not packages_list:
+            return []
+
+        logger.info(f"Starting installation of {len(packages_list)} packages in a single transaction")
+
+        try:
+            failed = PackageManager._bisect_install(list(packages_list), aur)
+        except Exception as e:
+            logger.error(f"Critical error in package installation process: {e}")
+            return list(packages_list)
+
+        if failed:
+            logger.warning(f"Packages that broke the transaction: {', '.join(failed)}")
+        else:
+            logger.success(f"All {len(packages_list)} packages have been installed in one transaction")
+
+        return failed
+
+    @staticmethod
+    def _bisect_install(
+        packages: List[str],
+        aur: AurHelper = None,
+        install_batch: Optional[Callable[[List[str]], bool]] = None,
+    ) -> List[str]:
+        """Recursively installs a list of packages and returns the ones that fail on their own
+
+        Args:
+            packages (List[str]): Packages (or package files) to install
+            aur (AurHelper, optional): AUR helper passed to _install_batch. Defaults to None.
+            install_batch (Callable, optional): Custom installer for one transaction,
+                e.g. ``pacman -U`` for built packages. Defaults to _install_batch.
+        """
+        if install_batch is not None:
+            installed = install_batch(packages)
+        else:
+            installed = PackageManager._install_batch(packages, aur)
+
+        if installed:
+            return []
+
+        if len(packages) == 1:
+            logger.error(f'Package "{packages[0]}" could not be installed')
+            return packages
+
+        middle = len(packages) // 2
+        logger.info(f"Transaction of {len(packages)} packages failed, splitting it in two")
+        return (
+            PackageManager._bisect_install(packages[:middle], aur, install_batch)
+            + PackageManager._bisect_install(packages[middle:], aur, install_batch)
+        )
     
     @staticmethod
     def _install_batch(packages_batch: List[str], aur: AurHelper = None) -> bool:
@@ -223,7 +443,7 @@ class PackageManager:
             else:
                 cmd = ["sudo", "pacman", "-S", "--noconfirm", "--needed"] + packages_batch
             
-            subprocess.run(cmd, check=True)
+            CommandRunner.run(cmd, check=True)
             logger.success(f'Batch "{packages_str}" has been successfully installed!')
             return True
             
@@ -235,58 +455,38 @@ class PackageManager:
         return False
 
     @staticmethod
-    def update_pacman_conf(*, enable_multilib: bool = False):
-        pacman_config_path = "/etc/pacman.conf"
-        temp_pacman_config_path = "/tmp/meowrhc-pacman.conf"
-
-        updated_lines = []
-        multilib_found = False
-        multilib_section = "[multilib]"
-        multilib_repo = "Include = /etc/pacman.d/mirrorlist"
-        options = {
-            "ParallelDownloads": "5",
-            "VerbosePkgLists": "",
-            "ILoveCandy": "",
-            "Color": "",
-        }
-
-        if os.path.isfile(pacman_config_path):
-            with open(pacman_config_path, "r") as file:
-                lines = file.readlines()
-
-            for line in lines:
-                if line.startswith("#") and any(opt in line for opt in options.keys()):
-                    line = line[1:]
-
-                for key, value in options.items():
-                    if key in line:
-                        if value == "":
-                            line = f"{key}\n"
-                        else:
-                            line = f"{key} = {value}\n"
-                        break
-
-                if line.startswith(multilib_section):
-                    multilib_found = True
-
-                updated_lines.append(line)
-
-            if not multilib_found and enable_multilib:
-                updated_lines.append(f"\n{multilib_section}\n{multilib_repo}\n")
-
-            with open(temp_pacman_config_path, "w") as file:
-                file.writelines(updated_lines)
-
-            error_msg = "Error while configuring pacman: {err}"
-            try:
-                subprocess.run(
-                    ["sudo", "mv", temp_pacman_config_path, pacman_config_path],
-                    check=True,
-                )
-                logger.success("Pacman has been successfully configured!")
-            except subprocess.CalledProcessError as e:
-                logger.error(err=error_msg.format(e.stderr))
-            except Exception:
-                logger.error(err=error_msg.format(traceback.format_exc()))
-        else:
-            logger.warning("Pacman configuration skipped... (file not found)")
+    def configure_pacman_conf(conf: PacmanConf, *, enable_multilib: bool = False) -> None:
+        """Apply the meowrch options (and multilib) to a pacman.conf model"""
+        conf.set("options", "ParallelDownloads", str(PackageManager.parallel_downloads))
+        for flag in ("VerbosePkgLists", "ILoveCandy", "Color"):
+            conf.set("options", flag)
+
+        if enable_multilib:
+            conf.add_section("multilib", [("Include", "/etc/pacman.d/mirrorlist")])
+
+    @staticmethod
+    def render_pacman_conf(lines: List[str], *, enable_multilib: bool = False) -> List[str]:
+        """Return the lines of pacman.conf with the meowrch options applied"""
+        conf = PacmanConf("".join(lines))
+        PackageManager.configure_pacman_conf(conf, enable_multilib=enable_multilib)
+        return conf.render().splitlines(keepends=True)
+
+    @staticmethod
+    def set_parallel_downloads(value: int) -> None:
+        """Apply a tuned ParallelDownloads value to pacman.conf and the batch size"""
+        if value == PackageManager.parallel_downloads:
+            return
+        logger.info(f"Setting ParallelDownloads = {value}")
+        PackageManager.parallel_downloads = value
+        # Исходный файл уже сохранён транзакцией pacman_setup, меняется одна опция
+        PacmanConfTransaction(backup=False).stage(
+            "ParallelDownloads",
+            lambda conf: conf.set("options", "ParallelDownloads", str(value)),
+        ).commit()
+
+    @staticmethod
+    def update_pacman_conf(*, enable_multilib: bool = False) -> bool:
+        return PacmanConfTransaction().stage(
+            "meowrch options",
+            lambda conf: PackageManager.configure_pacman_conf(conf, enable_multilib=enable_multilib),
+        ).commit()
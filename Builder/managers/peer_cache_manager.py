@@ -0,0 +1,100 @@
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from loguru import logger
+
+try:
+    from Builder.utils.pacman_conf import PacmanConfTransaction
+    from Builder.utils.peer_cache import PeerCache, PeerCacheServer, add_peers, remove_peers
+except ImportError:
+    from utils.pacman_conf import PacmanConfTransaction
+    from utils.peer_cache import PeerCache, PeerCacheServer, add_peers, remove_peers
+
+
+class PeerCacheManager:
+    """LAN package-cache sharing between installers running side by side.
+
+    Every installer serves its pacman cache over HTTP and puts the peers it
+    finds first in every repository of pacman.conf. A package a peer does
+    not have is answered with 404 and pacman falls back to the regular
+    mirrors. Locally built AUR packages are never served: they share file
+    names with the signed Chaotic AUR builds. The peer entries are removed
+    from pacman.conf at the end of the installation.
+    """
+
+    PACMAN_CONF = Path("/etc/pacman.conf")
+    CACHE_DIRS = [Path("/var/cache/pacman/pkg")]
+
+    def __init__(
+        self,
+        configured_peers: Optional[List[str]] = None,
+        serve: bool = True,
+        linger_seconds: int = 0,
+    ):
+        """
+        Args:
+            linger_seconds: How long to keep serving after the installation
+                finished, for peers that are still downloading
+        """
+        self.configured_peers = configured_peers or []
+        self.serve = serve
+        self.linger_seconds = linger_seconds
+        self.server: Optional[PeerCacheServer] = None
+        self.client = PeerCache([])
+
+    @property
+    def peers(self) -> List[str]:
+        return self.client.peers
+
+    def start(self) -> None:
+        """Start serving the local caches and look for peers"""
+        if self.serve:
+            try:
+                self.server = PeerCacheServer(self.CACHE_DIRS)
+                self.server.start()
+            except OSError as e:
+                logger.warning(f"Unable to share the package cache with peers: {e}")
+                self.server = None
+
+        self.client.peers = PeerCache.discover(
+            self.configured_peers,
+            exclude_id=self.server.instance_id if self.server else None,
+        )
+        if self.client.peers:
+            logger.info(f"Package cache peers: {', '.join(self.client.peers)}")
+        else:
+            logger.info("No package cache peers found, the regular mirrors will be used")
+
+    def activate(self) -> bool:
+        """Put the peers in front of the mirrors of every configured repository"""
+        if not self.client.peers:
+            return True
+        peers = self.client.peers
+        return self._transaction().stage("LAN package cache peers", lambda conf: add_peers(conf, peers)).commit()
+
+    def deactivate(self) -> bool:
+        """Remove the peer Server entries from pacman.conf"""
+        return self._transaction().stage("remove LAN package cache peers", remove_peers).commit()
+
+    def linger(self) -> None:
+        """Keep serving for linger_seconds so peers can finish their downloads"""
+        if self.server is None or self.linger_seconds <= 0:
+            return
+        logger.info(
+            f"Sharing the package cache with LAN peers for {self.linger_seconds}s more "
+            "(Ctrl+C to stop now)"
+        )
+        try:
+            time.sleep(self.linger_seconds)
+        except KeyboardInterrupt:
+            pass
+
+    def stop(self) -> None:
+        if self.server is not None:
+            logger.info(f"Served {self.server.served_files} package(s) to LAN peers")
+            self.server.stop()
+            self.server = None
+
+    def _transaction(self) -> PacmanConfTransaction:
+        return PacmanConfTransaction(self.PACMAN_CONF)
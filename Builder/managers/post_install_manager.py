@@ -167,8 +167,9 @@ class PostInstallation:
         bin_path = os.path.expanduser("~/.local/bin/")
 
         try:
+            # Закрытый каталог закрывает всё содержимое, обход дерева не нужен
             subprocess.run(
-                ["chmod", "-R", "700", config_path, bin_path], check=True
+                ["chmod", "700", config_path, bin_path], check=True
             )
             logger.success("The correct permissions have been granted for the configs and scripts!")
         except subprocess.CalledProcessError as e:
@@ -0,0 +1,148 @@
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import traceback
+from pathlib import Path
+from typing import List, Optional
+
+from loguru import logger
+
+from .aur_build_manager import AurBuildManager
+
+try:
+    from Builder.utils.command_runner import CommandRunner
+    from Builder.utils.download_tuner import DownloadTuner
+    from Builder.utils.pacman_db import SyncDatabase
+except ImportError:
+    from utils.command_runner import CommandRunner
+    from utils.download_tuner import DownloadTuner
+    from utils.pacman_db import SyncDatabase
+
+
+class PackagePrefetcher:
+    """Downloads packages in the background while other install steps run.
+
+    Repository packages are fetched into the pacman cache with ``pacman -Sw``
+    and AUR sources are downloaded into the AUR build root. The install
+    transactions later find everything in a warm cache. The AUR part needs
+    git and makepkg, which Builder installs while setting up pacman.
+
+    pacman locks its database directory for the whole ``-Sw`` run, which would
+    block every other pacman call made meanwhile (Chaotic AUR setup, AUR
+    helper bootstrap). The download therefore runs against a private copy of
+    the sync databases with ``--dbpath`` and only shares the package cache.
+
+    The first packages are downloaded with the default parallelism to measure
+    the link; the rest use the ParallelDownloads value chosen by
+    DownloadTuner through a private copy of pacman.conf. The chosen value is
+    kept in ``parallel_downloads`` for Builder to apply system-wide.
+    """
+
+    PACMAN_DB_PATH = Path("/var/lib/pacman")
+    PACMAN_CONF = Path("/etc/pacman.conf")
+    CACHE_DIR = Path("/var/cache/pacman/pkg")
+    WARMUP_PACKAGES = 15
+    # Нужны для клонирования и makepkg --verifysource
+    AUR_TOOLS = ("git", "makepkg")
+
+    def __init__(self, sync_db: Optional[SyncDatabase] = None, aur_builder: Optional[AurBuildManager] = None):
+        self.sync_db = sync_db or SyncDatabase()
+        self.aur_builder = aur_builder
+        self._threads: List[threading.Thread] = []
+        self.parallel_downloads: Optional[int] = None
+
+    def start(self, pacman: List[str], aur: List[str]) -> None:
+        """Start prefetching in background threads and return immediately"""
+        targets = [
+            ("repository packages", "prefetch_repo", self._prefetch_repo, pacman),
+            ("AUR sources", "prefetch_aur", self._prefetch_aur, aur),
+        ]
+        for name, phase, func, packages in targets:
+            if not packages:
+                continue
+            thread = threading.Thread(
+                target=self._timed, args=(name, phase, func, packages), name=f"prefetch-{name}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def wait(self) -> None:
+        """Block until all prefetch threads have finished"""
+        if any(t.is_alive() for t in self._threads):
+            logger.info("Waiting for the package prefetch to finish...")
+        for thread in self._threads:
+            thread.join()
+        self._threads.clear()
+
+    @staticmethod
+    def _timed(name: str, phase: str, func, packages: List[str]) -> None:
+        start = time.monotonic()
+        try:
+            # Свой этап: основной поток в это время в других этапах
+            with CommandRunner.phase(phase):
+                func(packages)
+            logger.info(f"Prefetch of {name} finished in {time.monotonic() - start:.1f}s")
+        except Exception:
+            logger.warning(f"Prefetch of {name} failed: {traceback.format_exc()}")
+
+    def _prefetch_repo(self, packages: List[str]) -> None:
+        # A single unknown name makes pacman reject the whole -Sw transaction
+        packages = [p for p in packages if self.sync_db.has_package(p)]
+        if not packages:
+            return
+
+        with tempfile.TemporaryDirectory(prefix="meowrch-prefetch-", ignore_cleanup_errors=True) as tmp:
+            db_path = Path(tmp)
+            (db_path / "local").symlink_to(self.PACMAN_DB_PATH / "local")
+            shutil.copytree(self.PACMAN_DB_PATH / "sync", db_path / "sync")
+
+            logger.info(f"Prefetching {len(packages)} repository packages into {self.CACHE_DIR}")
+            warmup, rest = packages[:self.WARMUP_PACKAGES], packages[self.WARMUP_PACKAGES:]
+
+            throughput = DownloadTuner(self.CACHE_DIR).measure(
+                lambda: self._download(db_path, warmup)
+            )
+            if throughput is not None:
+                self.parallel_downloads = DownloadTuner.choose(throughput)
+                CommandRunner.annotate("download_throughput", round(throughput))
+                CommandRunner.annotate("parallel_downloads", self.parallel_downloads)
+                logger.info(f"Using ParallelDownloads = {self.parallel_downloads} for the rest of the run")
+
+            if not rest:
+                return
+
+            config = None
+            if self.parallel_downloads is not None:
+                config = db_path / "pacman.conf"
+                config.write_text(
+                    DownloadTuner.render_config(self.PACMAN_CONF.read_text(), self.parallel_downloads)
+                )
+            self._download(db_path, rest, config)
+
+    def _download(self, db_path: Path, packages: List[str], config: Optional[Path] = None) -> None:
+        command = [
+            "sudo", "-n", "pacman", "-Sw", "--noconfirm", "--needed",
+            "--dbpath", str(db_path), "--cachedir", str(self.CACHE_DIR),
+        ]
+        if config is not None:
+            command += ["--config", str(config)]
+
+        # -n: never prompt for a password from a background thread
+        result = CommandRunner.run(
+            command + packages,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        if result.returncode != 0:
+            logger.warning(f"Repository prefetch did not complete: {result.stderr.strip()}")
+
+    def _prefetch_aur(self, packages: List[str]) -> None:
+        missing = [tool for tool in self.AUR_TOOLS if shutil.which(tool) is None]
+        if missing:
+            logger.info(f"Skipping the AUR source prefetch, {', '.join(missing)} is not installed yet")
+            return
+        builder = self.aur_builder or AurBuildManager(sync_db=self.sync_db)
+        builder.prefetch_sources(packages)
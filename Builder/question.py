@@ -81,8 +81,7 @@ class Question:
                     info.selected = False
 
     @staticmethod
-    def get_answers():
-        answers: Question.answers_type = {}
+    def _questions() -> List[Union[QuestionCheckbox, QuestionList]]:
         firefox_choices = [
             f"Dark Reader | {Fore.YELLOW}Changes light themes to dark themes on all sites",
             f"uBlock Origin | {Fore.YELLOW}Blocks ads",
@@ -91,7 +90,7 @@ class Question:
             f"Voice Over Translation | {Fore.YELLOW}Adds voice translation for videos from YaBrowser."
         ]
 
-        quests: List[Union[QuestionCheckbox, QuestionList]] = [
+        return [
             QuestionList(
                 name="make_backup",
                 message="1) Want to backup your configurations?",
@@ -143,12 +142,28 @@ class Question:
             ),
         ]
 
-        for question in quests:
+    @staticmethod
+    def get_answers():
+        answers: Question.answers_type = {}
+
+        for question in Question._questions():
             clear_and_banner()
             answer = inquirer.prompt([question])
             answers.update(answer)
 
         Question._choose_custom_packages()
+        return Question._build_options(answers)
+
+    @staticmethod
+    def get_default_answers():
+        """Answers the survey would get if every default was accepted"""
+        answers: Question.answers_type = {
+            question.name: question.default for question in Question._questions()
+        }
+        return Question._build_options(answers)
+
+    @staticmethod
+    def _build_options(answers: answers_type) -> BuildOptions:
         answers["ff_plugins"] = [
             i.split(" | ")[0] for i in answers["ff_plugins"]
         ]
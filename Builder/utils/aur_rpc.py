@@ -0,0 +1,49 @@
+import json
+import urllib.parse
+import urllib.request
+from typing import Dict, Iterable, List
+
+from loguru import logger
+
+
+class AurRpc:
+    """Minimal client for the AUR RPC interface (https://aur.archlinux.org/rpc)."""
+
+    RPC_URL = "https://aur.archlinux.org/rpc/v5/info"
+    CHUNK_SIZE = 100  # Keeps the query string well below URL length limits
+
+    def __init__(self, rpc_url: str = RPC_URL, timeout: float = 15):
+        self.rpc_url = rpc_url
+        self.timeout = timeout
+
+    def info(self, names: Iterable[str]) -> Dict[str, dict]:
+        """Fetch AUR metadata for the given package names.
+
+        Returns:
+            Dict[str, dict]: Package name -> RPC result (Name, PackageBase,
+            Version, Depends, MakeDepends, ...). Names missing from the AUR are
+            not present in the result.
+
+        Raises:
+            OSError: If the AUR cannot be reached.
+        """
+        names = list(dict.fromkeys(names))
+        results: Dict[str, dict] = {}
+
+        for i in range(0, len(names), self.CHUNK_SIZE):
+            chunk = names[i:i + self.CHUNK_SIZE]
+            query = urllib.parse.urlencode([("arg[]", name) for name in chunk])
+            with urllib.request.urlopen(f"{self.rpc_url}?{query}", timeout=self.timeout) as response:
+                payload = json.loads(response.read().decode("utf-8"))
+
+            if payload.get("type") == "error":
+                raise OSError(f"AUR RPC error: {payload.get('error')}")
+
+            for result in payload.get("results", []):
+                results[result["Name"]] = result
+
+        logger.debug(f"AUR RPC returned {len(results)} of {len(names)} requested packages")
+        return results
+
+    def existing(self, names: Iterable[str]) -> List[str]:
+        return list(self.info(names))
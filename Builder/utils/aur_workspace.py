@@ -0,0 +1,135 @@
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+from loguru import logger
+
+from .command_runner import CommandRunner
+
+
+class AurWorkspace:
+    """Persistent AUR clones and built packages shared between runs.
+
+    Clones live in ``<root>/<pkgbase>`` and are updated with a shallow
+    ``git fetch``. The workspace belongs to the installer alone: AUR helpers
+    started by system-update.sh keep their clones in a separate tree, since
+    they do not expect the resets and eviction done here.
+
+    Built packages are stored content-addressed under
+    ``<root>/.artifacts/<pkgbase>/<commit>/``: as long as the PKGBUILD commit
+    does not change, the stored packages are reused instead of rebuilding.
+    Old entries are evicted by age and by the total size of the workspace.
+    """
+
+    ROOT = Path.home() / ".cache" / "meowrch" / "aur"
+    AUR_GIT_URL = "https://aur.archlinux.org/{pkgbase}.git"
+    ARTIFACTS_DIR = ".artifacts"
+
+    def __init__(
+        self,
+        root: Path = ROOT,
+        max_age_days: int = 60,
+        max_size: int = 10 * 1024 ** 3,
+    ):
+        self.root = root
+        self.max_age = max_age_days * 24 * 3600
+        self.max_size = max_size
+
+    def checkout(self, pkgbase: str) -> Tuple[Path, str]:
+        """Clone or update the AUR repository of a pkgbase
+
+        Returns:
+            Tuple[Path, str]: Path of the clone and its HEAD commit
+        """
+        repo_path = self.root / pkgbase
+        if (repo_path / ".git").exists():
+            self._git(repo_path, "fetch", "-q", "--depth", "1", "origin")
+            self._git(repo_path, "reset", "-q", "--hard", "FETCH_HEAD")
+        else:
+            self.root.mkdir(parents=True, exist_ok=True)
+            CommandRunner.run(
+                ["git", "clone", "-q", "--depth", "1", self.AUR_GIT_URL.format(pkgbase=pkgbase), str(repo_path)],
+                check=True,
+                capture_output=True,
+                text=True,
+            )
+        os.utime(repo_path)
+        return repo_path, self._git(repo_path, "rev-parse", "HEAD").strip()
+
+    def cached_artifacts(self, pkgbase: str, commit: str) -> List[Path]:
+        """Packages built earlier from exactly this commit"""
+        entry = self._entry(pkgbase, commit)
+        if not entry.is_dir():
+            return []
+        os.utime(entry)
+        return sorted(p for p in entry.glob("*.pkg.tar*") if not p.name.endswith(".sig"))
+
+    def store(self, pkgbase: str, commit: str, artifacts: List[Path]) -> List[Path]:
+        """Keep built packages for reuse, returns their paths in the store"""
+        entry = self._entry(pkgbase, commit)
+        entry.mkdir(parents=True, exist_ok=True)
+
+        stored = []
+        for artifact in artifacts:
+            destination = entry / artifact.name
+            if artifact.resolve() != destination.resolve():
+                shutil.copy2(artifact, destination)
+            stored.append(destination)
+        return stored
+
+    def evict(self) -> None:
+        """Drop entries unused for longer than max_age, then the oldest ones above max_size"""
+        if not self.root.is_dir():
+            return
+
+        now = time.time()
+        entries = [
+            p for p in (self.root / self.ARTIFACTS_DIR).glob("*/*") if p.is_dir()
+        ] + [
+            p for p in self.root.iterdir() if p.is_dir() and p.name != self.ARTIFACTS_DIR
+        ]
+        entries.sort(key=lambda p: p.stat().st_mtime)
+
+        sizes = {entry: self._size(entry) for entry in entries}
+        total = sum(sizes.values())
+        removed = 0
+
+        for entry in entries:
+            too_old = now - entry.stat().st_mtime > self.max_age
+            if not too_old and total <= self.max_size:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= sizes[entry]
+            removed += 1
+
+        for pkgbase_dir in (self.root / self.ARTIFACTS_DIR).glob("*"):
+            if pkgbase_dir.is_dir() and not any(pkgbase_dir.iterdir()):
+                pkgbase_dir.rmdir()
+
+        if removed:
+            logger.info(f"Evicted {removed} entries from the AUR workspace {self.root}")
+
+    def _entry(self, pkgbase: str, commit: str) -> Path:
+        return self.root / self.ARTIFACTS_DIR / pkgbase / commit
+
+    @staticmethod
+    def _size(path: Path) -> int:
+        size = 0
+        for root, _, files in os.walk(path):
+            for name in files:
+                try:
+                    size += os.lstat(os.path.join(root, name)).st_size
+                except OSError:
+                    pass
+        return size
+
+    @staticmethod
+    def _git(repo_path: Path, *args: str) -> str:
+        return CommandRunner.run(
+            ["git", "-C", str(repo_path), *args],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
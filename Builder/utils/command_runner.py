@@ -0,0 +1,169 @@
+import json
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from loguru import logger
+
+
+@dataclass
+class CommandRecord:
+    command: List[str]
+    phase: str
+    duration: float
+    exit_code: Optional[int]
+    output_bytes: int
+
+
+class CommandRunner:
+    """Central wrapper around subprocess.run that records what every command cost.
+
+    Managers call CommandRunner.run exactly like subprocess.run. Each call is
+    recorded with its duration, exit code and captured output size under the
+    current Builder phase, and write_report() turns the records into a JSON
+    timing report with the slowest commands on top. The phase is tracked per
+    thread, so background threads report their commands under their own phase.
+    """
+
+    records: List[CommandRecord] = []
+    phases: Dict[str, float] = {}
+    metadata: Dict[str, Any] = {}
+    _local = threading.local()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def run(command: List[str], **kwargs) -> subprocess.CompletedProcess:
+        started = time.monotonic()
+        exit_code: Optional[int] = None
+        output_bytes = 0
+
+        try:
+            result = subprocess.run(command, **kwargs)
+            exit_code = result.returncode
+            output_bytes = CommandRunner._output_size(result.stdout, result.stderr)
+            return result
+        except subprocess.CalledProcessError as e:
+            exit_code = e.returncode
+            output_bytes = CommandRunner._output_size(e.stdout, e.stderr)
+            raise
+        except subprocess.TimeoutExpired as e:
+            output_bytes = CommandRunner._output_size(e.stdout, e.stderr)
+            raise
+        finally:
+            CommandRunner._record(command, time.monotonic() - started, exit_code, output_bytes)
+
+    @staticmethod
+    @contextmanager
+    def phase(name: str) -> Iterator[None]:
+        """Group the commands the calling thread runs inside the block under a Builder phase"""
+        previous = CommandRunner.current_phase()
+        CommandRunner._local.phase = name
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            with CommandRunner._lock:
+                CommandRunner.phases[name] = (
+                    CommandRunner.phases.get(name, 0.0) + time.monotonic() - started
+                )
+            CommandRunner._local.phase = previous
+
+    @staticmethod
+    def current_phase() -> str:
+        """Phase of the calling thread, "setup" outside any phase"""
+        return getattr(CommandRunner._local, "phase", "setup")
+
+    @staticmethod
+    def bind(func: Callable) -> Callable:
+        """Wrap func so worker threads record its commands under the caller's phase"""
+        phase = CommandRunner.current_phase()
+
+        def run_in_phase(*args, **kwargs):
+            previous = CommandRunner.current_phase()
+            CommandRunner._local.phase = phase
+            try:
+                return func(*args, **kwargs)
+            finally:
+                CommandRunner._local.phase = previous
+
+        return run_in_phase
+
+    @staticmethod
+    def annotate(key: str, value: Any) -> None:
+        """Attach a run-wide value (e.g. tuned settings) to the report"""
+        with CommandRunner._lock:
+            CommandRunner.metadata[key] = value
+
+    @staticmethod
+    def report(top_n: int = 10) -> dict:
+        with CommandRunner._lock:
+            records = list(CommandRunner.records)
+            phases = dict(CommandRunner.phases)
+            metadata = dict(CommandRunner.metadata)
+
+        summary: Dict[str, dict] = {
+            name: {"duration": round(duration, 3), "commands": 0, "command_time": 0.0}
+            for name, duration in phases.items()
+        }
+        for record in records:
+            entry = summary.setdefault(
+                record.phase, {"duration": None, "commands": 0, "command_time": 0.0}
+            )
+            entry["commands"] += 1
+            entry["command_time"] = round(entry["command_time"] + record.duration, 3)
+
+        slowest = sorted(records, key=lambda r: r.duration, reverse=True)[:top_n]
+        return {
+            "metadata": metadata,
+            "phases": summary,
+            "slowest": [asdict(r) for r in slowest],
+            "commands": [asdict(r) for r in records],
+        }
+
+    @staticmethod
+    def write_report(path: Path, top_n: int = 10) -> None:
+        """Write the JSON timing report and log the slowest commands"""
+        report = CommandRunner.report(top_n)
+        try:
+            path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+            logger.info(f"Timing report written to {path}")
+        except OSError as e:
+            logger.warning(f"Failed to write timing report {path}: {e}")
+
+        for name, entry in report["phases"].items():
+            logger.info(
+                f'Phase "{name}": {entry["duration"]}s, '
+                f'{entry["commands"]} command(s) taking {entry["command_time"]}s'
+            )
+        for record in report["slowest"]:
+            logger.info(
+                f'{record["duration"]:8.2f}s [{record["phase"]}] '
+                f'exit={record["exit_code"]} {" ".join(record["command"])}'
+            )
+
+    @staticmethod
+    def _record(command: List[str], duration: float, exit_code: Optional[int], output_bytes: int) -> None:
+        with CommandRunner._lock:
+            CommandRunner.records.append(
+                CommandRecord(
+                    command=[str(part) for part in command],
+                    phase=CommandRunner.current_phase(),
+                    duration=round(duration, 3),
+                    exit_code=exit_code,
+                    output_bytes=output_bytes,
+                )
+            )
+
+    @staticmethod
+    def _output_size(*outputs) -> int:
+        size = 0
+        for output in outputs:
+            if isinstance(output, str):
+                size += len(output.encode("utf-8", errors="replace"))
+            elif isinstance(output, bytes):
+                size += len(output)
+        return size
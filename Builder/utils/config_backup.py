@@ -3,6 +3,8 @@ from pathlib import Path
 from typing import Iterable
 import subprocess
 
+from .privileged_helper import PrivilegedHelper
+
 
 class ConfigBackup:
     DEFAULT_PATHS = [
@@ -20,11 +22,20 @@ class ConfigBackup:
 
     @staticmethod
     def backup_files(paths: Iterable[str]) -> None:
-        for p in paths:
-            src = Path(p)
-            if not src.exists():
-                continue
-            dst = ConfigBackup._next_backup_path(src)
+        pairs = [
+            (Path(p), ConfigBackup._next_backup_path(Path(p)))
+            for p in paths
+            if Path(p).exists()
+        ]
+        if PrivilegedHelper.running():
+            # Все копии одним запросом к помощнику
+            PrivilegedHelper.batch([
+                {"op": "copy", "src": str(src), "dst": str(dst), "preserve": True}
+                for src, dst in pairs
+            ])
+            return
+
+        for src, dst in pairs:
             try:
                 subprocess.run(["sudo", "cp", "--preserve=all", str(src), str(dst)], check=True)
             except Exception:
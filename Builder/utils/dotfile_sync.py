@@ -0,0 +1,244 @@
+import hashlib
+import json
+import os
+import stat
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from loguru import logger
+
+from .copy_engine import CopyEngine
+from .path_rules import PathRules
+
+
+@dataclass
+class SyncReport:
+    added: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    unchanged: int = 0
+
+    def summary(self) -> str:
+        return (
+            f"{len(self.added)} added, {len(self.changed)} changed, "
+            f"{len(self.removed)} removed, {self.unchanged} unchanged"
+        )
+
+
+class DotfileSync:
+    """Incremental deployment of the dotfiles based on a manifest.
+
+    The manifest records every deployed file with the absolute path of its
+    source and source root in the repository, its size, mtime, SHA-256 and
+    mode. On the next run a file is only written when its source or the
+    deployed copy changed, and deployed files whose source was removed from
+    a still existing source root are deleted. A file
+    whose size and mtime match the manifest is not even read, so a no-op
+    update only costs one stat() per file. Modes are set per file on what
+    was deployed: scripts get 0755, everything else 0644.
+    """
+
+    STATE_DIR = Path.home() / ".local" / "state" / "meowrch"
+    FILE_NAME = "dotfiles-manifest.json"
+
+    def __init__(self, state_dir: Path = STATE_DIR, engine: Optional[CopyEngine] = None):
+        self.path = state_dir / self.FILE_NAME
+        self.engine = engine or CopyEngine()
+        self.files: Dict[str, dict] = {}
+
+    def load(self) -> "DotfileSync":
+        try:
+            self.files = json.loads(self.path.read_text(encoding="utf-8")).get("files", {})
+        except FileNotFoundError:
+            self.files = {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Dotfile manifest {self.path} is unreadable, all files will be copied: {e}")
+            self.files = {}
+        return self
+
+    def sync(self, entries: List[Tuple[Path, Path, PathRules]]) -> SyncReport:
+        """Deploy the dotfiles and update the manifest
+
+        Args:
+            entries: (source, destination, exclusion rules) as returned by
+                FileSystemManager._dotfile_entries
+
+        Returns:
+            SyncReport: What was added, changed and removed
+        """
+        report = SyncReport()
+        deployed: Dict[str, dict] = {}
+        pending: List[Tuple[str, Path, Path, os.stat_result, str, bool, dict]] = []
+
+        for src, dst, root in self._walk_entries(entries):
+            key = str(dst)
+            src_stat = src.stat()
+            dst_stat = self._stat(dst)
+            previous = self.files.get(key)
+            # Абсолютные пути: манифест не зависит от каталога, из которого запущен установщик
+            origin = {"source": str(src), "root": str(root)}
+
+            if previous is not None and self._is_current(previous, src_stat, dst_stat):
+                deployed[key] = self._apply_mode(dst, dst_stat, {**previous, **origin}, src)
+                report.unchanged += 1
+                continue
+
+            digest = self.hash_file(src)
+            if previous is not None and previous["hash"] == digest and self._dst_matches(previous, dst_stat):
+                # Источник только "потрогали" (git checkout), содержимое то же
+                deployed[key] = self._apply_mode(
+                    dst, dst_stat, {**previous, **origin, "mtime": src_stat.st_mtime_ns}, src
+                )
+                report.unchanged += 1
+                continue
+
+            pending.append((key, src, dst, src_stat, digest, dst_stat is not None, origin))
+
+        # Изменившиеся файлы копируются параллельно одним пакетом
+        for _, _, dst, _, _, _, _ in pending:
+            dst.parent.mkdir(parents=True, exist_ok=True)
+        stats = self.engine.copy_files([(src, dst) for _, src, dst, _, _, _, _ in pending])
+
+        for key, src, dst, src_stat, digest, existed, origin in pending:
+            mode = self.file_mode(src, dst)
+            os.chmod(dst, mode)
+            deployed[key] = {
+                **origin,
+                "size": src_stat.st_size,
+                "mtime": src_stat.st_mtime_ns,
+                "hash": digest,
+                "mode": mode,
+                "deployed_mtime": dst.stat().st_mtime_ns,
+            }
+            (report.changed if existed else report.added).append(key)
+
+        for key, previous in self.files.items():
+            if key in deployed:
+                continue
+            if not self._source_removed(previous):
+                # Файл исключён выбором пользователя или репозиторий не найден: файл остаётся
+                deployed[key] = previous
+                continue
+            if self._remove(Path(key), previous):
+                report.removed.append(key)
+
+        self.files = deployed
+        self._write()
+        logger.info(f"Dotfiles synchronized: {report.summary()}")
+        if stats.files:
+            logger.info(f"Dotfiles copied: {stats.summary()}")
+        return report
+
+    @staticmethod
+    def _walk_entries(entries: List[Tuple[Path, Path, PathRules]]) -> Iterator[Tuple[Path, Path, Path]]:
+        """(source, destination, source root) with absolute source paths"""
+        for root, dst_root, rules in entries:
+            root = root.absolute()
+            # Для отдельного файла (.bashrc) корень - каталог, в котором он лежит
+            base = root if root.is_dir() else root.parent
+            for src, dst in DotfileSync.walk([(root, dst_root, rules)]):
+                yield src, dst, base
+
+    @staticmethod
+    def _source_removed(previous: dict) -> bool:
+        """Whether the source of a deployed file was removed from the repository
+
+        Only an absolute source under an existing source root counts: when the
+        installer runs from another directory the roots are missing and
+        nothing may be deleted. Records of older manifests with relative
+        paths are never treated as removed.
+        """
+        source, root = Path(previous["source"]), previous.get("root")
+        if not source.is_absolute() or root is None or not Path(root).is_dir():
+            return False
+        return not source.exists()
+
+    @staticmethod
+    def walk(entries: List[Tuple[Path, Path, PathRules]]) -> Iterator[Tuple[Path, Path]]:
+        """(source, destination) of every file of the entries"""
+        for src, dst, rules in entries:
+            if not src.is_dir():
+                if src.exists():
+                    yield src, dst
+                continue
+
+            for entry, relative in rules.walk(src):
+                yield Path(entry.path), dst / relative
+
+    @staticmethod
+    def hash_file(path: Path) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def file_mode(src: Path, dst: Path) -> int:
+        """Scripts are executable, everything else is a plain user-writable file"""
+        if os.access(src, os.X_OK) or f"{os.sep}.local{os.sep}bin{os.sep}" in str(dst):
+            return 0o755
+        with open(src, "rb") as file:
+            return 0o755 if file.read(2) == b"#!" else 0o644
+
+    @staticmethod
+    def _apply_mode(dst: Path, dst_stat: os.stat_result, record: dict, src: Path) -> dict:
+        """Restore the recorded mode of an unchanged file without rewriting it"""
+        mode = record.get("mode")
+        if mode is None:
+            mode = DotfileSync.file_mode(src, dst)
+            record = {**record, "mode": mode}
+        if stat.S_IMODE(dst_stat.st_mode) != mode:
+            os.chmod(dst, mode)
+        return record
+
+    @staticmethod
+    def _stat(path: Path) -> Optional[os.stat_result]:
+        try:
+            return path.stat(follow_symlinks=False)
+        except OSError:
+            return None
+
+    @staticmethod
+    def _is_current(previous: dict, src_stat: os.stat_result, dst_stat: Optional[os.stat_result]) -> bool:
+        return (
+            previous["size"] == src_stat.st_size
+            and previous["mtime"] == src_stat.st_mtime_ns
+            and DotfileSync._dst_matches(previous, dst_stat)
+        )
+
+    @staticmethod
+    def _dst_matches(previous: dict, dst_stat: Optional[os.stat_result]) -> bool:
+        """The deployed copy was not modified since it was written"""
+        return (
+            dst_stat is not None
+            and dst_stat.st_size == previous["size"]
+            and dst_stat.st_mtime_ns == previous["deployed_mtime"]
+        )
+
+    @staticmethod
+    def _remove(dst: Path, previous: dict) -> bool:
+        if not dst.exists():
+            return True
+        if not DotfileSync._dst_matches(previous, DotfileSync._stat(dst)) and DotfileSync.hash_file(dst) != previous["hash"]:
+            logger.warning(f"{dst} was removed from meowrch but modified locally, keeping it")
+            return False
+
+        dst.unlink()
+        # Убираем опустевшие каталоги, оставшиеся от удалённого файла
+        parent = dst.parent
+        while parent != Path.home() and parent != parent.parent:
+            try:
+                parent.rmdir()
+            except OSError:
+                break
+            parent = parent.parent
+        return True
+
+    def _write(self) -> None:
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.path.write_text(json.dumps({"files": self.files}, indent=2), encoding="utf-8")
+        except OSError as e:
+            logger.warning(f"Failed to write dotfile manifest {self.path}: {e}")
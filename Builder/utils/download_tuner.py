@@ -0,0 +1,74 @@
+import os
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from loguru import logger
+
+from .pacman_conf import PacmanConf
+
+
+class DownloadTuner:
+    """Chooses pacman's ParallelDownloads from the throughput of the first downloads.
+
+    The first batch of packages is downloaded with the default parallelism
+    while the growth of the package cache is measured. The achieved
+    throughput is then mapped to a parallelism level: few connections on a
+    congested link, many on a fast LAN mirror.
+    """
+
+    # (минимальная скорость в МиБ/с, ParallelDownloads)
+    TABLE = [(50, 16), (20, 12), (5, 8), (1, 5), (0, 3)]
+    # Меньше этого объёма замер ничего не говорит о канале
+    MIN_SAMPLE_BYTES = 4 * 1024 * 1024
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = cache_dir
+
+    def measure(self, download: Callable[[], None]) -> Optional[float]:
+        """Run a download and return the achieved throughput in bytes per second
+
+        Returns:
+            Optional[float]: None when too little was downloaded to judge
+        """
+        before = self._snapshot()
+        started = time.monotonic()
+        download()
+        elapsed = time.monotonic() - started
+
+        downloaded = sum(
+            size for name, size in self._snapshot().items() if before.get(name) != size
+        )
+        if downloaded < self.MIN_SAMPLE_BYTES or elapsed <= 0:
+            logger.debug(f"Download sample too small to tune parallelism ({downloaded} bytes)")
+            return None
+
+        throughput = downloaded / elapsed
+        logger.info(f"Measured download throughput: {throughput / 1024 / 1024:.1f} MiB/s")
+        return throughput
+
+    @staticmethod
+    def choose(throughput: float) -> int:
+        mib_per_second = throughput / 1024 / 1024
+        for minimum, parallel_downloads in DownloadTuner.TABLE:
+            if mib_per_second >= minimum:
+                return parallel_downloads
+        return DownloadTuner.TABLE[-1][1]
+
+    @staticmethod
+    def render_config(content: str, parallel_downloads: int) -> str:
+        """pacman.conf content with ParallelDownloads set to the given value in [options]"""
+        conf = PacmanConf(content)
+        conf.set("options", "ParallelDownloads", str(parallel_downloads))
+        return conf.render()
+
+    def _snapshot(self) -> Dict[str, int]:
+        sizes: Dict[str, int] = {}
+        try:
+            with os.scandir(self.cache_dir) as entries:
+                for entry in entries:
+                    if entry.is_file(follow_symlinks=False):
+                        sizes[entry.name] = entry.stat(follow_symlinks=False).st_size
+        except OSError:
+            pass
+        return sizes
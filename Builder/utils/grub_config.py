@@ -4,18 +4,21 @@ import subprocess
 from pathlib import Path
 from typing import List, Optional, Set
 from loguru import logger
+from .post_actions import PostAction, PostActionQueue
+from .privileged_helper import run_sudo
 
 
 class GrubConfigEditor:
     """Утилита для редактирования конфигурации GRUB"""
     
-    def __init__(self, grub_path: Path = Path("/etc/default/grub")):
+    def __init__(self, grub_path: Path = Path("/etc/default/grub"), post_actions: Optional[PostActionQueue] = None):
         self.grub_path = grub_path
+        self.post_actions = post_actions
     
     def _run_sudo(self, command: List[str], input: Optional[str] = None) -> str:
         """Выполнить команду с sudo"""
-        result = subprocess.run(
-            ["sudo"] + command,
+        result = run_sudo(
+            command,
             input=input,
             text=True,
             capture_output=True,
@@ -80,8 +83,7 @@ class GrubConfigEditor:
         self._safe_file_edit(self.grub_path, edit_grub)
         
         if changes_made and update_grub:
-            logger.info("Running update-grub...")
-            self._run_sudo(["update-grub"])
+            self._update_grub()
             
         return changes_made
     
@@ -131,11 +133,21 @@ class GrubConfigEditor:
         self._safe_file_edit(self.grub_path, edit_grub)
         
         if changes_made and update_grub:
-            logger.info("Running update-grub...")
-            self._run_sudo(["update-grub"])
+            self._update_grub()
             
         return changes_made
     
+    def _update_grub(self):
+        """Запустить update-grub (или отложить, если есть общая очередь)"""
+        def run_update_grub():
+            logger.info("Running update-grub...")
+            self._run_sudo(["update-grub"])
+
+        if self.post_actions is not None:
+            self.post_actions.schedule(PostAction.GRUB_CONFIG, run_update_grub)
+        else:
+            run_update_grub()
+
     def get_cmdline_params(self) -> Set[str]:
         """Получить текущие параметры из GRUB_CMDLINE_LINUX_DEFAULT"""
         try:
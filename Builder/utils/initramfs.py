@@ -6,7 +6,8 @@ from typing import Callable, List, Optional
 
 from loguru import logger
 
-from .mkinitcpio_config import MkinitcpioConfigEditor
+from .initramfs_fingerprint import InitramfsFingerprint
+from .mkinitcpio_config import MkinitcpioConfigEditor, MkinitcpioSession
 
 
 class InitramfsManager:
@@ -52,39 +53,50 @@ class InitramfsManager:
             pass
         return False
 
-    def configure_mkinitcpio_for_plymouth(self, mkinitcpio_editor: MkinitcpioConfigEditor) -> None:
+    def configure_mkinitcpio_for_plymouth(self, mkinitcpio_editor: MkinitcpioConfigEditor, rebuild: bool = False) -> None:
         """Configure mkinitcpio hooks and modules for Plymouth.
 
-        This mirrors the previous inline logic from PlymouthConfigurer but is
-        encapsulated here for reuse and testability.
+        All edits are made in one editor session: mkinitcpio.conf is read
+        once and written once.
+
+        Args:
+            rebuild: Rebuild the images when the file changed. PlymouthConfigurer
+                leaves this to its post commands.
         """
         logger.info("The process of configuring the settings of mkinitcpio has begun")
 
-        current_hooks = mkinitcpio_editor.list_hooks()
+        with mkinitcpio_editor.session(rebuild=rebuild) as session:
+            self._configure_plymouth_hooks(session)
+
+        logger.success("mkinitcpio settings configured successfully!")
+
+    @staticmethod
+    def _configure_plymouth_hooks(session: MkinitcpioSession) -> None:
+        current_hooks = session.list_hooks()
         logger.info(f"Current hooks: {' '.join(current_hooks)}")
 
         # Replace udev with systemd if needed
         if "udev" in current_hooks and "systemd" not in current_hooks:
-            mkinitcpio_editor.remove_hook("udev")
-            mkinitcpio_editor.add_hook("systemd", "start")
+            session.remove_hook("udev")
+            session.add_hook("systemd", "start")
             logger.info("Replaced udev with systemd")
 
         # Refresh hooks after possible changes
-        current_hooks = mkinitcpio_editor.list_hooks()
+        current_hooks = session.list_hooks()
 
         # If systemd is used, prefer sd-encrypt over encrypt
         if "systemd" in current_hooks and "encrypt" in current_hooks:
-            mkinitcpio_editor.remove_hook("encrypt")
+            session.remove_hook("encrypt")
             if "sd-encrypt" not in current_hooks:
-                mkinitcpio_editor.add_hook("sd-encrypt")
+                session.add_hook("sd-encrypt")
             logger.info("Replaced encrypt with sd-encrypt for systemd")
 
         # We guarantee that the “base” hook is always the first one.
         if "base" in current_hooks:
-            mkinitcpio_editor.remove_hook("base")
-            mkinitcpio_editor.add_hook("base", "start")
+            session.remove_hook("base")
+            session.add_hook("base", "start")
         else:
-            mkinitcpio_editor.add_hook("base", "start")
+            session.add_hook("base", "start")
 
         plymouth_present = "plymouth" in current_hooks
         if plymouth_present:
@@ -105,7 +117,7 @@ class InitramfsManager:
 
         # Find the last hook from before_plymouth_hooks
         last_before_hook = None
-        updated_hooks = mkinitcpio_editor.list_hooks()
+        updated_hooks = session.list_hooks()
         for hook in reversed(updated_hooks):
             if hook in before_plymouth_hooks:
                 last_before_hook = hook
@@ -122,7 +134,7 @@ class InitramfsManager:
             # Add plymouth with smart positioning
             if last_before_hook and first_encrypt_hook:
                 # Plymouth after last_before_hook but before first_encrypt_hook
-                mkinitcpio_editor.add_hook(
+                session.add_hook(
                     "plymouth",
                     after_hook=last_before_hook,
                     before_hook=first_encrypt_hook,
@@ -132,25 +144,23 @@ class InitramfsManager:
                 )
             elif last_before_hook:
                 # Just after last_before_hook
-                mkinitcpio_editor.add_hook("plymouth", "after", last_before_hook)
+                session.add_hook("plymouth", "after", last_before_hook)
                 logger.info(f"Added plymouth after {last_before_hook}")
             elif first_encrypt_hook:
                 # Before first_encrypt_hook
-                mkinitcpio_editor.add_hook("plymouth", "before", first_encrypt_hook)
+                session.add_hook("plymouth", "before", first_encrypt_hook)
                 logger.info(f"Added plymouth before {first_encrypt_hook}")
             else:
                 # Fallback: add after systemd or at start
                 if "systemd" in updated_hooks:
-                    mkinitcpio_editor.add_hook("plymouth", "after", "systemd")
+                    session.add_hook("plymouth", "after", "systemd")
                     logger.info("Added plymouth after systemd")
                 else:
-                    mkinitcpio_editor.add_hook("plymouth", "start")
+                    session.add_hook("plymouth", "start")
                     logger.info("Added plymouth at start of hooks list")
 
         # Ensure required modules for encryption hooks are present
-        mkinitcpio_editor.ensure_required_modules_for_hooks()
-
-        logger.success("mkinitcpio settings configured successfully!")
+        session.ensure_required_modules_for_hooks()
 
     def configure_dracut_for_plymouth(
         self,
@@ -225,13 +235,25 @@ class InitramfsManager:
         tool: Optional[str],
         run_sudo: Callable[[List[str], Optional[str]], str],
         dracut_conf_dir: Path = Path("/etc/dracut.conf.d"),
+        force: bool = False,
     ) -> None:
-        """Rebuild initramfs for the detected or provided tool."""
+        """Rebuild initramfs for the detected or provided tool.
+
+        The rebuild is skipped when the images were built from the same
+        inputs, see InitramfsFingerprint.
+
+        Args:
+            force: Rebuild even if the fingerprint matches
+        """
         effective_tool = tool or self.detect_tool(dracut_conf_dir)
 
         if effective_tool == "mkinitcpio":
+            fingerprint = InitramfsFingerprint("mkinitcpio", dracut_conf_dir=dracut_conf_dir)
+            if self._is_up_to_date(fingerprint, run_sudo, force):
+                return
             logger.info("Running mkinitcpio -P...")
             run_sudo(["mkinitcpio", "-P"])
+            fingerprint.record(run_sudo)
         elif effective_tool == "dracut":
             try:
                 kver = subprocess.run(
@@ -242,6 +264,9 @@ class InitramfsManager:
                 ).stdout.strip()
 
                 initramfs_path = self.detect_initramfs_path()
+                fingerprint = InitramfsFingerprint("dracut", image=initramfs_path, dracut_conf_dir=dracut_conf_dir)
+                if self._is_up_to_date(fingerprint, run_sudo, force):
+                    return
 
                 logger.info(f"Running dracut for kernel {kver}...")
                 run_sudo(
@@ -253,7 +278,22 @@ class InitramfsManager:
                         "--force",
                     ]
                 )
+                fingerprint.record(run_sudo)
             except subprocess.CalledProcessError as e:
                 logger.error(f"dracut failed: {e.stderr or e}")
         else:
             logger.warning("Initramfs tool is unknown; skipping initramfs rebuild.")
+
+    @staticmethod
+    def _is_up_to_date(
+        fingerprint: InitramfsFingerprint,
+        run_sudo: Callable[[List[str], Optional[str]], str],
+        force: bool,
+    ) -> bool:
+        if force:
+            logger.info("Initramfs rebuild forced")
+            return False
+        if fingerprint.is_current(run_sudo):
+            logger.success("Initramfs inputs are unchanged since the last build, skipping the rebuild")
+            return True
+        return False
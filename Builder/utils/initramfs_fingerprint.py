@@ -0,0 +1,195 @@
+import hashlib
+import json
+import re
+import subprocess
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from loguru import logger
+
+from .mkinitcpio_config import MkinitcpioConfig
+from .pacman_db import LocalPackageIndex
+
+_ARRAY = re.compile(r"^\s*(?:MODULES|BINARIES|FILES|HOOKS)=\(.*?\)", re.M | re.S)
+_PRESET_IMAGE = re.compile(r"""^\s*(\w+)_(?:image|uki)=["']?([^"'\s]+)""", re.M)
+_PRESETS = re.compile(r"^\s*PRESETS=\((.*?)\)", re.M | re.S)
+_THEME = re.compile(r"^\s*Theme\s*=\s*(\S+)", re.M)
+
+
+def _active_lines(content: str) -> List[str]:
+    """Lines that take effect: without comments, blank lines and indentation"""
+    lines = (line.strip() for line in content.splitlines())
+    return [line for line in lines if line and not line.startswith("#")]
+
+
+class InitramfsFingerprint:
+    """SHA-256 of everything that ends up in the initramfs images.
+
+    The inputs are the parsed generator configuration (mkinitcpio.conf with
+    its drop-ins and presets, or dracut.conf with dracut.conf.d), the files
+    of the active Plymouth theme, the installed kernel versions and the
+    versions of the firmware and microcode packages. The digest of the last
+    successful build is stored next to the images; when the current inputs
+    hash to the same value and the images still exist, the rebuild would
+    produce identical images and can be skipped.
+
+    No fingerprint is computed when the configuration or the kernels cannot
+    be read, so such systems are always rebuilt.
+    """
+
+    # Кроме прошивок linux-firmware*, попадают в образ или собирают его
+    PACKAGES = ("intel-ucode", "amd-ucode", "mkinitcpio", "dracut", "plymouth")
+
+    def __init__(
+        self,
+        tool: str,
+        image: Optional[Path] = None,
+        mkinitcpio_conf: Optional[Path] = None,
+        dracut_conf_dir: Optional[Path] = None,
+        root: Path = Path("/"),
+    ):
+        """
+        Args:
+            tool: "mkinitcpio" or "dracut"
+            image: Image built by dracut; mkinitcpio images come from its presets
+            root: Root of the system, the other paths default to locations under it
+        """
+        self.tool = tool
+        self.root = root
+        self.mkinitcpio_conf = mkinitcpio_conf or root / "etc/mkinitcpio.conf"
+        self.dracut_conf_dir = dracut_conf_dir or root / "etc/dracut.conf.d"
+        self.images = [image] if image is not None else self._preset_images()
+        if image is not None:
+            self.path = image.with_name(f".{image.name}.meowrch-fingerprint")
+        else:
+            boot = self.images[0].parent if self.images else root / "boot"
+            self.path = boot / ".meowrch-mkinitcpio.fingerprint"
+        self.digest: Optional[str] = None
+
+    ##==> Входные данные
+    ##############################################
+    def compute(self) -> Optional[str]:
+        """Digest of the current inputs, None if they cannot be determined"""
+        try:
+            config = self._mkinitcpio_inputs() if self.tool == "mkinitcpio" else self._dracut_inputs()
+            kernels = self._kernels()
+            if config is None or not kernels:
+                return None
+            inputs = {
+                "tool": self.tool,
+                "config": config,
+                "kernels": kernels,
+                "packages": self._packages(),
+                "plymouth": self._plymouth(),
+                "images": [str(image) for image in self.images],
+            }
+        except OSError as e:
+            logger.warning(f"Unable to fingerprint the initramfs inputs, it will be rebuilt: {e}")
+            return None
+
+        self.digest = hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+        return self.digest
+
+    def _mkinitcpio_inputs(self) -> Optional[dict]:
+        if not self.mkinitcpio_conf.is_file():
+            return None
+        content = self.mkinitcpio_conf.read_text(encoding="utf-8")
+        return {
+            "arrays": MkinitcpioConfig(content).arrays,
+            # COMPRESSION и прочие переменные вне массивов
+            "settings": _active_lines(_ARRAY.sub("", content)),
+            "drop-ins": self._read_dir(self.root / "etc/mkinitcpio.conf.d", "*.conf"),
+            "presets": self._read_dir(self.root / "etc/mkinitcpio.d", "*.preset"),
+        }
+
+    def _dracut_inputs(self) -> dict:
+        main = self.root / "etc/dracut.conf"
+        return {
+            "main": _active_lines(main.read_text(encoding="utf-8")) if main.is_file() else [],
+            "drop-ins": self._read_dir(self.dracut_conf_dir, "*.conf"),
+        }
+
+    def _kernels(self) -> List[str]:
+        modules = self.root / "usr/lib/modules"
+        if not modules.is_dir():
+            return []
+        # Каталоги без vmlinuz остаются от удалённых ядер
+        return sorted(entry.name for entry in modules.iterdir() if (entry / "vmlinuz").is_file())
+
+    def _packages(self) -> Dict[str, str]:
+        index = LocalPackageIndex(self.root / "var/lib/pacman/local")
+        if not index.available():
+            return {}
+        return {
+            name: index.get_version(name)
+            for name in sorted(index.installed_names())
+            if name in self.PACKAGES or name.startswith("linux-firmware")
+        }
+
+    def _plymouth(self) -> dict:
+        conf = self.root / "etc/plymouth/plymouthd.conf"
+        defaults = self.root / "usr/share/plymouth/plymouthd.defaults"
+        settings = _active_lines(conf.read_text(encoding="utf-8")) if conf.is_file() else []
+
+        theme = None
+        for source in (conf, defaults):
+            match = _THEME.search(source.read_text(encoding="utf-8")) if source.is_file() else None
+            if match:
+                theme = match.group(1)
+                break
+        if theme is None:
+            return {"settings": settings}
+
+        theme_dir = self.root / "usr/share/plymouth/themes" / theme
+        files = {}
+        if theme_dir.is_dir():
+            for path in sorted(theme_dir.rglob("*")):
+                if path.is_file():
+                    files[str(path.relative_to(theme_dir))] = hashlib.sha256(path.read_bytes()).hexdigest()
+        return {"settings": settings, "theme": theme, "files": files}
+
+    def _preset_images(self) -> List[Path]:
+        images = []
+        for path in sorted((self.root / "etc/mkinitcpio.d").glob("*.preset")):
+            content = path.read_text(encoding="utf-8", errors="ignore")
+            presets = _PRESETS.search(content)
+            # Образы только тех пресетов, что перечислены в PRESETS
+            enabled = presets.group(1).replace("'", " ").replace('"', " ").split() if presets else []
+            for match in _PRESET_IMAGE.finditer(content):
+                if match.group(1) in enabled:
+                    images.append(self.root / match.group(2).lstrip("/"))
+        return images
+
+    @staticmethod
+    def _read_dir(directory: Path, pattern: str) -> Dict[str, List[str]]:
+        if not directory.is_dir():
+            return {}
+        return {
+            path.name: _active_lines(path.read_text(encoding="utf-8"))
+            for path in sorted(directory.glob(pattern))
+            if path.is_file()
+        }
+
+    ##==> Сохранённый отпечаток
+    ##############################################
+    def is_current(self, run_sudo: Callable[[List[str], Optional[str]], str]) -> bool:
+        """Whether the images were built from the current inputs and still exist"""
+        if self.compute() is None or not self.images:
+            return False
+        if not all(image.exists() for image in self.images):
+            return False
+        try:
+            # /boot на ESP бывает доступен только root
+            stored = run_sudo(["cat", str(self.path)], None)
+        except subprocess.CalledProcessError:
+            return False
+        return (stored or "").strip() == self.digest
+
+    def record(self, run_sudo: Callable[[List[str], Optional[str]], str]) -> None:
+        """Store the digest of the inputs the images were just built from"""
+        if self.digest is None and self.compute() is None:
+            return
+        try:
+            run_sudo(["tee", str(self.path)], f"{self.digest}\n")
+        except subprocess.CalledProcessError as e:
+            logger.warning(f"Unable to save the initramfs fingerprint to {self.path}: {e.stderr or e}")
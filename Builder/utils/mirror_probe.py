@@ -0,0 +1,214 @@
+import platform
+import re
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+
+@dataclass
+class MirrorResult:
+    mirror: str
+    latency: Optional[float] = None
+    throughput: Optional[float] = None
+    error: Optional[str] = None
+
+    # Размер "типичного" пакета, по которому сравниваются зеркала
+    REFERENCE_BYTES = 4 * 1024 * 1024
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    @property
+    def score(self) -> float:
+        """Estimated seconds to fetch a typical package, lower is better"""
+        return self.latency + self.REFERENCE_BYTES / self.throughput
+
+
+class MirrorProbe:
+    """Concurrent mirror benchmark bounded by an overall time budget.
+
+    Every mirror gets one ranged GET of a small file: the time until the
+    response headers arrive is the latency, the rest of the transfer gives a
+    throughput sample. Mirrors that do not answer within the budget are
+    reported as failed instead of delaying the installation.
+    """
+
+    def __init__(
+        self,
+        time_budget: float = 8.0,
+        sample_bytes: int = 256 * 1024,
+        max_workers: int = 16,
+    ):
+        self.time_budget = time_budget
+        self.sample_bytes = sample_bytes
+        self.max_workers = max_workers
+
+    def probe(self, targets: Dict[str, str]) -> List[MirrorResult]:
+        """Probe mirrors concurrently
+
+        Args:
+            targets: Mapping of mirror -> URL of the file to sample from it
+
+        Returns:
+            List[MirrorResult]: One result per mirror, in input order
+        """
+        if not targets:
+            return []
+
+        deadline = time.monotonic() + self.time_budget
+        executor = ThreadPoolExecutor(max_workers=min(self.max_workers, len(targets)))
+        futures = {
+            mirror: executor.submit(self._probe_one, mirror, url, deadline)
+            for mirror, url in targets.items()
+        }
+        wait(futures.values(), timeout=self.time_budget)
+        executor.shutdown(wait=False, cancel_futures=True)
+
+        results = []
+        for mirror, future in futures.items():
+            if future.done() and not future.cancelled():
+                results.append(future.result())
+            else:
+                results.append(MirrorResult(mirror, error="time budget exhausted"))
+        return results
+
+    def rank(self, targets: Dict[str, str]) -> Tuple[List[str], List[MirrorResult]]:
+        """Order mirrors from fastest to slowest; failed ones keep their order at the end"""
+        results = self.probe(targets)
+        succeeded = sorted((r for r in results if r.ok), key=lambda r: r.score)
+        failed = [r for r in results if not r.ok]
+
+        for result in succeeded:
+            logger.debug(
+                f"Mirror {result.mirror}: {result.latency * 1000:.0f} ms, "
+                f"{result.throughput / 1024:.0f} KiB/s"
+            )
+        for result in failed:
+            logger.debug(f"Mirror {result.mirror} failed: {result.error}")
+
+        return [r.mirror for r in succeeded + failed], results
+
+    def _probe_one(self, mirror: str, url: str, deadline: float) -> MirrorResult:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return MirrorResult(mirror, error="time budget exhausted")
+
+        request = urllib.request.Request(
+            url,
+            headers={
+                "Range": f"bytes=0-{self.sample_bytes - 1}",
+                "User-Agent": "meowrch-mirror-probe",
+            },
+        )
+        started = time.monotonic()
+        try:
+            with urllib.request.urlopen(request, timeout=remaining) as response:
+                latency = time.monotonic() - started
+                received = 0
+                while received < self.sample_bytes:
+                    if time.monotonic() > deadline:
+                        return MirrorResult(mirror, error="time budget exhausted")
+                    chunk = response.read(min(64 * 1024, self.sample_bytes - received))
+                    if not chunk:
+                        break
+                    received += len(chunk)
+                transfer = time.monotonic() - started - latency
+        except (OSError, ValueError) as e:
+            return MirrorResult(mirror, error=str(e))
+
+        if received == 0:
+            return MirrorResult(mirror, error="empty response")
+
+        return MirrorResult(
+            mirror,
+            latency=latency,
+            throughput=received / max(transfer, 1e-3),
+        )
+
+
+def parse_mirrorlist(content: str) -> Tuple[List[str], List[str]]:
+    """Return the active and the commented-out Server URLs of a mirrorlist"""
+    active, commented = [], []
+    for line in content.splitlines():
+        stripped = line.strip()
+        target = commented if stripped.startswith("#") else active
+        stripped = stripped.lstrip("#").strip()
+        key, sep, value = stripped.partition("=")
+        if sep and key.strip() == "Server":
+            target.append(value.strip())
+    return active, commented
+
+
+def arch_probe_url(server: str, repo: str = "core") -> str:
+    """URL of the repo database on an Arch mirror, used as the probe sample"""
+    arch = platform.machine() or "x86_64"
+    base = server.replace("$repo", repo).replace("$arch", arch).rstrip("/")
+    return f"{base}/{repo}.db"
+
+
+RANKED_NOTE = "## Ranked by the meowrch mirror probe"
+# Пометки над серверами, которые пишет render_mirrorlist
+_ANNOTATION = re.compile(r"^# (not ranked|not probed|\d+ ms, \d+ KiB/s)$")
+
+
+def _is_server(line: str, commented: bool = True) -> bool:
+    stripped = line.strip()
+    if stripped.startswith("#"):
+        if not commented:
+            return False
+        stripped = stripped.lstrip("#").strip()
+    key, sep, _ = stripped.partition("=")
+    return bool(sep) and key.strip() == "Server"
+
+
+def render_mirrorlist(
+    ranked: List[str],
+    results: List[MirrorResult],
+    original: str = "",
+    unprobed: List[str] = (),
+) -> str:
+    """Mirrorlist with the ranked servers first
+
+    The header comment of the original file is kept. Active servers that
+    were not probed follow the ranked ones in their original order; the rest
+    of the original file (comments, commented-out servers) is kept below.
+    """
+    lines = original.splitlines()
+    header: List[str] = []
+    while lines and lines[0].strip().startswith("#") and not _is_server(lines[0]):
+        line = lines.pop(0)
+        # Отметка прошлого ранжирования заменяется новой
+        if not line.startswith(RANKED_NOTE):
+            header.append(line)
+    if not header:
+        header = ["##", "## Arch Linux repository mirrorlist", "##"]
+
+    output = header + [f"{RANKED_NOTE} on {time.strftime('%Y-%m-%d %H:%M')}", ""]
+    by_mirror = {r.mirror: r for r in results}
+    for mirror in ranked:
+        result = by_mirror.get(mirror)
+        if result is not None and result.ok:
+            output.append(
+                f"# {result.latency * 1000:.0f} ms, {result.throughput / 1024:.0f} KiB/s"
+            )
+        else:
+            output.append("# not ranked")
+        output.append(f"Server = {mirror}")
+
+    if unprobed:
+        output += ["", "# not probed"] + [f"Server = {mirror}" for mirror in unprobed]
+
+    rest = [
+        line for line in lines
+        if not _is_server(line, commented=False) and not _ANNOTATION.match(line.strip())
+    ]
+    while rest and not rest[0].strip():
+        rest.pop(0)
+    if rest:
+        output += [""] + rest
+    return "\n".join(output) + "\n"
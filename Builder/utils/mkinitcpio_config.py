@@ -1,11 +1,14 @@
 import re
 import tempfile
 import subprocess
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, Iterator, List, Optional
 from enum import Enum
 from loguru import logger
 from .mkinitcpio_rules import MkinitcpioRules
+from .post_actions import PostAction, PostActionQueue
+from .privileged_helper import run_sudo
 
 
 class Position(Enum):
@@ -16,17 +19,68 @@ class Position(Enum):
     AFTER = "after"
 
 
+class MkinitcpioConfig:
+    """Массивы MODULES, BINARIES, FILES и HOOKS, разобранные из mkinitcpio.conf один раз
+
+    Остальной текст файла не трогается: render() заменяет только строки
+    изменённых массивов.
+    """
+
+    ARRAYS = ("MODULES", "BINARIES", "FILES", "HOOKS")
+
+    def __init__(self, content: str):
+        self.content = content
+        self.arrays: Dict[str, List[str]] = {}
+        self._matches: Dict[str, re.Match] = {}
+        for name in self.ARRAYS:
+            match = self._search(name, content)
+            if match:
+                self._matches[name] = match
+                self.arrays[name] = match.group(3).split()
+
+    @staticmethod
+    def _search(name: str, content: str) -> Optional[re.Match]:
+        match = re.search(rf"^()({name}=)\((.*?)\)", content, re.M | re.S)
+        if match is None and name == "MODULES":
+            # Как и раньше, закомментированный MODULES подходит, если активного нет
+            match = re.search(r"^(#\s*)(MODULES=)\((.*?)\)", content, re.M | re.S)
+        return match
+
+    def has(self, name: str) -> bool:
+        return name in self.arrays
+
+    def render(self) -> str:
+        content = self.content
+        # С конца файла, чтобы смещения остальных совпадений не сдвигались
+        for name, match in sorted(self._matches.items(), key=lambda item: item[1].start(), reverse=True):
+            items = self.arrays[name]
+            if items != match.group(3).split():
+                content = content[:match.start()] + f"{name}=({' '.join(items)})" + content[match.end():]
+
+        for name in self.ARRAYS:
+            if name not in self._matches and self.arrays.get(name):
+                content += f"\n{name}=({' '.join(self.arrays[name])})\n"
+        return content
+
+
 class MkinitcpioConfigEditor:
     """Утилита для редактирования конфигурации mkinitcpio"""
 
-    def __init__(self, mkinitcpio_path: Path = Path("/etc/mkinitcpio.conf")):
+    def __init__(
+        self,
+        mkinitcpio_path: Path = Path("/etc/mkinitcpio.conf"),
+        post_actions: Optional[PostActionQueue] = None,
+        force_rebuild: bool = False,
+    ):
         self.mkinitcpio_path = mkinitcpio_path
+        self.post_actions = post_actions
+        self.force_rebuild = force_rebuild  # Пересобирать образы, даже если отпечаток совпадает
         self.rules = MkinitcpioRules()  # База знаний о правильном порядке
 
     def _run_sudo(self, command: List[str], input: Optional[str] = None) -> str:
         """Выполнить команду с sudo"""
-        result = subprocess.run(
-            ["sudo"] + command,
+        result = run_sudo(
+            command,
             input=input,
             text=True,
             capture_output=True,
@@ -34,16 +88,25 @@ class MkinitcpioConfigEditor:
         )
         return result.stdout
 
-    def _safe_file_edit(self, path: Path, edit_callback: callable):
-        """Безопасно редактировать файл через временный файл"""
-        with tempfile.NamedTemporaryFile(mode="w+", delete=False) as tmp:
-            original_content = self._run_sudo(["cat", str(path)])
-            tmp.write(original_content)
-            tmp.flush()
+    @contextmanager
+    def session(self, rebuild: bool = True) -> Iterator["MkinitcpioSession"]:
+        """Пакетное редактирование: одно чтение сейчас, одна запись и одна пересборка в конце
+
+        Если блок завершился исключением, файл не записывается.
 
-            edit_callback(Path(tmp.name))
-            if Path(tmp.name).read_text() != original_content:
-                self._run_sudo(["cp", tmp.name, str(path)])
+        Args:
+            rebuild: Запустить mkinitcpio -P (или запланировать его), если файл изменился
+        """
+        session = MkinitcpioSession(self)
+        yield session
+        session.commit(rebuild=rebuild)
+
+    def _write(self, content: str) -> None:
+        """Записать файл через временный файл"""
+        with tempfile.NamedTemporaryFile(mode="w+") as tmp:
+            tmp.write(content)
+            tmp.flush()
+            self._run_sudo(["cp", tmp.name, str(self.mkinitcpio_path)])
 
     def _calculate_insert_position(self, hooks: List[str], new_hook: str, position: Optional[str] = None, 
                                   reference_hook: Optional[str] = None, after_hook: Optional[str] = None, 
@@ -92,68 +155,24 @@ class MkinitcpioConfigEditor:
             after_hook: Хук, после которого нужно вставить (приоритет над position)
             before_hook: Хук, до которого нужно вставить (работает вместе с after_hook)
         """
-
-        def edit_mkinitcpio(tmp_path: Path):
-            content = tmp_path.read_text()
-            match = re.search(r"^HOOKS=\((.*?)\)", content, re.M)
-
-            if not match:
-                logger.error("HOOKS не найдены в mkinitcpio.conf")
-                return
-
-            hooks = match.group(1).split()
-
-            if hook in hooks:
-                logger.info(f"Hook {hook} already exists in the configuration")
-                return
-
-            # Определяем позицию для вставки
-            insert_index = self._calculate_insert_position(
-                hooks, hook, position, reference_hook, after_hook, before_hook
-            )
-            
-            hooks.insert(insert_index, hook)
-            new_hooks_str = f"HOOKS=({' '.join(hooks)})"
-            tmp_path.write_text(content.replace(match.group(0), new_hooks_str))
-
         logger.info("Adding hook to mkinitcpio.conf...")
-        self._safe_file_edit(self.mkinitcpio_path, edit_mkinitcpio)
+        with self.session(rebuild=False) as session:
+            session.add_hook(hook, position, reference_hook, after_hook, before_hook)
         logger.success("Hook added successfully!")
 
     def remove_hook(self, hook: str):
         """Удалить хук из конфигурации mkinitcpio"""
-
-        def edit_mkinitcpio(tmp_path: Path):
-            content = tmp_path.read_text()
-            match = re.search(r"^HOOKS=\((.*?)\)", content, re.M)
-
-            if not match:
-                logger.error("HOOKS не найдены в mkinitcpio.conf")
-                return
-
-            hooks = match.group(1).split()
-
-            if hook not in hooks:
-                logger.info(f"Hook {hook} not found in configuration")
-                return
-
-            hooks.remove(hook)
-
-            new_hooks_str = f"HOOKS=({' '.join(hooks)})"
-            tmp_path.write_text(content.replace(match.group(0), new_hooks_str))
-
         logger.info("Removing hook from mkinitcpio.conf...")
-        self._safe_file_edit(self.mkinitcpio_path, edit_mkinitcpio)
+        with self.session(rebuild=False) as session:
+            session.remove_hook(hook)
         logger.success("Hook removed successfully!")
 
     def list_hooks(self) -> List[str]:
         """Получить текущий список хуков из mkinitcpio.conf"""
         try:
-            content = self._run_sudo(["cat", str(self.mkinitcpio_path)])
-            match = re.search(r"^HOOKS=\((.*?)\)", content, re.M)
-
-            if match:
-                return match.group(1).split()
+            config = MkinitcpioConfig(self._run_sudo(["cat", str(self.mkinitcpio_path)]))
+            if config.has("HOOKS"):
+                return config.arrays["HOOKS"]
             else:
                 logger.warning("HOOKS not found in mkinitcpio.conf")
                 return []
@@ -184,60 +203,9 @@ class MkinitcpioConfigEditor:
         Returns:
             bool: True если были внесены изменения
         """
-        changes_made = False
-        
-        def edit_modules(tmp_path: Path):
-            nonlocal changes_made
-            content = tmp_path.read_text()
-            
-            # Ищем строку MODULES
-            match = re.search(r'^(#?\s*)(MODULES=)(\(.*?\))', content, re.M | re.S)
-            
-            if not match:
-                logger.warning("MODULES not found in mkinitcpio.conf, creating new line")
-                # Добавляем новую строку MODULES в конец файла
-                modules_str = ' '.join(modules)
-                content += f"\nMODULES=({modules_str})\n"
-                tmp_path.write_text(content)
-                changes_made = True
-                return
-            
-            # Извлекаем текущие модули
-            modules_content = match.group(3)[1:-1].strip()  # Убираем скобки
-            current_modules = [m.strip() for m in modules_content.split() if m.strip()]
-            
-            # Добавляем только новые модули
-            new_modules = [m for m in modules if m not in current_modules]
-            if not new_modules:
-                logger.info("All specified modules are already present in the configuration")
-                return
-            
-            # Определяем позицию вставки
-            if position == Position.BEFORE and reference_module and reference_module in current_modules:
-                index = current_modules.index(reference_module)
-                for i, module in enumerate(new_modules):
-                    current_modules.insert(index + i, module)
-            elif position == Position.AFTER and reference_module and reference_module in current_modules:
-                index = current_modules.index(reference_module) + 1
-                for i, module in enumerate(new_modules):
-                    current_modules.insert(index + i, module)
-            elif position == Position.START:
-                current_modules = new_modules + current_modules
-            else:  # Position.END
-                current_modules.extend(new_modules)
-            
-            # Формируем новую строку
-            modules_str = ' '.join(current_modules)
-            new_line = f"MODULES=({modules_str})"
-            
-            # Заменяем в контенте
-            tmp_path.write_text(content.replace(match.group(0), new_line))
-            changes_made = True
-            logger.info(f"Added modules: {', '.join(new_modules)}")
-        
         logger.info("Adding modules to mkinitcpio.conf...")
-        self._safe_file_edit(self.mkinitcpio_path, edit_modules)
-        return changes_made
+        with self.session(rebuild=False) as session:
+            return session.add_modules(modules, position, reference_module)
     
     def remove_modules(self, modules: List[str]) -> bool:
         """Удалить модули из конфигурации mkinitcpio
@@ -248,53 +216,16 @@ class MkinitcpioConfigEditor:
         Returns:
             bool: True если были внесены изменения
         """
-        changes_made = False
-        
-        def edit_modules(tmp_path: Path):
-            nonlocal changes_made
-            content = tmp_path.read_text()
-            
-            # Ищем строку MODULES
-            match = re.search(r'^(#?\s*)(MODULES=)(\(.*?\))', content, re.M | re.S)
-            
-            if not match:
-                logger.warning("MODULES not found in mkinitcpio.conf")
-                return
-            
-            # Извлекаем текущие модули
-            modules_content = match.group(3)[1:-1].strip()  # Убираем скобки
-            current_modules = [m.strip() for m in modules_content.split() if m.strip()]
-            
-            # Удаляем указанные модули
-            modules_to_remove = [m for m in modules if m in current_modules]
-            if not modules_to_remove:
-                logger.info("Specified modules not found in configuration")
-                return
-            
-            remaining_modules = [m for m in current_modules if m not in modules]
-            
-            # Формируем новую строку
-            modules_str = ' '.join(remaining_modules)
-            new_line = f"MODULES=({modules_str})"
-            
-            # Заменяем в контенте
-            tmp_path.write_text(content.replace(match.group(0), new_line))
-            changes_made = True
-            logger.info(f"Removed modules: {', '.join(modules_to_remove)}")
-        
         logger.info("Removing modules from mkinitcpio.conf...")
-        self._safe_file_edit(self.mkinitcpio_path, edit_modules)
-        return changes_made
+        with self.session(rebuild=False) as session:
+            return session.remove_modules(modules)
     
     def list_modules(self) -> List[str]:
         """Получить текущий список модулей из mkinitcpio.conf"""
         try:
-            content = self._run_sudo(["cat", str(self.mkinitcpio_path)])
-            match = re.search(r'^#?\s*MODULES=\((.*?)\)', content, re.M | re.S)
-            
-            if match:
-                modules_content = match.group(1).strip()
-                return [m.strip() for m in modules_content.split() if m.strip()]
+            config = MkinitcpioConfig(self._run_sudo(["cat", str(self.mkinitcpio_path)]))
+            if config.has("MODULES"):
+                return config.arrays["MODULES"]
             else:
                 logger.warning("MODULES not found in mkinitcpio.conf")
                 return []
@@ -313,27 +244,206 @@ class MkinitcpioConfigEditor:
         Returns:
             bool: True если были внесены изменения
         """
-        changes_made = False
-        
-        for config in hooks_config:
-            hook = config['hook']
-            position = config.get('position', 'end')
-            reference = config.get('reference')
-            
-            try:
-                self.add_hook(hook, position, reference)
-                changes_made = True
-            except Exception as e:
-                logger.error(f"Ошибка при добавлении хука {hook}: {e}")
-        
-        if changes_made and rebuild:
-            self.apply_hooks()
-        
-        return changes_made
+        # Все хуки добавляются за одно чтение и одну запись
+        with self.session(rebuild=rebuild) as session:
+            for config in hooks_config:
+                hook = config['hook']
+                position = config.get('position', 'end')
+                reference = config.get('reference')
+
+                try:
+                    session.add_hook(hook, position, reference)
+                except Exception as e:
+                    logger.error(f"Ошибка при добавлении хука {hook}: {e}")
+
+        return session.changed
     
     def apply_hooks(self):
-        """Запустить mkinitcpio -P для применения изменений"""
-        logger.info("Applying mkinitcpio changes...")
-        self._run_sudo(["mkinitcpio", "-P"])
-        logger.success("Changes applied successfully!")
+        """Запустить mkinitcpio -P для применения изменений
+
+        Если задана общая очередь PostActionQueue, пересборка откладывается до конца установки.
+        Образы не пересобираются, если их входные данные не изменились с прошлой сборки.
+        """
+        def run_mkinitcpio():
+            # Отложенный импорт: initramfs_fingerprint сам импортирует этот модуль
+            from .initramfs_fingerprint import InitramfsFingerprint
+
+            fingerprint = InitramfsFingerprint("mkinitcpio", mkinitcpio_conf=self.mkinitcpio_path)
+            if not self.force_rebuild and fingerprint.is_current(self._run_sudo):
+                logger.success("mkinitcpio inputs are unchanged since the last build, skipping mkinitcpio -P")
+                return
+
+            logger.info("Applying mkinitcpio changes...")
+            self._run_sudo(["mkinitcpio", "-P"])
+            fingerprint.record(self._run_sudo)
+            logger.success("Changes applied successfully!")
+
+        if self.post_actions is not None:
+            self.post_actions.schedule(PostAction.INITRAMFS, run_mkinitcpio)
+        else:
+            run_mkinitcpio()
+
+
+
+class MkinitcpioSession:
+    """Набор правок mkinitcpio.conf поверх модели в памяти
+
+    Создаётся через MkinitcpioConfigEditor.session(): файл читается один раз
+    при создании, правки меняют только модель, а commit() проверяет порядок
+    хуков по MkinitcpioRules, записывает файл один раз и один раз запускает
+    пересборку образов.
+    """
+
+    def __init__(self, editor: MkinitcpioConfigEditor):
+        self.editor = editor
+        self.rules = editor.rules
+        self.original = editor._run_sudo(["cat", str(editor.mkinitcpio_path)])
+        self.config = MkinitcpioConfig(self.original)
+        self.changed = False
+
+    def list(self, array: str) -> List[str]:
+        """Текущее содержимое массива (MODULES, BINARIES, FILES или HOOKS)"""
+        return list(self.config.arrays.get(array, []))
+
+    def list_hooks(self) -> List[str]:
+        return self.list("HOOKS")
+
+    def list_modules(self) -> List[str]:
+        return self.list("MODULES")
+
+    ##==> Хуки
+    ##############################################
+    def add_hook(self, hook: str, position: Optional[str] = None, reference_hook: Optional[str] = None,
+                 after_hook: Optional[str] = None, before_hook: Optional[str] = None) -> bool:
+        """Добавить хук, аргументы как у MkinitcpioConfigEditor.add_hook
+
+        Returns:
+            bool: True если хук был добавлен
+        """
+        if not self.config.has("HOOKS"):
+            logger.error("HOOKS не найдены в mkinitcpio.conf")
+            return False
+
+        hooks = self.config.arrays["HOOKS"]
+        if hook in hooks:
+            logger.info(f"Hook {hook} already exists in the configuration")
+            return False
+
+        # Определяем позицию для вставки
+        insert_index = self.editor._calculate_insert_position(
+            hooks, hook, position, reference_hook, after_hook, before_hook
+        )
+        hooks.insert(insert_index, hook)
+        return True
+
+    def remove_hook(self, hook: str) -> bool:
+        if not self.config.has("HOOKS"):
+            logger.error("HOOKS не найдены в mkinitcpio.conf")
+            return False
+
+        hooks = self.config.arrays["HOOKS"]
+        if hook not in hooks:
+            logger.info(f"Hook {hook} not found in configuration")
+            return False
+
+        hooks.remove(hook)
+        return True
+
+    ##==> Модули и остальные массивы
+    ##############################################
+    def add_modules(self, modules: List[str], position: Position = Position.END, reference_module: Optional[str] = None) -> bool:
+        """Добавить модули, аргументы как у MkinitcpioConfigEditor.add_modules"""
+        if not self.config.has("MODULES"):
+            logger.warning("MODULES not found in mkinitcpio.conf, creating new line")
+
+        current_modules = self.config.arrays.setdefault("MODULES", [])
+        # Добавляем только новые модули
+        new_modules = [m for m in dict.fromkeys(modules) if m not in current_modules]
+        if not new_modules:
+            logger.info("All specified modules are already present in the configuration")
+            return False
+
+        # Определяем позицию вставки
+        if position == Position.BEFORE and reference_module and reference_module in current_modules:
+            index = current_modules.index(reference_module)
+        elif position == Position.AFTER and reference_module and reference_module in current_modules:
+            index = current_modules.index(reference_module) + 1
+        elif position == Position.START:
+            index = 0
+        else:  # Position.END
+            index = len(current_modules)
+        current_modules[index:index] = new_modules
+
+        logger.info(f"Added modules: {', '.join(new_modules)}")
+        return True
+
+    def remove_modules(self, modules: List[str]) -> bool:
+        if not self.config.has("MODULES"):
+            logger.warning("MODULES not found in mkinitcpio.conf")
+            return False
+
+        current_modules = self.config.arrays["MODULES"]
+        modules_to_remove = [m for m in current_modules if m in modules]
+        if not modules_to_remove:
+            logger.info("Specified modules not found in configuration")
+            return False
+
+        current_modules[:] = [m for m in current_modules if m not in modules]
+        logger.info(f"Removed modules: {', '.join(modules_to_remove)}")
+        return True
+
+    def ensure_required_modules_for_hooks(self) -> bool:
+        """Добавить обязательные модули для текущих хуков сессии"""
+        required_modules = self.rules.get_required_modules_for_hooks(self.list_hooks())
+        if not required_modules:
+            logger.info("No required modules to add for current hooks")
+            return False
+
+        return self.add_modules(required_modules)
+
+    def add_items(self, array: str, items: List[str]) -> bool:
+        """Добавить элементы в конец BINARIES или FILES"""
+        current = self.config.arrays.setdefault(array, [])
+        new_items = [item for item in dict.fromkeys(items) if item not in current]
+        current.extend(new_items)
+        return bool(new_items)
+
+    def remove_items(self, array: str, items: List[str]) -> bool:
+        current = self.config.arrays.get(array, [])
+        remaining = [item for item in current if item not in items]
+        if len(remaining) == len(current):
+            return False
+        current[:] = remaining
+        return True
+
+    ##==> Применение
+    ##############################################
+    def validate(self) -> List[dict]:
+        """Проверить порядок хуков; нарушения попадают в лог"""
+        issues = self.rules.validate_hook_order(self.list_hooks())
+        for issue in issues:
+            if "should_be_after" in issue:
+                logger.warning(f"Hook {issue['hook']} should be after {issue['should_be_after']}")
+            else:
+                logger.warning(f"Hook {issue['hook']} should be before {issue['should_be_before']}")
+        return issues
+
+    def commit(self, rebuild: bool = True) -> bool:
+        """Записать изменения одним cp и пересобрать образы один раз
+
+        Returns:
+            bool: True если файл был изменён
+        """
+        content = self.config.render()
+        if content == self.original:
+            return False
+
+        self.validate()
+        self.editor._write(content)
+        self.original = content
+        self.config = MkinitcpioConfig(content)
+        self.changed = True
 
+        if rebuild:
+            self.editor.apply_hooks()
+        return True
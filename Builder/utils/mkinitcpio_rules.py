@@ -3,10 +3,99 @@ Knowledge base for the correct order of hooks and modules in mkinitcpio
 Based on Arch Linux official documentation and best practices
 """
 
-from typing import Dict, List
+import heapq
+from typing import Dict, List, Tuple
 from loguru import logger
 
 
+class OrderCycleError(ValueError):
+    """Ограничения порядка противоречат друг другу"""
+
+    def __init__(self, cycle: List[str], reasons: List[str]):
+        self.cycle = cycle
+        self.reasons = reasons
+        super().__init__(
+            f"Cyclic ordering constraints: {' -> '.join(cycle)} ({'; '.join(reasons)})"
+        )
+
+
+class Barrier(str):
+    """Вспомогательная вершина графа ограничений, в результат не попадает"""
+
+
+def solve_order(items: List[str], constraints: Dict[Tuple[str, str], str]) -> List[str]:
+    """Упорядочить элементы так, чтобы выполнялись все ограничения
+
+    Топологическая сортировка (алгоритм Кана): из готовых элементов всегда
+    берётся тот, что стоял раньше в исходном списке, поэтому элементы без
+    ограничений сохраняют свой относительный порядок. O((n + e) log n).
+
+    Концы ограничений типа Barrier добавляются в граф как вспомогательные
+    вершины: через одну такую вершину все элементы одной группы
+    упорядочиваются перед всеми элементами другой за линейное число рёбер.
+
+    Args:
+        items: Исходный порядок, без повторов
+        constraints: (a, b) -> причина; a должен стоять раньше b
+
+    Raises:
+        OrderCycleError: Ограничения образуют цикл, в ошибке перечислен он сам
+    """
+    # Барьеры идут первыми: готовый барьер снимается сразу и не задерживает элементы
+    barriers = list(dict.fromkeys(
+        node for edge in constraints for node in edge if isinstance(node, Barrier)
+    ))
+    nodes = barriers + list(items)
+    index = {node: i for i, node in enumerate(nodes)}
+    successors: Dict[str, List[str]] = {node: [] for node in nodes}
+    predecessors: Dict[str, List[str]] = {node: [] for node in nodes}
+    for before, after in constraints:
+        if before in index and after in index and before != after:
+            successors[before].append(after)
+            predecessors[after].append(before)
+
+    indegree = {node: len(predecessors[node]) for node in nodes}
+    ready = [index[node] for node in nodes if indegree[node] == 0]
+    heapq.heapify(ready)
+
+    ordered: List[str] = []
+    while ready:
+        node = nodes[heapq.heappop(ready)]
+        ordered.append(node)
+        for successor in successors[node]:
+            indegree[successor] -= 1
+            if indegree[successor] == 0:
+                heapq.heappush(ready, index[successor])
+
+    if len(ordered) == len(nodes):
+        return [node for node in ordered if not isinstance(node, Barrier)]
+
+    # У каждой оставшейся вершины есть оставшийся предшественник: идём по ним до повтора
+    node = next(node for node in nodes if indegree[node] > 0)
+    path: List[str] = []
+    seen: Dict[str, int] = {}
+    while node not in seen:
+        seen[node] = len(path)
+        path.append(node)
+        node = next(p for p in predecessors[node] if indegree[p] > 0)
+    cycle = list(reversed(path[seen[node]:]))
+    # Цикл начинается с настоящего элемента, барьер между двумя элементами схлопывается
+    start = next(i for i, node in enumerate(cycle) if not isinstance(node, Barrier))
+    cycle = cycle[start:] + cycle[:start]
+    cycle.append(cycle[0])
+    reasons = [constraints[(a, b)] for a, b in zip(cycle, cycle[1:])]
+    merged_cycle: List[str] = [cycle[0]]
+    merged_reasons: List[str] = []
+    for node, reason in zip(cycle[1:], reasons):
+        if isinstance(merged_cycle[-1], Barrier):
+            merged_cycle[-1] = node
+            merged_reasons[-1] = f"{merged_reasons[-1]} {reason}"
+        else:
+            merged_cycle.append(node)
+            merged_reasons.append(reason)
+    raise OrderCycleError(merged_cycle, merged_reasons)
+
+
 class MkinitcpioRules:
     """База знаний о правильном порядке хуков и модулей"""
     
@@ -135,6 +224,14 @@ class MkinitcpioRules:
             "sd_mod": 70,
         }
 
+        # Модули, которые должны загружаться после других (не только по приоритету)
+        self.module_dependencies = {
+            "nvidia_modeset": ["nvidia"],
+            "nvidia_uvm": ["nvidia"],
+            "nvidia_drm": ["nvidia_modeset"],
+            "dm_crypt": ["dm_mod"],
+        }
+
         # Требуемые модули для конкретных хуков
         # Важно: используем только универсальные модули, доступные в большинстве конфигураций ядра
         self.hook_required_modules = {
@@ -181,70 +278,116 @@ class MkinitcpioRules:
 
         return self.sort_modules_by_priority(required_modules)
     
-    def validate_hook_order(self, hooks: List[str]) -> List[str]:
-        """Проверить и исправить порядок хуков"""
-        issues = []
-        
+    def hook_constraints(self, hooks: List[str]) -> Dict[Tuple[str, str], str]:
+        """Ограничения порядка для хуков: правила зависимостей и приоритеты известных хуков"""
+        constraints = self._priority_constraints(hooks, self.hook_priorities)
         for hook in hooks:
-            if hook in self.hook_dependencies:
-                deps = self.hook_dependencies[hook]
-                hook_pos = hooks.index(hook)
-                
-                # Проверяем must_be_after
-                for required_before in deps.get("must_be_after", []):
-                    if required_before in hooks:
-                        required_pos = hooks.index(required_before)
-                        if hook_pos <= required_pos:
-                            issues.append({
-                                "type": "order_violation",
-                                "hook": hook,
-                                "should_be_after": required_before,
-                                "current_positions": {hook: hook_pos, required_before: required_pos}
-                            })
-                
-                # Проверяем must_be_before
-                for required_after in deps.get("must_be_before", []):
-                    if required_after in hooks:
-                        required_pos = hooks.index(required_after)
-                        if hook_pos >= required_pos:
-                            issues.append({
-                                "type": "order_violation", 
-                                "hook": hook,
-                                "should_be_before": required_after,
-                                "current_positions": {hook: hook_pos, required_after: required_pos}
-                            })
-        
+            deps = self.hook_dependencies.get(hook, {})
+            for required_before in deps.get("must_be_after", []):
+                constraints[(required_before, hook)] = f"{hook} must be after {required_before}"
+            for required_after in deps.get("must_be_before", []):
+                constraints[(hook, required_after)] = f"{hook} must be before {required_after}"
+        return constraints
+
+    def module_constraints(self, modules: List[str]) -> Dict[Tuple[str, str], str]:
+        """Ограничения порядка для модулей"""
+        constraints = self._priority_constraints(modules, self.module_priorities)
+        for module in modules:
+            for required_before in self.module_dependencies.get(module, []):
+                constraints[(required_before, module)] = f"{module} must be after {required_before}"
+        return constraints
+
+    @staticmethod
+    def _priority_constraints(items: List[str], priorities: Dict[str, int]) -> Dict[Tuple[str, str], str]:
+        """Цепочка между соседними уровнями приоритета
+
+        Уровни связываются через барьер: все элементы уровня -> барьер -> все
+        элементы следующего уровня, поэтому рёбер линейное число, а не
+        произведение размеров уровней.
+
+        Неизвестные элементы ограничений не получают и остаются там, где их
+        поставил пользователь; элементы с одинаковым приоритетом тоже.
+        """
+        levels: Dict[int, List[str]] = {}
+        for item in dict.fromkeys(items):
+            if item in priorities:
+                levels.setdefault(priorities[item], []).append(item)
+
+        constraints: Dict[Tuple[str, str], str] = {}
+        ordered_levels = sorted(levels)
+        for low, high in zip(ordered_levels, ordered_levels[1:]):
+            barrier = Barrier(f"<priority {high}>")
+            for before in levels[low]:
+                constraints[(before, barrier)] = f"{before} ({low}) has a lower priority than"
+            for after in levels[high]:
+                constraints[(barrier, after)] = f"{after} ({high})"
+        return constraints
+
+    def validate_hook_order(self, hooks: List[str]) -> List[dict]:
+        """Найти нарушения правил зависимостей в порядке хуков"""
+        issues = []
+        positions = {hook: i for i, hook in reversed(list(enumerate(hooks)))}
+
+        for hook, hook_pos in positions.items():
+            deps = self.hook_dependencies.get(hook)
+            if not deps:
+                continue
+
+            # Проверяем must_be_after
+            for required_before in deps.get("must_be_after", []):
+                required_pos = positions.get(required_before)
+                if required_pos is not None and hook_pos <= required_pos:
+                    issues.append({
+                        "type": "order_violation",
+                        "hook": hook,
+                        "should_be_after": required_before,
+                        "current_positions": {hook: hook_pos, required_before: required_pos}
+                    })
+
+            # Проверяем must_be_before
+            for required_after in deps.get("must_be_before", []):
+                required_pos = positions.get(required_after)
+                if required_pos is not None and hook_pos >= required_pos:
+                    issues.append({
+                        "type": "order_violation",
+                        "hook": hook,
+                        "should_be_before": required_after,
+                        "current_positions": {hook: hook_pos, required_after: required_pos}
+                    })
+
         return issues
-    
+
     def sort_hooks_by_priority(self, hooks: List[str]) -> List[str]:
-        """Отсортировать хуки по приоритету"""
-        def hook_sort_key(hook):
-            return self.get_hook_priority(hook)
-        
-        sorted_hooks = sorted(hooks, key=hook_sort_key)
-        
+        """Упорядочить хуки по правилам зависимостей и приоритетам
+
+        Неизвестные хуки сохраняют своё место относительно соседей.
+
+        Raises:
+            OrderCycleError: Правила противоречат друг другу
+        """
+        unique_hooks = list(dict.fromkeys(hooks))
+        sorted_hooks = solve_order(unique_hooks, self.hook_constraints(unique_hooks))
+
         # Логируем изменения
         if sorted_hooks != hooks:
             logger.info("Hook order changed:")
             logger.info(f"  Before: {' '.join(hooks)}")
             logger.info(f"  After: {' '.join(sorted_hooks)}")
-        
+
         return sorted_hooks
-    
+
     def sort_modules_by_priority(self, modules: List[str]) -> List[str]:
-        """Отсортировать модули по приоритету"""
-        def module_sort_key(module):
-            return self.get_module_priority(module)
-        
-        sorted_modules = sorted(modules, key=module_sort_key)
-        
+        """Упорядочить модули по зависимостям и приоритетам, как хуки"""
+        unique_modules = list(dict.fromkeys(modules))
+        sorted_modules = solve_order(unique_modules, self.module_constraints(unique_modules))
+
         if sorted_modules != modules:
             logger.info("Module order changed:")
             logger.info(f"  Before: {' '.join(modules)}")
             logger.info(f"  After: {' '.join(sorted_modules)}")
-        
+
         return sorted_modules
-    
+
     def resolve_position_conflict(self, hooks: List[str], new_hook: str, 
                                  after_hook: str = None, before_hook: str = None) -> int:
         """Умное разрешение конфликтов позиций с учетом правил"""
@@ -0,0 +1,289 @@
+import os
+import re
+import subprocess
+import tempfile
+import traceback
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from .config_backup import ConfigBackup
+from .privileged_helper import run_sudo
+
+_SECTION = re.compile(r"^\[([^\[\]]+)\]$")
+_OPTION = re.compile(r"^([A-Za-z]+)\s*(?:=\s*(.*?))?$")
+# "#Color", "#ParallelDownloads = 5"; обычный текст комментария не подходит
+_COMMENTED_OPTION = re.compile(r"^#\s*([A-Za-z]+)\s*(?:=\s*(.*?))?$")
+_COMMENTED_SECTION = re.compile(r"^#\s*\[([^\[\]]+)\]$")
+
+
+class PacmanSection:
+    """One ``[section]`` of pacman.conf with its lines kept verbatim"""
+
+    def __init__(self, name: Optional[str], lines: List[str]):
+        self.name = name
+        self.lines = lines
+        self.options: Dict[str, List[int]] = {}
+        self.commented: Dict[str, int] = {}
+        self.errors: List[str] = []
+        self._index()
+
+    def _index(self) -> None:
+        self.options.clear()
+        self.commented.clear()
+        self.errors.clear()
+        start = 0 if self.name is None else 1
+        for i, line in enumerate(self.lines[start:], start):
+            stripped = line.strip()
+            if not stripped:
+                continue
+            if stripped.startswith("#"):
+                match = _COMMENTED_OPTION.match(stripped)
+                if match:
+                    self.commented.setdefault(match.group(1), i)
+                continue
+            match = _OPTION.match(stripped)
+            if match is None or self.name is None:
+                self.errors.append(f"unexpected line {stripped!r}")
+                continue
+            self.options.setdefault(match.group(1), []).append(i)
+
+    def replace_lines(self, lines: List[str]) -> None:
+        """Replace the lines of the section, the header line included"""
+        self.lines[:] = lines
+        self._index()
+
+    def get(self, key: str) -> Optional[str]:
+        """Value of the first active option, "" for a flag, None if it is not set"""
+        indexes = self.options.get(key)
+        if not indexes:
+            return None
+        return _OPTION.match(self.lines[indexes[0]].strip()).group(2) or ""
+
+    def values(self, key: str) -> List[str]:
+        return [_OPTION.match(self.lines[i].strip()).group(2) or "" for i in self.options.get(key, [])]
+
+    def set(self, key: str, value: Optional[str] = None) -> None:
+        """Set an option, uncommenting its default line when there is one
+
+        Args:
+            value: None for a flag such as ``Color``
+        """
+        line = f"{key}\n" if value is None else f"{key} = {value}\n"
+        if key in self.options:
+            self.lines[self.options[key][0]] = line
+        elif key in self.commented:
+            self.lines[self.commented[key]] = line
+        else:
+            # После последней непустой строки секции
+            position = len(self.lines)
+            while position > 1 and not self.lines[position - 1].strip():
+                position -= 1
+            self.lines.insert(position, line)
+        self._index()
+
+
+class PacmanConf:
+    """Round-trip model of pacman.conf.
+
+    The file is split into sections whose lines are kept verbatim, so
+    rendering an unedited model gives the original text byte for byte and an
+    edit only touches the lines it changes. Sections and options are indexed
+    by name. Commented defaults (``#Color``, ``#[multilib]``) are enabled in
+    place instead of being appended as duplicates.
+    """
+
+    def __init__(self, content: str = ""):
+        self._parse(content)
+
+    def _parse(self, content: str) -> None:
+        self.sections: List[PacmanSection] = []
+        self._by_name: Dict[str, PacmanSection] = {}
+        self.duplicates: List[str] = []
+
+        name: Optional[str] = None
+        lines: List[str] = []
+        for line in content.splitlines(keepends=True):
+            match = _SECTION.match(line.strip())
+            if match:
+                self._append(name, lines)
+                name, lines = match.group(1), []
+            lines.append(line)
+        self._append(name, lines)
+
+    def _append(self, name: Optional[str], lines: List[str]) -> None:
+        if name is None and not lines:
+            return
+        section = PacmanSection(name, lines)
+        self.sections.append(section)
+        if name is not None:
+            if name in self._by_name:
+                self.duplicates.append(name)
+            self._by_name.setdefault(name, section)
+
+    def render(self) -> str:
+        return "".join(line for section in self.sections for line in section.lines)
+
+    def section(self, name: str) -> Optional[PacmanSection]:
+        return self._by_name.get(name)
+
+    def has_section(self, name: str) -> bool:
+        return name in self._by_name
+
+    def get(self, section: str, key: str) -> Optional[str]:
+        found = self._by_name.get(section)
+        return found.get(key) if found is not None else None
+
+    def set(self, section: str, key: str, value: Optional[str] = None) -> None:
+        found = self._by_name.get(section)
+        if found is None:
+            raise KeyError(f"pacman.conf has no [{section}] section")
+        found.set(key, value)
+
+    def add_section(
+        self,
+        name: str,
+        options: List[Tuple[str, str]],
+        before: Optional[str] = None,
+        comment: Optional[str] = None,
+    ) -> bool:
+        """Add a repository unless it is already there
+
+        Args:
+            before: Section to insert the new one in front of, the end of the
+                file if it is missing
+            comment: Comment line written above the section
+
+        Returns:
+            bool: Whether the section was added
+        """
+        if name in self._by_name:
+            return False
+        if self.enable_section(name):
+            return True
+
+        block = [f"# {comment}\n"] if comment else []
+        block += [f"[{name}]\n"] + [f"{key} = {value}\n" for key, value in options] + ["\n"]
+        lines = self.render().splitlines(keepends=True)
+        anchor = self._by_name.get(before) if before else None
+        if anchor is not None:
+            position = sum(len(s.lines) for s in self.sections[: self.sections.index(anchor)])
+        else:
+            if lines and not lines[-1].endswith("\n"):
+                lines[-1] += "\n"
+            if lines and lines[-1].strip():
+                block.insert(0, "\n")
+            block.pop()
+            position = len(lines)
+        lines[position:position] = block
+        self._parse("".join(lines))
+        return True
+
+    def enable_section(self, name: str) -> bool:
+        """Uncomment ``#[name]`` and the commented ``Key = value`` lines right below it"""
+        if name in self._by_name:
+            return False
+        lines = self.render().splitlines(keepends=True)
+        for i, line in enumerate(lines):
+            match = _COMMENTED_SECTION.match(line.strip())
+            if not match or match.group(1) != name:
+                continue
+            lines[i] = f"[{name}]\n"
+            j = i + 1
+            while j < len(lines) and "=" in lines[j] and _COMMENTED_OPTION.match(lines[j].strip()):
+                lines[j] = lines[j].strip()[1:].lstrip() + "\n"
+                j += 1
+            self._parse("".join(lines))
+            return True
+        return False
+
+    def validate(self) -> None:
+        """Raise ValueError if pacman would not accept the configuration"""
+        problems = [f"duplicate section [{name}]" for name in self.duplicates]
+        if "options" not in self._by_name:
+            problems.append("no [options] section")
+        for section in self.sections:
+            where = f"[{section.name}]" if section.name else "before the first section"
+            problems += [f"{where}: {error}" for error in section.errors]
+            if section.name not in (None, "options") and not (
+                "Server" in section.options or "Include" in section.options
+            ):
+                problems.append(f"[{section.name}] has neither Server nor Include")
+        if problems:
+            raise ValueError("; ".join(problems))
+
+
+class PacmanConfTransaction:
+    """Edits of several managers applied to pacman.conf in one write.
+
+    Managers stage functions that change a PacmanConf. commit() reads the
+    file once, applies all of them, validates the result and, if anything
+    changed, backs the file up once and replaces it atomically: the new
+    content is copied next to it and renamed over it, so an interrupted
+    run leaves either the old or the new file.
+    """
+
+    PACMAN_CONF = Path("/etc/pacman.conf")
+
+    def __init__(self, path: Path = PACMAN_CONF, backup: bool = True):
+        """
+        Args:
+            backup: Back the file up before replacing it
+        """
+        self.path = path
+        self.backup = backup
+        self._edits: List[Tuple[str, Callable[[PacmanConf], None]]] = []
+
+    def _run_sudo(self, command: List[str]) -> str:
+        return run_sudo(command, text=True, capture_output=True, check=True).stdout
+
+    def stage(self, description: str, edit: Callable[[PacmanConf], None]) -> "PacmanConfTransaction":
+        self._edits.append((description, edit))
+        return self
+
+    def commit(self) -> bool:
+        edits, self._edits = self._edits, []
+        if not self.path.is_file():
+            logger.warning("Pacman configuration skipped... (file not found)")
+            return False
+
+        error_msg = "Error while configuring pacman: {err}"
+        try:
+            original = self.path.read_text()
+            conf = PacmanConf(original)
+            for _, edit in edits:
+                edit(conf)
+            conf.validate()
+
+            content = conf.render()
+            if content == original:
+                logger.info("pacman.conf is already up to date")
+                return True
+
+            note = ""
+            if self.backup:
+                backup = ConfigBackup._next_backup_path(self.path)
+                self._run_sudo(["cp", "--preserve=all", str(self.path), str(backup)])
+                note = f" (backup: {backup})"
+            self._write(content)
+            logger.success(f"pacman.conf updated: {', '.join(d for d, _ in edits)}{note}")
+            return True
+        except ValueError as e:
+            logger.error(f"pacman.conf was left unchanged, the result would be invalid: {e}")
+        except subprocess.CalledProcessError as e:
+            logger.error(error_msg.format(err=e.stderr))
+        except Exception:
+            logger.error(error_msg.format(err=traceback.format_exc()))
+        return False
+
+    def _write(self, content: str) -> None:
+        staged = self.path.with_name(f".{self.path.name}.meowrch-new")
+        with tempfile.NamedTemporaryFile("w", suffix=".conf") as tmp:
+            tmp.write(content)
+            tmp.flush()
+            # cp создаёт файл с правами источника
+            os.chmod(tmp.name, 0o644)
+            self._run_sudo(["cp", tmp.name, str(staged)])
+        # rename в пределах каталога атомарен
+        self._run_sudo(["mv", str(staged), str(self.path)])
@@ -0,0 +1,316 @@
+import os
+import subprocess
+import tarfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from loguru import logger
+
+try:
+    import zstandard
+except ImportError:  # Optional: fall back to the zstd binary
+    zstandard = None
+
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def parse_desc(content: str) -> Dict[str, List[str]]:
+    """Parse a libalpm "desc" file into a mapping of %FIELD% -> values.
+
+    The format is a list of blocks separated by blank lines, each block starting
+    with a header like ``%NAME%`` followed by one value per line.
+    """
+    fields: Dict[str, List[str]] = {}
+    current: Optional[str] = None
+
+    for line in content.splitlines():
+        line = line.strip()
+        if not line:
+            current = None
+            continue
+        if line.startswith("%") and line.endswith("%") and len(line) > 2:
+            current = line[1:-1]
+            fields.setdefault(current, [])
+        elif current is not None:
+            fields[current].append(line)
+
+    return fields
+
+
+def strip_version(dependency: str) -> str:
+    """Return the bare package name from a dependency like ``foo>=1.2``."""
+    for separator in ("<", ">", "="):
+        dependency = dependency.split(separator, 1)[0]
+    return dependency.strip()
+
+
+@dataclass
+class PackageRecord:
+    name: str
+    version: str
+    provides: List[str] = field(default_factory=list)
+    depends: List[str] = field(default_factory=list)
+    arch: str = ""
+
+
+class LocalPackageIndex:
+    """In-memory index of installed packages read from the local pacman database.
+
+    Each installed package has a ``<name>-<version>/desc`` file under
+    ``/var/lib/pacman/local``. Reading those once is much cheaper than spawning
+    ``pacman -Q`` for every check. The index is rebuilt automatically when the
+    mtime of the database directory changes, i.e. when packages are installed
+    or removed.
+    """
+
+    LOCAL_DB_PATH = Path("/var/lib/pacman/local")
+
+    def __init__(self, db_path: Path = LOCAL_DB_PATH):
+        self.db_path = db_path
+        self._mtime: Optional[int] = None
+        self._packages: Dict[str, PackageRecord] = {}
+        self._providers: Dict[str, List[str]] = {}
+
+    def available(self) -> bool:
+        """Whether the local database can be read directly."""
+        return self.db_path.is_dir()
+
+    def _refresh(self) -> None:
+        mtime = os.stat(self.db_path).st_mtime_ns
+        if mtime == self._mtime:
+            return
+
+        packages: Dict[str, PackageRecord] = {}
+        providers: Dict[str, List[str]] = {}
+
+        with os.scandir(self.db_path) as entries:
+            for entry in entries:
+                if not entry.is_dir(follow_symlinks=False):
+                    continue
+                try:
+                    with open(os.path.join(entry.path, "desc"), encoding="utf-8") as f:
+                        fields = parse_desc(f.read())
+                except OSError:
+                    continue
+
+                name = (fields.get("NAME") or [""])[0]
+                if not name:
+                    continue
+
+                record = PackageRecord(
+                    name=name,
+                    version=(fields.get("VERSION") or [""])[0],
+                    provides=[strip_version(p) for p in fields.get("PROVIDES", [])],
+                    depends=fields.get("DEPENDS", []),
+                    arch=(fields.get("ARCH") or [""])[0],
+                )
+                packages[name] = record
+                for provided in record.provides:
+                    providers.setdefault(provided, []).append(name)
+
+        self._packages = packages
+        self._providers = providers
+        self._mtime = mtime
+        logger.debug(f"Loaded {len(packages)} installed packages from {self.db_path}")
+
+    def is_installed(self, name: str) -> bool:
+        """Whether a package with exactly this name is installed; provides do not count."""
+        self._refresh()
+        return name in self._packages
+
+    def is_satisfied(self, name: str) -> bool:
+        """Same semantics as ``pacman -Q <name>``: a package with this name or providing it is installed."""
+        self._refresh()
+        bare = strip_version(name)
+        return bare in self._packages or bare in self._providers
+
+    def get_version(self, name: str) -> Optional[str]:
+        self._refresh()
+        record = self._packages.get(name)
+        return record.version if record else None
+
+    def get_providers(self, name: str) -> List[str]:
+        self._refresh()
+        return list(self._providers.get(strip_version(name), []))
+
+    def get_record(self, name: str) -> Optional[PackageRecord]:
+        """Installed package by name, or the first installed provider of it."""
+        self._refresh()
+        bare = strip_version(name)
+        if bare in self._packages:
+            return self._packages[bare]
+        providers = self._providers.get(bare)
+        return self._packages[providers[0]] if providers else None
+
+    def installed_names(self) -> List[str]:
+        self._refresh()
+        return list(self._packages)
+
+
+class SyncDatabase:
+    """Reader for the repository databases in ``/var/lib/pacman/sync``.
+
+    Every ``<repo>.db`` is a (gzip or zstd compressed) tar archive with one
+    ``<name>-<version>/desc`` entry per package. The archives are streamed once
+    and only the names, groups and provides are kept in memory, which is enough
+    to tell whether pacman can install a given name.
+    """
+
+    SYNC_DB_PATH = Path("/var/lib/pacman/sync")
+
+    REPO = "repo"
+    AUR = "aur"
+    MISSING = "missing"
+
+    def __init__(self, db_path: Path = SYNC_DB_PATH):
+        self.db_path = db_path
+        self._loaded = False
+        self._packages: Dict[str, PackageRecord] = {}
+        self._repos: Dict[str, str] = {}
+        self._providers: Dict[str, List[str]] = {}
+        self._groups: Set[str] = set()
+
+    def load(self) -> "SyncDatabase":
+        if self._loaded:
+            return self
+
+        for db_file in sorted(self.db_path.glob("*.db")):
+            repo = db_file.stem
+            count = 0
+            try:
+                for fields in self._iter_desc(db_file):
+                    name = (fields.get("NAME") or [""])[0]
+                    if not name or name in self._packages:
+                        continue
+                    record = PackageRecord(
+                        name=name,
+                        version=(fields.get("VERSION") or [""])[0],
+                        provides=[strip_version(p) for p in fields.get("PROVIDES", [])],
+                    )
+                    self._packages[name] = record
+                    self._repos[name] = repo
+                    for provided in record.provides:
+                        self._providers.setdefault(provided, []).append(name)
+                    self._groups.update(fields.get("GROUPS", []))
+                    count += 1
+            except (OSError, tarfile.TarError, subprocess.SubprocessError) as e:
+                logger.warning(f'Failed to read sync database "{db_file}": {e}')
+                continue
+            logger.debug(f'Loaded {count} packages from sync database "{repo}"')
+
+        self._loaded = True
+        return self
+
+    def _iter_desc(self, db_file: Path) -> Iterator[Dict[str, List[str]]]:
+        with open(db_file, "rb") as raw:
+            magic = raw.read(4)
+            raw.seek(0)
+
+            if magic.startswith(ZSTD_MAGIC):
+                if zstandard is not None:
+                    reader = zstandard.ZstdDecompressor().stream_reader(raw)
+                    yield from self._iter_tar(reader)
+                    return
+
+                proc = subprocess.Popen(
+                    ["zstd", "-dcq", str(db_file)],
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.DEVNULL,
+                )
+                try:
+                    yield from self._iter_tar(proc.stdout)
+                finally:
+                    proc.stdout.close()
+                    proc.wait()
+                return
+
+            # tarfile detects gzip/xz/bzip2/plain streams on its own
+            yield from self._iter_tar(raw, mode="r|*")
+
+    @staticmethod
+    def _iter_tar(fileobj, mode: str = "r|") -> Iterator[Dict[str, List[str]]]:
+        with tarfile.open(fileobj=fileobj, mode=mode) as archive:
+            for member in archive:
+                if not member.isfile() or not member.name.endswith("/desc"):
+                    continue
+                extracted = archive.extractfile(member)
+                if extracted is None:
+                    continue
+                yield parse_desc(extracted.read().decode("utf-8", errors="replace"))
+
+    def has_package(self, name: str) -> bool:
+        """Whether ``pacman -S <name>`` can resolve the name from the sync repos."""
+        self.load()
+        bare = strip_version(name)
+        return bare in self._packages or bare in self._providers or bare in self._groups
+
+    def get_repo(self, name: str) -> Optional[str]:
+        self.load()
+        return self._repos.get(name)
+
+    def classify(
+        self, packages: Iterable[str], aur_packages: Optional[Set[str]] = None
+    ) -> Dict[str, str]:
+        """Classify package names as repo, AUR or missing.
+
+        Args:
+            packages: Names to classify.
+            aur_packages: Names known to exist in the AUR. When None (AUR could not
+                be queried), everything that is not in the sync repos is assumed
+                to come from the AUR.
+
+        Returns:
+            Dict[str, str]: Name -> one of ``REPO``, ``AUR`` or ``MISSING``.
+        """
+        self.load()
+        result: Dict[str, str] = {}
+        for name in packages:
+            if self.has_package(name):
+                result[name] = self.REPO
+            elif aur_packages is None or name in aur_packages:
+                result[name] = self.AUR
+            else:
+                result[name] = self.MISSING
+        return result
+
+    def route(
+        self,
+        pacman: List[str],
+        aur: List[str],
+        aur_packages: Optional[Set[str]] = None,
+    ) -> Tuple[List[str], List[str], List[str]]:
+        """Move each package to the installer that can actually provide it.
+
+        Returns:
+            Tuple[List[str], List[str], List[str]]: (pacman, aur, missing) lists,
+            order preserved.
+        """
+        classes = self.classify(list(dict.fromkeys(pacman + aur)), aur_packages)
+        routed_pacman: List[str] = []
+        routed_aur: List[str] = []
+        missing: List[str] = []
+
+        for name in pacman + aur:
+            target = classes[name]
+            if target == self.REPO:
+                routed_pacman.append(name)
+            elif target == self.AUR:
+                routed_aur.append(name)
+            else:
+                missing.append(name)
+
+        for name in pacman:
+            if classes[name] == self.AUR:
+                logger.info(f'Package "{name}" is not in the sync repositories, installing it from the AUR')
+        for name in aur:
+            if classes[name] == self.REPO:
+                logger.info(f'Package "{name}" is available in "{self.get_repo(name) or "a repository"}", installing it with pacman')
+        for name in missing:
+            logger.warning(f'Package "{name}" was found neither in the repositories nor in the AUR')
+
+        return (
+            list(dict.fromkeys(routed_pacman)),
+            list(dict.fromkeys(routed_aur)),
+            list(dict.fromkeys(missing)),
+        )
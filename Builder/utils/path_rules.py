@@ -0,0 +1,118 @@
+import os
+import re
+from typing import Iterable, Iterator, List, Pattern, Tuple
+
+
+class PathRules:
+    """gitignore-style exclude rules, compiled once into regular expressions.
+
+    Paths are relative to the root the rules are applied to and use "/".
+    Supported syntax:
+
+    - ``name`` matches an entry with that name at any depth
+    - ``/name`` or ``dir/name`` is anchored to the root
+    - ``name/`` only matches directories
+    - ``*``, ``?`` and ``[...]`` do not cross "/", ``**`` matches any depth
+    - ``!pattern`` re-includes what an earlier pattern excluded
+
+    As in git, the last matching pattern wins and nothing inside an excluded
+    directory can be re-included: walk() does not descend into it.
+    """
+
+    def __init__(self, patterns: Iterable[str] = ()):
+        self.patterns = list(patterns)
+        self._rules: List[Tuple[Pattern, bool, bool]] = []
+        for pattern in self.patterns:
+            pattern = pattern.strip()
+            if not pattern or pattern.startswith("#"):
+                continue
+            self._rules.append(self._compile(pattern))
+
+    def __bool__(self) -> bool:
+        return bool(self._rules)
+
+    @staticmethod
+    def _compile(pattern: str) -> Tuple[Pattern, bool, bool]:
+        negate = pattern.startswith("!")
+        if negate:
+            pattern = pattern[1:]
+        dir_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+        # Как в git: шаблон со слешем в начале или середине привязан к корню
+        anchored = "/" in pattern
+        body = PathRules._translate(pattern.lstrip("/"))
+        regex = f"^{body}$" if anchored else f"^(?:.*/)?{body}$"
+        return re.compile(regex), negate, dir_only
+
+    @staticmethod
+    def _translate(pattern: str) -> str:
+        regex, i = [], 0
+        while i < len(pattern):
+            char = pattern[i]
+            if pattern.startswith("**/", i):
+                regex.append("(?:.*/)?")
+                i += 3
+            elif pattern.startswith("**", i):
+                regex.append(".*")
+                i += 2
+            elif char == "*":
+                regex.append("[^/]*")
+                i += 1
+            elif char == "?":
+                regex.append("[^/]")
+                i += 1
+            elif char == "[" and "]" in pattern[i + 1:]:
+                end = pattern.index("]", i + 1)
+                content = pattern[i + 1:end]
+                if content.startswith("!"):
+                    content = "^" + content[1:]
+                regex.append(f"[{content}]")
+                i = end + 1
+            else:
+                regex.append(re.escape(char))
+                i += 1
+        return "".join(regex)
+
+    def match(self, path: str, is_dir: bool) -> bool:
+        """Whether the path itself is excluded (its parents are not checked)"""
+        excluded = False
+        for regex, negate, dir_only in self._rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(path):
+                excluded = not negate
+        return excluded
+
+    def is_excluded(self, path: str, is_dir: bool = False) -> bool:
+        """Whether the path or one of its parent directories is excluded"""
+        parts = path.strip("/").split("/")
+        for depth in range(1, len(parts)):
+            if self.match("/".join(parts[:depth]), is_dir=True):
+                return True
+        return self.match("/".join(parts), is_dir)
+
+    def walk(self, root: str, prefix: str = "", include_dirs: bool = False) -> Iterator[Tuple[os.DirEntry, str]]:
+        """Entries under root that are not excluded, with their relative paths
+
+        Uses os.scandir and its cached entry types; excluded directories are
+        pruned without being read. Symlinks are yielded, never followed.
+
+        Args:
+            prefix: Path of root relative to the base of the rules
+            include_dirs: Also yield directories, each before its contents
+        """
+        stack = [(str(root), prefix.strip("/"))]
+        while stack:
+            directory, relative = stack.pop()
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    path = f"{relative}/{entry.name}" if relative else entry.name
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    if self._rules and self.match(path, is_dir):
+                        continue
+                    if is_dir:
+                        stack.append((entry.path, path))
+                        if include_dirs:
+                            yield entry, path
+                    else:
+                        yield entry, path
@@ -0,0 +1,242 @@
+import re
+import shutil
+import socket
+import threading
+import urllib.request
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+from .pacman_conf import PacmanConf
+
+PEER_PORT = 7878
+DISCOVERY_PORT = 7879
+# Строки pacman.conf, добавленные для пиров, помечаются и потом удаляются
+PEER_MARKER = "# meowrch-peer-cache"
+
+_DISCOVERY_REQUEST = b"MEOWRCH_PEER?"
+_DISCOVERY_REPLY = "MEOWRCH_PEER"
+_PACKAGE_RE = re.compile(r"^[\w@.+-]+\.pkg\.tar(\.\w+)?(\.sig)?$")
+
+
+class PeerCacheServer:
+    """Serves the local package caches to other installers on the LAN.
+
+    Package files are looked up by file name in every cache directory, so
+    the ``$repo/os/$arch`` part of a pacman Server URL does not matter.
+    Repository databases are never served: a peer answers 404 and pacman
+    falls back to the next Server, i.e. the regular mirrors. Only pacman
+    downloads from peers, and it checks every package against the signed
+    sync databases, so an untrusted peer cannot slip in a package. Built AUR
+    packages have no such check and are not shared. A UDP responder
+    answers discovery broadcasts with the HTTP port.
+    """
+
+    def __init__(
+        self,
+        cache_dirs: List[Path],
+        port: int = PEER_PORT,
+        discovery_port: Optional[int] = DISCOVERY_PORT,
+        bind: str = "",
+    ):
+        self.cache_dirs = cache_dirs
+        self.discovery_port = discovery_port
+        self.instance_id = uuid.uuid4().hex
+        self.served_files = 0
+        self._served_lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((bind, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._udp: Optional[socket.socket] = None
+        self._threads: List[threading.Thread] = []
+
+    @property
+    def port(self) -> int:
+        return self._httpd.server_address[1]
+
+    def start(self) -> None:
+        self._spawn(self._httpd.serve_forever)
+        if self.discovery_port is not None:
+            self._udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._udp.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self._udp.bind(("", self.discovery_port))
+            self._spawn(self._answer_discovery)
+        logger.info(f"Sharing the package cache with LAN peers on port {self.port}")
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._udp is not None:
+            self._udp.close()
+            self._udp = None
+        for thread in self._threads:
+            thread.join(timeout=2)
+        self._threads.clear()
+
+    def find_package(self, filename: str) -> Optional[Path]:
+        if not _PACKAGE_RE.match(filename):
+            return None
+        for cache_dir in self.cache_dirs:
+            path = cache_dir / filename
+            if path.is_file():
+                return path
+        return None
+
+    def _spawn(self, target) -> None:
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _answer_discovery(self) -> None:
+        reply = f"{_DISCOVERY_REPLY} {self.port} {self.instance_id}".encode()
+        while self._udp is not None:
+            try:
+                data, address = self._udp.recvfrom(64)
+            except OSError:
+                return
+            if data == _DISCOVERY_REQUEST:
+                try:
+                    self._udp.sendto(reply, address)
+                except OSError:
+                    pass
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_HEAD(self):
+                self._respond(send_body=False)
+
+            def do_GET(self):
+                self._respond(send_body=True)
+
+            def _respond(self, send_body: bool) -> None:
+                parts = [p for p in self.path.split("?")[0].split("/") if p]
+
+                if parts == ["ping"]:
+                    return self._send_bytes(server.instance_id.encode(), "text/plain", send_body)
+
+                path = server.find_package(parts[-1]) if parts else None
+
+                if path is None or not path.is_file():
+                    self.send_error(404)
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(path.stat().st_size))
+                self.end_headers()
+                if send_body:
+                    with open(path, "rb") as file:
+                        shutil.copyfileobj(file, self.wfile)
+                    # Запросы обрабатываются в разных потоках ThreadingHTTPServer
+                    with server._served_lock:
+                        server.served_files += 1
+
+            def _send_bytes(self, body: bytes, content_type: str, send_body: bool) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if send_body:
+                    self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(f"Peer cache: {self.address_string()} {format % args}")
+
+        return Handler
+
+
+class PeerCache:
+    """Client side: finds the peers that pacman.conf will point to"""
+
+    def __init__(self, peers: List[str], timeout: float = 5.0):
+        self.peers = peers
+        self.timeout = timeout
+
+    @staticmethod
+    def discover(
+        configured: List[str],
+        timeout: float = 1.5,
+        discovery_port: int = DISCOVERY_PORT,
+        broadcast_address: str = "<broadcast>",
+        exclude_id: Optional[str] = None,
+    ) -> List[str]:
+        """Configured peers plus the ones answering a UDP broadcast
+
+        Args:
+            configured: "host" or "host:port" entries given by the user
+            exclude_id: Instance id of the local server, it must not be its own peer
+
+        Returns:
+            List[str]: "host:port" of every peer that answered /ping
+        """
+        candidates: Dict[str, None] = {}
+        for peer in configured:
+            candidates[peer if ":" in peer else f"{peer}:{PEER_PORT}"] = None
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+            sock.settimeout(timeout)
+            sock.sendto(_DISCOVERY_REQUEST, (broadcast_address, discovery_port))
+            while True:
+                data, (host, _) = sock.recvfrom(128)
+                reply = data.decode(errors="replace").split()
+                if len(reply) == 3 and reply[0] == _DISCOVERY_REPLY and reply[2] != exclude_id:
+                    candidates[f"{host}:{reply[1]}"] = None
+        except OSError:
+            # Тайм-аут ожидания ответов или сеть без broadcast
+            pass
+        finally:
+            sock.close()
+
+        peers = []
+        for peer in candidates:
+            peer_id = PeerCache._ping(peer, timeout)
+            if peer_id is not None and peer_id != exclude_id:
+                peers.append(peer)
+            elif peer_id is None:
+                logger.warning(f"Package cache peer {peer} does not respond")
+        return peers
+
+    @staticmethod
+    def _ping(peer: str, timeout: float) -> Optional[str]:
+        try:
+            with urllib.request.urlopen(f"http://{peer}/ping", timeout=timeout) as response:
+                return response.read().decode()
+        except (OSError, ValueError):
+            return None
+
+
+def add_peers(conf: PacmanConf, peers: List[str]) -> None:
+    """Make the peers the first Server of every repository"""
+    remove_peers(conf)
+    if not peers:
+        return
+    servers = [f"Server = http://{peer}/$repo/os/$arch {PEER_MARKER}\n" for peer in peers]
+    for section in conf.sections:
+        if section.name not in (None, "options"):
+            section.replace_lines(section.lines[:1] + servers + section.lines[1:])
+
+
+def remove_peers(conf: PacmanConf) -> None:
+    for section in conf.sections:
+        kept = [line for line in section.lines if PEER_MARKER not in line]
+        if len(kept) != len(section.lines):
+            section.replace_lines(kept)
+
+
+def render_pacman_conf(content: str, peers: List[str]) -> str:
+    """pacman.conf with the peers as the first Server of every repository"""
+    conf = PacmanConf(content)
+    add_peers(conf, peers)
+    return conf.render()
+
+
+def strip_peers(content: str) -> str:
+    conf = PacmanConf(content)
+    remove_peers(conf)
+    return conf.render()
@@ -0,0 +1,98 @@
+import difflib
+import json
+import shutil
+import subprocess
+import tempfile
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+@dataclass
+class InstallPlan:
+    """Everything an installation run would change, computed without changing it"""
+    pacman_packages: List[str] = field(default_factory=list)
+    aur_packages: List[str] = field(default_factory=list)
+    dotfiles: Dict[str, List[str]] = field(default_factory=dict)
+    config_edits: Dict[str, List[str]] = field(default_factory=dict)
+    services: List[str] = field(default_factory=list)
+    user_services: List[str] = field(default_factory=list)
+    notes: List[str] = field(default_factory=list)
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), indent=2)
+
+    def render(self) -> str:
+        sections = [
+            ("Packages to install (pacman)", self.pacman_packages),
+            ("Packages to install (AUR)", self.aur_packages),
+            ("New dotfiles", self.dotfiles.get("new", [])),
+            ("Changed dotfiles", self.dotfiles.get("changed", [])),
+            ("System services to enable", self.services),
+            ("User services to enable", self.user_services),
+        ]
+
+        lines = []
+        for title, items in sections:
+            lines.append(f"==> {title}: {len(items)}")
+            lines.extend(f"    {item}" for item in items)
+
+        lines.append(f"==> Config edits: {len(self.config_edits)}")
+        for path, diff in self.config_edits.items():
+            lines.append(f"    {path}")
+            lines.extend(f"      {line}" for line in diff)
+
+        if self.notes:
+            lines.append("==> Notes")
+            lines.extend(f"    {note}" for note in self.notes)
+
+        return "\n".join(lines)
+
+
+def unified_diff(path: str, before: str, after: str) -> List[str]:
+    """Unified diff between two versions of a config file, empty if unchanged"""
+    return [
+        line.rstrip("\n")
+        for line in difflib.unified_diff(
+            before.splitlines(keepends=True),
+            after.splitlines(keepends=True),
+            fromfile=path,
+            tofile=f"{path} (planned)",
+        )
+    ]
+
+
+def run_unprivileged(command: List[str], input: Optional[str] = None) -> str:
+    """Drop-in replacement for the editors' _run_sudo working on scratch copies"""
+    result = subprocess.run(
+        command,
+        input=input,
+        text=True,
+        capture_output=True,
+        check=True,
+    )
+    return result.stdout
+
+
+class ScratchCopy:
+    """Temporary copy of a config file that the real editors can be pointed at.
+
+    The editors run their usual logic against the copy, so the plan shows
+    exactly the edits an installation would make to the original.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._dir = tempfile.TemporaryDirectory(prefix="meowrch-plan-")
+        self.copy = Path(self._dir.name) / path.name
+        shutil.copyfile(path, self.copy)
+        self.original = self.copy.read_text()
+
+    def __enter__(self) -> "ScratchCopy":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._dir.cleanup()
+
+    def diff(self) -> List[str]:
+        return unified_diff(str(self.path), self.original, self.copy.read_text())
@@ -0,0 +1,65 @@
+import traceback
+from enum import Enum
+from typing import Callable, Dict, List
+
+from loguru import logger
+
+
+class PostAction(Enum):
+    """Expensive regeneration steps that only need to run once per installation"""
+    INITRAMFS = "initramfs"
+    GRUB_CONFIG = "grub_config"
+
+
+class PostActionQueue:
+    """Deferred queue of boot artifact regenerations shared between configurers.
+
+    Components that change something affecting the initramfs or grub.cfg mark
+    the artifact as dirty instead of regenerating it themselves. Builder flushes
+    the queue once at the end, so each action runs at most once per run no
+    matter how many components requested it.
+    """
+
+    # The initramfs image has to exist before grub-mkconfig scans /boot
+    ORDER = [PostAction.INITRAMFS, PostAction.GRUB_CONFIG]
+
+    def __init__(self):
+        self._pending: Dict[PostAction, Callable[[], None]] = {}
+        self._requests: Dict[PostAction, int] = {}
+
+    def schedule(self, action: PostAction, callback: Callable[[], None]) -> None:
+        """Mark an artifact as dirty. The first registered callback is kept."""
+        self._requests[action] = self._requests.get(action, 0) + 1
+        if action in self._pending:
+            logger.debug(f"{action.value} regeneration already scheduled, coalescing request")
+            return
+        self._pending[action] = callback
+        logger.info(f"Scheduled {action.value} regeneration for the end of the installation")
+
+    def is_scheduled(self, action: PostAction) -> bool:
+        return action in self._pending
+
+    def requests(self) -> Dict[PostAction, int]:
+        """How many times each pending action has been requested so far"""
+        return dict(self._requests)
+
+    def flush(self) -> List[PostAction]:
+        """Run every scheduled action once, in dependency order
+
+        Returns:
+            List[PostAction]: Actions whose callback raised
+        """
+        failed = []
+        for action in self.ORDER:
+            callback = self._pending.pop(action, None)
+            if callback is None:
+                continue
+
+            requests = self._requests.pop(action, 1)
+            logger.info(f"Running {action.value} regeneration (requested {requests} time(s))")
+            try:
+                callback()
+            except Exception:
+                logger.error(f"{action.value} regeneration failed: {traceback.format_exc()}")
+                failed.append(action)
+        return failed
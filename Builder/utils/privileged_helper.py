@@ -0,0 +1,282 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+try:
+    from loguru import logger
+except ImportError:
+    # Сторона root запускается через sudo python -I и видит только стандартную библиотеку
+    import logging
+
+    logger = logging.getLogger(__name__)
+
+# Внешние программы, которые помощник может запускать от root
+ALLOWED_TOOLS = {
+    "mkinitcpio",
+    "dracut",
+    "grub-mkconfig",
+    "update-grub",
+    "plymouth-set-default-theme",
+    "systemctl",
+    "setfacl",
+    "chwd",
+    "repo-add",
+}
+
+
+##==> Сторона root: обработка операций
+##############################################
+def _atomic_write(path: str, data: bytes, mode: Optional[int] = None, like: Optional[str] = None) -> None:
+    """Write through a temporary file in the same directory and rename it over path
+
+    An existing file keeps its mode and owner unless a mode is given, like
+    ``cp`` into an existing file does. ``like`` copies mode, owner and
+    timestamps from another file instead (``cp --preserve=all``).
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    reference = like or (path if os.path.exists(path) else None)
+    fd, tmp = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        if reference is not None:
+            stat = os.stat(reference)
+            os.chown(tmp, stat.st_uid, stat.st_gid)
+            os.chmod(tmp, stat.st_mode & 0o7777)
+            if like is not None:
+                os.utime(tmp, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        else:
+            os.chmod(tmp, 0o644)
+        if mode is not None:
+            os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def handle(request: Dict[str, Any]) -> Dict[str, Any]:
+    """Execute one operation; errors are returned, never raised"""
+    op = request.get("op")
+    try:
+        if op == "read":
+            with open(request["path"], "rb") as file:
+                return {"ok": True, "data": file.read().decode("utf-8", "surrogateescape")}
+        if op == "write":
+            data = request["data"].encode("utf-8", "surrogateescape")
+            _atomic_write(request["path"], data, request.get("mode"))
+            return {"ok": True}
+        if op == "copy":
+            with open(request["src"], "rb") as file:
+                data = file.read()
+            dst = request["dst"]
+            if os.path.isdir(dst):
+                dst = os.path.join(dst, os.path.basename(request["src"]))
+            _atomic_write(dst, data, like=request["src"] if request.get("preserve") else None)
+            return {"ok": True}
+        if op == "rename":
+            os.replace(request["src"], request["dst"])
+            return {"ok": True}
+        if op == "mkdir":
+            os.makedirs(request["path"], exist_ok=True)
+            if request.get("mode") is not None:
+                os.chmod(request["path"], request["mode"])
+            return {"ok": True}
+        if op == "chmod":
+            os.chmod(request["path"], request["mode"])
+            return {"ok": True}
+        if op == "remove":
+            path = request["path"]
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path)
+            elif os.path.lexists(path):
+                os.unlink(path)
+            return {"ok": True}
+        if op == "run":
+            argv = request["argv"]
+            if not argv or argv[0] not in ALLOWED_TOOLS:
+                return {"ok": False, "error": f"{argv[:1]} is not an allowed tool", "returncode": 126}
+            result = subprocess.run(
+                argv,
+                input=request.get("input"),
+                cwd=request.get("cwd"),
+                capture_output=True,
+                text=True,
+            )
+            return {
+                "ok": result.returncode == 0,
+                "returncode": result.returncode,
+                "stdout": result.stdout,
+                "stderr": result.stderr,
+                "error": result.stderr,
+            }
+        return {"ok": False, "error": f"unknown operation {op!r}"}
+    except Exception as e:
+        return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+
+
+def serve(stdin=sys.stdin, stdout=sys.stdout) -> None:
+    """Read requests line by line: one operation or {"batch": [...]}"""
+    for line in stdin:
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            response: Any = {"ok": False, "error": f"invalid request: {e}"}
+        else:
+            if "batch" in request:
+                response = {"batch": [handle(item) for item in request["batch"]]}
+            else:
+                response = handle(request)
+        stdout.write(json.dumps(response) + "\n")
+        stdout.flush()
+
+
+##==> Сторона пользователя: клиент
+##############################################
+class PrivilegedHelper:
+    """One root process per Builder run that performs privileged file operations.
+
+    Instead of spawning ``sudo`` for every cat, cp, tee, mkdir and chmod, the
+    helper is started once with sudo and receives JSON requests over a pipe.
+    The root side runs under ``python -I`` and only uses the standard library.
+    The command set is small and auditable: read, atomic write, copy, rename,
+    mkdir, chmod, remove, and running one of ALLOWED_TOOLS. run_sudo() translates
+    the familiar sudo command lines into these operations and falls back to
+    a plain ``sudo`` call for everything else or when no helper is running.
+    """
+
+    _process: Optional[subprocess.Popen] = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def start() -> bool:
+        if PrivilegedHelper._process is not None:
+            return True
+        try:
+            PrivilegedHelper._process = subprocess.Popen(
+                ["sudo", sys.executable, "-I", os.path.abspath(__file__), "--serve"],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                text=True,
+                bufsize=1,
+            )
+            # Ждём первый ответ: sudo мог запросить пароль
+            if not PrivilegedHelper.call({"op": "mkdir", "path": "/"})["ok"]:
+                raise OSError("the helper does not answer")
+            logger.info("Privileged helper started")
+            return True
+        except (OSError, ValueError) as e:
+            logger.warning(f"Privileged helper is not available, sudo will be used per command: {e}")
+            PrivilegedHelper.stop()
+            return False
+
+    @staticmethod
+    def stop() -> None:
+        process = PrivilegedHelper._process
+        PrivilegedHelper._process = None
+        if process is None:
+            return
+        try:
+            process.stdin.close()
+            process.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            process.kill()
+
+    @staticmethod
+    def running() -> bool:
+        return PrivilegedHelper._process is not None and PrivilegedHelper._process.poll() is None
+
+    @staticmethod
+    def call(request: Dict[str, Any]) -> Dict[str, Any]:
+        return PrivilegedHelper._exchange(request)
+
+    @staticmethod
+    def batch(requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Run several operations in one round trip"""
+        return PrivilegedHelper._exchange({"batch": requests})["batch"]
+
+    @staticmethod
+    def _exchange(request: Dict[str, Any]) -> Dict[str, Any]:
+        process = PrivilegedHelper._process
+        if process is None:
+            raise OSError("privileged helper is not running")
+        with PrivilegedHelper._lock:
+            process.stdin.write(json.dumps(request) + "\n")
+            process.stdin.flush()
+            line = process.stdout.readline()
+        if not line:
+            raise OSError("privileged helper exited")
+        return json.loads(line)
+
+    @staticmethod
+    def translate(command: List[str], input: Optional[str] = None, **kwargs) -> Optional[Dict[str, Any]]:
+        """Helper operation for a sudo command line, None if it has no equivalent"""
+        cwd = kwargs.pop("cwd", None)
+        capture = kwargs.pop("capture_output", False) or kwargs.get("stdout") == subprocess.PIPE
+        kwargs.pop("stdout", None)
+        if set(kwargs) - {"check", "text"}:
+            return None
+
+        name, args = command[0], command[1:]
+        if name == "cat" and len(args) == 1:
+            return {"op": "read", "path": args[0]}
+        if name == "tee" and len(args) == 1 and input is not None:
+            return {"op": "write", "path": args[0], "data": input}
+        if name == "cp" and len(args) == 2:
+            return {"op": "copy", "src": args[0], "dst": args[1]}
+        if name == "cp" and len(args) == 3 and args[0] == "--preserve=all":
+            return {"op": "copy", "src": args[1], "dst": args[2], "preserve": True}
+        if name == "mv" and len(args) == 2:
+            return {"op": "rename", "src": args[0], "dst": args[1]}
+        if name == "mkdir" and len(args) == 2 and args[0] == "-p":
+            return {"op": "mkdir", "path": args[1]}
+        if name == "chmod" and len(args) == 2 and args[0].isdigit():
+            return {"op": "chmod", "path": args[1], "mode": int(args[0], 8)}
+        if name == "rm" and len(args) == 2 and args[0] in ("-f", "-rf"):
+            return {"op": "remove", "path": args[1]}
+        # Без захвата вывода команда должна писать в терминал, её запускает sudo
+        if name in ALLOWED_TOOLS and capture:
+            return {"op": "run", "argv": command, "input": input, "cwd": cwd}
+        return None
+
+
+def run_sudo(command: List[str], **kwargs) -> subprocess.CompletedProcess:
+    """Run a command as root through the helper, or with sudo when it cannot
+
+    Accepts the same arguments as subprocess.run and returns a
+    CompletedProcess; with check=True a failed operation raises
+    CalledProcessError like the sudo call would.
+    """
+    from .command_runner import CommandRunner
+
+    request = PrivilegedHelper.translate(command, **kwargs) if PrivilegedHelper.running() else None
+    if request is None:
+        return CommandRunner.run(["sudo"] + command, **kwargs)
+
+    started = time.monotonic()
+    response = PrivilegedHelper.call(request)
+    returncode = response.get("returncode", 0 if response["ok"] else 1)
+    stdout = response.get("data", response.get("stdout", ""))
+    stderr = response.get("stderr", "") or ("" if response["ok"] else response.get("error", ""))
+    CommandRunner._record(["helper", *command], time.monotonic() - started, returncode, len(stdout))
+
+    if not kwargs.get("text") and not kwargs.get("universal_newlines"):
+        stdout, stderr = stdout.encode(), stderr.encode()
+    if returncode != 0 and kwargs.get("check"):
+        raise subprocess.CalledProcessError(returncode, ["sudo"] + command, stdout, stderr)
+    return subprocess.CompletedProcess(["sudo"] + command, returncode, stdout, stderr)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["--serve"] or os.geteuid() != 0:
+        print(f"usage: sudo {sys.argv[0]} --serve", file=sys.stderr)
+        sys.exit(2)
+    serve()
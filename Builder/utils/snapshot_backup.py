@@ -0,0 +1,256 @@
+import datetime
+import json
+import os
+import shutil
+import subprocess
+import tarfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from loguru import logger
+
+from .copy_engine import CopyEngine
+from .dotfile_sync import DotfileSync
+from .path_rules import PathRules
+
+
+class SnapshotBackup:
+    """Deduplicated, hard-linked snapshots of the user's configuration.
+
+    File contents are stored once in ``<root>/objects/`` under their SHA-256.
+    Every backup creates ``<root>/snapshots/<timestamp>/`` in which each
+    file is a hard link to its object, plus a manifest with the mode and
+    mtime of every file (hard links share them, so they are applied on
+    restore). Files whose size and mtime match the previous snapshot are not
+    read again. Only the newest ``keep`` snapshots are kept, objects no
+    snapshot links to any more are deleted.
+    """
+
+    MANIFEST_NAME = ".meowrch-snapshot.json"
+
+    def __init__(self, root: Path = Path("./backup"), keep: int = 5, max_workers: int = 8):
+        self.root = root
+        self.objects = root / "objects"
+        self.snapshots = root / "snapshots"
+        self.keep = keep
+        self.max_workers = max_workers
+
+    ##==> Создание снапшота
+    ##############################################
+    def create(self, home: Path, items: List[str], rules: Optional[PathRules] = None) -> Optional[Path]:
+        """Snapshot the given paths relative to home
+
+        Args:
+            rules: Paths relative to home that are left out, e.g. caches
+
+        Returns:
+            Optional[Path]: The snapshot directory, None if nothing was backed up
+        """
+        previous = self._read_manifest(self.latest())
+        name = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        snapshot, counter = self.snapshots / name, 0
+        while snapshot.exists():
+            counter += 1
+            snapshot = self.snapshots / f"{name}-{counter}"
+
+        files: List[Tuple[str, Path]] = []
+        links: Dict[str, str] = {}
+        rules = rules or PathRules()
+        for item in items:
+            for relative, path in self._walk(home, item, rules):
+                if path.is_symlink():
+                    links[relative] = os.readlink(path)
+                else:
+                    files.append((relative, path))
+
+        if not files and not links:
+            logger.warning("Nothing to back up")
+            return None
+
+        self.objects.mkdir(parents=True, exist_ok=True)
+        snapshot.mkdir(parents=True)
+        for relative, target in links.items():
+            (snapshot / relative).parent.mkdir(parents=True, exist_ok=True)
+            os.symlink(target, snapshot / relative)
+
+        def store(entry: Tuple[str, Path]) -> Tuple[str, Optional[dict]]:
+            relative, path = entry
+            try:
+                return relative, self._store(path, snapshot / relative, previous["files"].get(relative))
+            except OSError as e:
+                logger.warning(f'Unable to back up "{path}": {e}')
+                return relative, None
+
+        manifest: dict = {
+            "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "home": str(home),
+            "items": items,
+            "files": {},
+            "links": links,
+        }
+        reused = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for relative, record in executor.map(store, files):
+                if record is None:
+                    continue
+                reused += record.pop("reused")
+                manifest["files"][relative] = record
+
+        (snapshot / self.MANIFEST_NAME).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+        logger.success(
+            f"Snapshot {snapshot.name} created: {len(manifest['files'])} file(s), "
+            f"{reused} unchanged since the previous snapshot"
+        )
+        self.prune()
+        return snapshot
+
+    def _store(self, path: Path, target: Path, previous: Optional[dict]) -> dict:
+        stat = path.stat()
+        reused = (
+            previous is not None
+            and previous["size"] == stat.st_size
+            and previous["mtime"] == stat.st_mtime_ns
+            and self._object_path(previous["hash"]).exists()
+        )
+        digest = previous["hash"] if reused else DotfileSync.hash_file(path)
+
+        obj = self._object_path(digest)
+        if not obj.exists():
+            obj.parent.mkdir(parents=True, exist_ok=True)
+            # Объект появляется атомарно, параллельные потоки не видят его недописанным
+            tmp = obj.with_name(f"{obj.name}.{os.getpid()}.{id(target)}.tmp")
+            CopyEngine().copy_file(path, tmp)
+            os.replace(tmp, obj)
+
+        target.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(obj, target)
+        except OSError:
+            # Файловая система без жёстких ссылок
+            shutil.copyfile(obj, target)
+
+        return {
+            "hash": digest,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "mode": stat.st_mode & 0o7777,
+            "reused": reused,
+        }
+
+    ##==> Хранение
+    ##############################################
+    def list_snapshots(self) -> List[Path]:
+        """Snapshots from the oldest to the newest"""
+        if not self.snapshots.is_dir():
+            return []
+        return sorted(p for p in self.snapshots.iterdir() if (p / self.MANIFEST_NAME).exists())
+
+    def latest(self) -> Optional[Path]:
+        snapshots = self.list_snapshots()
+        return snapshots[-1] if snapshots else None
+
+    def find(self, name: str) -> Optional[Path]:
+        if name == "latest":
+            return self.latest()
+        snapshot = self.snapshots / name
+        return snapshot if (snapshot / self.MANIFEST_NAME).exists() else None
+
+    def prune(self) -> None:
+        """Keep the newest snapshots and drop objects nothing links to"""
+        for snapshot in self.list_snapshots()[: -self.keep] if self.keep > 0 else []:
+            shutil.rmtree(snapshot, ignore_errors=True)
+            logger.info(f"Removed old backup snapshot {snapshot.name}")
+
+        if not self.objects.is_dir():
+            return
+        removed = 0
+        for obj in self.objects.glob("*/*"):
+            # Единственная ссылка - сам объект, ни один снапшот его не использует
+            if obj.name.endswith(".tmp") or obj.stat().st_nlink == 1:
+                obj.unlink()
+                removed += 1
+        if removed:
+            logger.info(f"Removed {removed} unreferenced backup object(s)")
+
+    ##==> Восстановление и экспорт
+    ##############################################
+    def restore(self, snapshot: Path, home: Optional[Path] = None) -> int:
+        """Copy the files of a snapshot back with their modes and mtimes
+
+        Files that are not in the snapshot are left untouched.
+
+        Returns:
+            int: Number of restored files and links
+        """
+        manifest = self._read_manifest(snapshot)
+        home = home or Path(manifest.get("home", Path.home()))
+        engine = CopyEngine()
+
+        for relative, record in manifest["files"].items():
+            dst = home / relative
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            engine.copy_file(snapshot / relative, dst)
+            os.chmod(dst, record["mode"])
+            os.utime(dst, ns=(record["mtime"], record["mtime"]))
+
+        for relative, target in manifest["links"].items():
+            dst = home / relative
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            if dst.is_symlink() or dst.exists():
+                dst.unlink()
+            os.symlink(target, dst)
+
+        restored = len(manifest["files"]) + len(manifest["links"])
+        logger.success(f"Restored {restored} file(s) from snapshot {snapshot.name} to {home}")
+        return restored
+
+    def export(self, snapshot: Path, output: Path) -> None:
+        """Stream a snapshot into a tar.zst archive without a temporary tar"""
+        manifest = self._read_manifest(snapshot)
+        with open(output, "wb") as archive:
+            zstd = subprocess.Popen(["zstd", "-q", "-T0", "-c"], stdin=subprocess.PIPE, stdout=archive)
+            try:
+                with tarfile.open(fileobj=zstd.stdin, mode="w|") as tar:
+                    for relative, record in manifest["files"].items():
+                        info = tar.gettarinfo(str(snapshot / relative), arcname=relative)
+                        info.mode = record["mode"]
+                        info.mtime = record["mtime"] / 1e9
+                        with open(snapshot / relative, "rb") as file:
+                            tar.addfile(info, file)
+                    for relative, target in manifest["links"].items():
+                        info = tarfile.TarInfo(relative)
+                        info.type = tarfile.SYMTYPE
+                        info.linkname = target
+                        tar.addfile(info)
+            finally:
+                zstd.stdin.close()
+                if zstd.wait() != 0:
+                    raise subprocess.CalledProcessError(zstd.returncode, "zstd")
+        logger.success(f"Snapshot {snapshot.name} exported to {output}")
+
+    ##==> Вспомогательные методы
+    ##############################################
+    def _read_manifest(self, snapshot: Optional[Path]) -> dict:
+        if snapshot is None:
+            return {"files": {}, "links": {}}
+        try:
+            return json.loads((snapshot / self.MANIFEST_NAME).read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Backup snapshot manifest {snapshot} is unreadable: {e}")
+            return {"files": {}, "links": {}}
+
+    @staticmethod
+    def _walk(home: Path, item: str, rules: PathRules) -> Iterator[Tuple[str, Path]]:
+        path = home / item
+        if path.is_symlink() or path.is_file():
+            if not rules.is_excluded(item):
+                yield item, path
+            return
+        if not path.is_dir() or rules.is_excluded(item, is_dir=True):
+            return
+        for entry, relative in rules.walk(path, prefix=item):
+            yield relative, Path(entry.path)
+
+    def _object_path(self, digest: str) -> Path:
+        return self.objects / digest[:2] / digest
@@ -0,0 +1,91 @@
+import datetime
+import hashlib
+import json
+import subprocess
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from loguru import logger
+
+from .privileged_helper import run_sudo
+
+
+class StepJournal:
+    """Persistent record of the installation steps that already completed.
+
+    Every completed step is stored together with a hash of its inputs (build
+    options, package lists, source revision). If a run is interrupted, the
+    next run skips the steps whose inputs did not change and resumes at the
+    first incomplete one. The journal lives next to the installation marker in
+    the root-owned ``/usr/local/share/meowrch/users/<user>/`` and is removed
+    once the installation completes successfully.
+    """
+
+    FILE_NAME = "journal.json"
+
+    def __init__(self, base_dir: Path):
+        self.path = base_dir / self.FILE_NAME
+        self._steps: Dict[str, Dict[str, str]] = {}
+
+    @staticmethod
+    def hash_inputs(*inputs: Any) -> str:
+        payload = json.dumps(inputs, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def hash_files(*paths: Path) -> str:
+        """Hash of the file contents, for inputs that live in the working tree"""
+        digest = hashlib.sha256()
+        for path in paths:
+            digest.update(path.name.encode("utf-8") + b"\0")
+            try:
+                digest.update(path.read_bytes())
+            except OSError:
+                digest.update(b"\0missing")
+        return digest.hexdigest()
+
+    def load(self) -> "StepJournal":
+        try:
+            self._steps = json.loads(self.path.read_text(encoding="utf-8")).get("steps", {})
+        except FileNotFoundError:
+            self._steps = {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Step journal {self.path} is unreadable, starting from scratch: {e}")
+            self._steps = {}
+
+        if self._steps:
+            logger.info(f"Found journal of an interrupted installation: {', '.join(self._steps)}")
+        return self
+
+    def is_done(self, step: str, inputs_hash: str) -> bool:
+        entry = self._steps.get(step)
+        return entry is not None and entry.get("inputs") == inputs_hash
+
+    def mark_done(self, step: str, inputs_hash: str) -> None:
+        self._steps[step] = {
+            "inputs": inputs_hash,
+            "completed_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        }
+        self._write()
+
+    def forget(self, step: Optional[str] = None) -> None:
+        """Drop one step, or the whole journal when no step is given"""
+        if step is None:
+            self._steps = {}
+            run_sudo(["rm", "-f", str(self.path)], check=False)
+            return
+        if self._steps.pop(step, None) is not None:
+            self._write()
+
+    def _write(self) -> None:
+        content = json.dumps({"steps": self._steps}, indent=2)
+        try:
+            run_sudo(
+                ["tee", str(self.path)],
+                input=content,
+                stdout=subprocess.DEVNULL,
+                text=True,
+                check=True,
+            )
+        except subprocess.CalledProcessError as e:
+            logger.warning(f"Failed to write step journal {self.path}: {e}")
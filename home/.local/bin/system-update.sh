@@ -96,6 +96,17 @@ get_aurhlpr() {
     fi
 }
 
+# Persistent build directory of the AUR helper, so unchanged packages are not rebuilt.
+# Each helper gets its own tree: the installer's workspace in ~/.cache/meowrch/aur
+# uses shallow clones, reset --hard and eviction that yay and paru do not expect
+get_aur_cache_flags() {
+    local cache_dir="$HOME/.cache/meowrch/aur-helper/$1"
+    case "$1" in
+        yay) mkdir -p "$cache_dir" && echo "--builddir $cache_dir" ;;
+        paru) mkdir -p "$cache_dir" && echo "--clonedir $cache_dir" ;;
+    esac
+}
+
 # Check official updates
 check_official_updates() {
     local count=0
@@ -187,7 +198,10 @@ trigger_upgrade() {
     
     local terminal=${1:-$DEFAULT_TERMINAL}
     
-    local command='sudo '"$aurhlpr"' -Syu && flatpak update -y; read -n 1 -p "Press any key to continue..."'
+    local aur_flags
+    aur_flags=$(get_aur_cache_flags "$aurhlpr")
+
+    local command='sudo '"$aurhlpr"' -Syu '"$aur_flags"' && flatpak update -y; read -n 1 -p "Press any key to continue..."'
     
     case $terminal in
         alacritty)
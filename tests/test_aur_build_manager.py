@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import Builder.managers.aur_build_manager as aur_build_mod
+from Builder.managers.aur_build_manager import AurBuildManager, AurBuildUnit
+
+
+class _FakeRpc:
+    def __init__(self, packages: dict):
+        self.packages = packages
+
+    def info(self, names):
+        return {n: self.packages[n] for n in names if n in self.packages}
+
+
+class _FakeDb:
+    def __init__(self, names=()):
+        self.names = set(names)
+
+    def has_package(self, name):
+        return name in self.names
+
+    def is_satisfied(self, name):
+        return name in self.names
+
+    def is_installed(self, name):
+        return name in self.names
+
+
+def _manager(aur: dict, repo=(), installed=()):
+    return AurBuildManager(
+        max_workers=2,
+        rpc=_FakeRpc(aur),
+        sync_db=_FakeDb(repo),
+        local_index=_FakeDb(installed),
+    )
+
+
+def test_resolve_builds_dependency_graph():
+    aur = {
+        "mewline": {"Name": "mewline", "PackageBase": "mewline", "Depends": ["python-fabric>=0.1", "gtk3"]},
+        "python-fabric": {"Name": "python-fabric", "PackageBase": "python-fabric-git", "Provides": ["python-fabric"],
+                          "MakeDepends": ["python-build"]},
+        "cava": {"Name": "cava", "PackageBase": "cava", "Depends": ["fftw"]},
+        "broken": {"Name": "broken", "PackageBase": "broken", "Depends": ["does-not-exist"]},
+    }
+    manager = _manager(aur, repo={"gtk3", "python-build", "fftw"}, installed={"fftw"})
+
+    units, repo_deps, failed = manager.resolve(["mewline", "cava", "broken"])
+
+    assert set(units) == {"mewline", "python-fabric-git", "cava", "broken"}
+    assert units["mewline"].depends_on == {"python-fabric-git"}
+    assert units["mewline"].explicit and not units["python-fabric-git"].explicit
+    assert repo_deps == ["gtk3", "python-build"], "Installed deps must not be reinstalled"
+    assert failed == {"broken", "does-not-exist"}
+
+
+def test_layers_follow_dependencies_and_report_cycles():
+    units = {
+        "a": AurBuildUnit("a", ["a"], {"b"}),
+        "b": AurBuildUnit("b", ["b"], set()),
+        "c": AurBuildUnit("c", ["c"], set()),
+        "x": AurBuildUnit("x", ["x"], {"y"}),
+        "y": AurBuildUnit("y", ["y"], {"x"}),
+    }
+    failed = set()
+    layers = AurBuildManager._layers(units, failed)
+
+    assert layers == [["b", "c"], ["a"]]
+    assert failed == {"x", "y"}
+
+
+def test_artifact_name_parsing():
+    name = AurBuildManager._artifact_name(Path("/tmp/ttf-meslo-nerd-font-powerlevel10k-2.3.3-1-any.pkg.tar.zst"))
+    assert name == "ttf-meslo-nerd-font-powerlevel10k"
+    assert AurBuildManager._artifact_name(Path("yay-bin-1:12.3.5-1-x86_64.pkg.tar.zst")) == "yay-bin"
+
+
+def test_artifacts_install_in_one_transaction():
+    units = [
+        AurBuildUnit("cava", ["cava"], explicit=True, artifacts=[Path("/w/cava-0.10-1-x86_64.pkg.tar.zst")]),
+        AurBuildUnit("libfoo", ["libfoo"], artifacts=[Path("/w/libfoo-1.0-1-x86_64.pkg.tar.zst")]),
+    ]
+    calls = []
+    original = aur_build_mod.CommandRunner.run
+    aur_build_mod.CommandRunner.run = staticmethod(lambda cmd, **kwargs: calls.append(cmd))
+    try:
+        assert _manager({})._install_artifacts(units) == []
+    finally:
+        aur_build_mod.CommandRunner.run = staticmethod(original)
+
+    assert calls == [
+        ["sudo", "pacman", "-U", "--noconfirm", "--needed",
+         "/w/cava-0.10-1-x86_64.pkg.tar.zst", "/w/libfoo-1.0-1-x86_64.pkg.tar.zst"],
+        ["sudo", "pacman", "-D", "--asdeps", "libfoo"],
+    ]
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from Builder.managers.package_manager import PackageManager
+from Builder.utils.schemes import AurHelper
+
+
+def _bootstrap(aur_helper, use_chaotic_aur, available):
+    """Run install_aur_helper with every source replaced by a recorder"""
+    calls = []
+    patched = {
+        "check_package_installed": lambda package: False,
+        "_install_helper_from_cache": lambda candidates: calls.append(("cache", candidates)) or "cache" in available,
+        "_install_helper_from_repo": lambda package: calls.append(("repo", package)) or "repo" in available,
+        "_build_aur_helper": lambda pkgbase: calls.append(("build", pkgbase)) or pkgbase in available,
+    }
+    originals = {name: PackageManager.__dict__[name] for name in patched}
+    for name, func in patched.items():
+        setattr(PackageManager, name, staticmethod(func))
+    try:
+        PackageManager.install_aur_helper(aur_helper, use_chaotic_aur=use_chaotic_aur)
+    finally:
+        for name, func in originals.items():
+            setattr(PackageManager, name, func)
+    return calls
+
+
+def test_cached_package_wins():
+    calls = _bootstrap(AurHelper.PARU, True, {"cache"})
+    assert calls == [("cache", ["paru", "paru-bin"])]
+
+
+def test_sources_are_tried_from_fastest_to_slowest():
+    calls = _bootstrap(AurHelper.YAY, True, {"yay"})
+    assert calls == [
+        ("cache", ["yay", "yay-bin"]),
+        ("repo", "yay"),
+        ("build", "yay-bin"),
+        ("build", "yay"),
+    ]
+
+
+def test_bin_helper_never_builds_from_source():
+    calls = _bootstrap(AurHelper.YAY_BIN, False, {"yay-bin"})
+    assert calls == [("cache", ["yay-bin"]), ("build", "yay-bin")]
+
+
+def test_package_name_from_file():
+    assert PackageManager._package_name_from_file(Path("paru-bin-2.0.4-1-x86_64.pkg.tar.zst")) == "paru-bin"
+    assert PackageManager._package_name_from_file(Path("yay-12.3.5-1-x86_64.pkg.tar.zst")) == "yay"
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from Builder.utils.aur_workspace import AurWorkspace
+
+
+def _age(path: Path, days: float) -> None:
+    stamp = time.time() - days * 24 * 3600
+    os.utime(path, (stamp, stamp))
+
+
+def test_artifacts_are_reused_only_for_the_same_commit():
+    with tempfile.TemporaryDirectory() as tmp:
+        workspace = AurWorkspace(root=Path(tmp) / "aur")
+        built = Path(tmp) / "yay-12.3.5-1-x86_64.pkg.tar.zst"
+        built.write_bytes(b"package")
+
+        stored = workspace.store("yay", "abc123", [built])
+        assert stored[0].read_bytes() == b"package"
+        assert workspace.cached_artifacts("yay", "abc123") == stored
+        assert workspace.cached_artifacts("yay", "def456") == [], "A new PKGBUILD commit must be rebuilt"
+
+
+def test_evict_drops_old_entries_and_keeps_size_bounded():
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "aur"
+        workspace = AurWorkspace(root=root, max_age_days=30, max_size=3000)
+
+        for pkgbase, days in [("stale", 45), ("older", 10), ("newer", 1)]:
+            artifact = Path(tmp) / f"{pkgbase}-1-1-any.pkg.tar.zst"
+            artifact.write_bytes(b"x" * 2000)
+            workspace.store(pkgbase, "c0ffee", [artifact])
+            _age(root / ".artifacts" / pkgbase / "c0ffee", days)
+
+        clone = root / "stale"
+        clone.mkdir()
+        (clone / "PKGBUILD").write_text("pkgname=stale\n")
+        _age(clone, 45)
+
+        workspace.evict()
+
+        assert not clone.exists()
+        assert not (root / ".artifacts" / "stale").exists(), "Empty pkgbase directories are removed"
+        assert not (root / ".artifacts" / "older").exists(), "Oldest entries go first above max_size"
+        assert workspace.cached_artifacts("newer", "c0ffee")
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from Builder.managers.bundle_manager import BundleManager
+from Builder.utils.pacman_conf import PacmanConf
+from Builder.utils.pacman_db import LocalPackageIndex
+
+
+def _write_local_package(db: Path, name: str, version: str, depends=(), provides=()) -> None:
+    pkg_dir = db / f"{name}-{version}"
+    pkg_dir.mkdir()
+    content = f"%NAME%\n{name}\n\n%VERSION%\n{version}\n\n%ARCH%\nx86_64\n\n"
+    if depends:
+        content += "%DEPENDS%\n" + "\n".join(depends) + "\n\n"
+    if provides:
+        content += "%PROVIDES%\n" + "\n".join(provides) + "\n\n"
+    (pkg_dir / "desc").write_text(content)
+
+
+def test_closure_follows_dependencies_and_providers():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Path(tmp)
+        _write_local_package(db, "mewline", "1.0-1", depends=["python-fabric>=0.1", "gtk3"])
+        _write_local_package(db, "python-fabric-git", "0.2-1", provides=["python-fabric=0.2"], depends=["gtk3"])
+        _write_local_package(db, "gtk3", "3.24-1")
+
+        bundle = BundleManager(Path(tmp) / "bundle", local_index=LocalPackageIndex(db))
+        records, not_installed = bundle.resolve_closure(["mewline", "steam"])
+
+        assert [r.name for r in records] == ["mewline", "python-fabric-git", "gtk3"]
+        assert not_installed == ["steam"]
+
+
+def test_package_files_are_matched_by_name_version_and_arch():
+    with tempfile.TemporaryDirectory() as tmp:
+        pacman_cache = Path(tmp) / "pkg"
+        aur_cache = Path(tmp) / "yay" / "mewline"
+        pacman_cache.mkdir()
+        aur_cache.mkdir(parents=True)
+        (pacman_cache / "gtk3-3.24-1-x86_64.pkg.tar.zst").touch()
+        (pacman_cache / "gtk3-3.24-1-x86_64.pkg.tar.zst.sig").touch()
+        (aur_cache / "mewline-1.0-1-x86_64.pkg.tar.zst").touch()
+
+        files = BundleManager._find_package_files([pacman_cache, Path(tmp) / "yay", Path(tmp) / "missing"])
+
+        assert set(files) == {"gtk3-3.24-1-x86_64.pkg.tar", "mewline-1.0-1-x86_64.pkg.tar"}
+        assert files["mewline-1.0-1-x86_64.pkg.tar"].parent == aur_cache
+
+
+def test_only_unsigned_aur_packages_are_trusted():
+    with tempfile.TemporaryDirectory() as tmp:
+        bundle = BundleManager(Path(tmp) / "bundle")
+        conf = PacmanConf("[options]\nColor\n\n[core]\nInclude = /etc/pacman.d/mirrorlist\n")
+
+        bundle.configure_pacman_conf(conf)
+        assert [s.name for s in conf.sections] == ["options", "meowrch-bundle", "core"]
+        assert "SigLevel = PackageRequired DatabaseOptional" in conf.render()
+        assert "TrustAll" not in conf.render()
+
+        bundle.path.mkdir()
+        bundle.local_repo_db_path.touch()
+        conf = PacmanConf("[options]\nColor\n\n[core]\nInclude = /etc/pacman.d/mirrorlist\n")
+        bundle.configure_pacman_conf(conf)
+        assert [s.name for s in conf.sections] == ["options", "meowrch-bundle", "meowrch-bundle-local", "core"]
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+import json
+import subprocess
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from Builder.utils.command_runner import CommandRunner
+
+
+def test_commands_are_recorded_per_phase_and_reported():
+    CommandRunner.records.clear()
+    CommandRunner.phases.clear()
+
+    with CommandRunner.phase("packages"):
+        result = CommandRunner.run(["echo", "meow"], capture_output=True, text=True, check=True)
+        try:
+            CommandRunner.run(["sh", "-c", "echo oops >&2; exit 3"], capture_output=True, check=True)
+        except subprocess.CalledProcessError as e:
+            assert e.returncode == 3
+        else:
+            raise AssertionError("CalledProcessError must propagate")
+    with CommandRunner.phase("drivers"):
+        CommandRunner.run(["sleep", "0.2"], check=True)
+
+    assert result.stdout == "meow\n"
+    echo, failed, sleep = CommandRunner.records
+    assert (echo.phase, echo.exit_code, echo.output_bytes) == ("packages", 0, 5)
+    assert (failed.exit_code, failed.output_bytes) == (3, 5)
+    assert sleep.phase == "drivers" and sleep.output_bytes == 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "timings.json"
+        CommandRunner.write_report(path, top_n=1)
+        report = json.loads(path.read_text())
+
+    assert report["phases"]["packages"]["commands"] == 2
+    assert report["phases"]["drivers"]["duration"] >= 0.2
+    assert [r["command"] for r in report["slowest"]] == [["sleep", "0.2"]]
+    assert len(report["commands"]) == 3
+
+
+def test_phase_is_tracked_per_thread():
+    CommandRunner.records.clear()
+
+    def background():
+        with CommandRunner.phase("prefetch_repo"):
+            CommandRunner.run(["true"], check=True)
+
+    with CommandRunner.phase("dotfiles"):
+        thread = threading.Thread(target=background)
+        thread.start()
+        thread.join()
+        CommandRunner.run(["true"], check=True)
+
+    assert [r.phase for r in CommandRunner.records] == ["prefetch_repo", "dotfiles"]
+    assert CommandRunner.current_phase() == "setup"
+
+    # Пул потоков наследует этап вызывающего потока через bind()
+    CommandRunner.records.clear()
+    with CommandRunner.phase("packages"):
+        worker = threading.Thread(target=CommandRunner.bind(lambda: CommandRunner.run(["true"])))
+        worker.start()
+        worker.join()
+    assert [r.phase for r in CommandRunner.records] == ["packages"]
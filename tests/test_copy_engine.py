@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from Builder.utils.copy_engine import CopyEngine, copy_tree_privileged
+from Builder.utils.path_rules import PathRules
+
+
+def _make_theme(root: Path) -> None:
+    (root / "icons").mkdir(parents=True)
+    (root / "theme.txt").write_text("title-text: \"\"\n")
+    (root / "icons" / "arch.png").write_bytes(os.urandom(300 * 1024))
+    (root / "cache").mkdir()
+    (root / "cache" / "junk").write_text("junk")
+    (root / "preview.png").symlink_to("icons/arch.png")
+    (root / "theme.txt").chmod(0o600)
+    os.utime(root / "theme.txt", ns=(1_000_000_000, 1_000_000_000))
+
+
+def _assert_copied(dst: Path, src: Path) -> None:
+    assert (dst / "icons" / "arch.png").read_bytes() == (src / "icons" / "arch.png").read_bytes()
+    assert (dst / "theme.txt").stat().st_mode & 0o777 == 0o600
+    assert (dst / "theme.txt").stat().st_mtime_ns == 1_000_000_000
+    assert os.readlink(dst / "preview.png") == "icons/arch.png"
+
+
+def test_copy_tree_preserves_metadata_and_skips_exclusions():
+    with tempfile.TemporaryDirectory() as tmp:
+        src, dst = Path(tmp) / "src", Path(tmp) / "dst"
+        _make_theme(src)
+        dst.mkdir()
+        (dst / "theme.txt").write_text("old")
+
+        stats = CopyEngine(max_workers=4).copy_tree(src, dst, rules=PathRules(["/cache/"]))
+
+        _assert_copied(dst, src)
+        assert not (dst / "cache").exists()
+        assert stats.files == 2 and stats.bytes == 300 * 1024 + len("title-text: \"\"\n")
+
+
+def test_userspace_fallback_copies_the_same_data():
+    with tempfile.TemporaryDirectory() as tmp:
+        src, dst = Path(tmp) / "src", Path(tmp) / "dst"
+        _make_theme(src)
+        engine = CopyEngine()
+        engine._reflink = False
+        engine._copy_file_range = False
+
+        stats = engine.copy_tree(src, dst)
+
+        _assert_copied(dst, src)
+        assert stats.reflinked == 0 and stats.files == 3
+
+
+def test_privileged_copy_runs_the_engine_as_a_script():
+    with tempfile.TemporaryDirectory() as tmp:
+        src, dst = Path(tmp) / "src", Path(tmp) / "dst"
+        _make_theme(src)
+        commands = []
+
+        def run(command, **kwargs):
+            commands.append(command)
+            assert command[0] == "sudo"
+            return subprocess.run(command[1:], **kwargs)
+
+        copy_tree_privileged(src, dst, run=run)
+
+        # Без site-packages: loguru и прочие пакеты пользователя недоступны
+        assert commands[0][1:3] == [sys.executable, "-S"]
+        assert commands[0][3].endswith("copy_engine.py")
+        _assert_copied(dst, src)
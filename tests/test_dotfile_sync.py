@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from Builder.utils.dotfile_sync import DotfileSync
+from Builder.utils.path_rules import PathRules
+
+
+def _tree(root: Path, files: dict) -> None:
+    for relative, content in files.items():
+        path = root / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+
+
+def test_sync_writes_only_changes_and_removes_deleted_files():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        src, dst, state = tmp / "repo" / ".config", tmp / "home" / ".config", tmp / "state"
+        _tree(src, {
+            "kitty/kitty.conf": "font_size 11\n",
+            "hypr/hyprland.conf": "monitor=,preferred,auto,1\n",
+            "fish/config.fish": "set -g fish_greeting\n",
+        })
+        entries = [(src, dst, PathRules(["/hypr/"]))]
+
+        report = DotfileSync(state).load().sync(entries)
+        assert len(report.added) == 2 and not report.changed and not report.removed
+        assert not (dst / "hypr").exists(), "Excluded directories are not deployed"
+
+        kitty = dst / "kitty" / "kitty.conf"
+        deployed_mtime = kitty.stat().st_mtime_ns
+        report = DotfileSync(state).load().sync(entries)
+        assert report.unchanged == 2 and not (report.added or report.changed or report.removed)
+        assert kitty.stat().st_mtime_ns == deployed_mtime, "A no-op update rewrites nothing"
+
+        # Источник "потрогали" без изменения содержимого
+        os.utime(src / "kitty" / "kitty.conf", (0, 0))
+        assert DotfileSync(state).load().sync(entries).unchanged == 2
+
+        (src / "kitty" / "kitty.conf").write_text("font_size 12\n")
+        (src / "fish" / "config.fish").unlink()
+        report = DotfileSync(state).load().sync(entries)
+        assert report.changed == [str(kitty)]
+        assert report.removed == [str(dst / "fish" / "config.fish")]
+        assert kitty.read_text() == "font_size 12\n"
+        assert not (dst / "fish").exists(), "Emptied directories are removed"
+
+
+def test_locally_modified_files_are_kept_when_removed_from_the_repo():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        src, dst, state = tmp / "repo" / ".bashrc", tmp / "home" / ".bashrc", tmp / "state"
+        src.parent.mkdir()
+        src.write_text("alias ls='ls --color'\n")
+        DotfileSync(state).load().sync([(src, dst, PathRules())])
+
+        dst.write_text("alias ls='lsd'\n")
+        src.unlink()
+        report = DotfileSync(state).load().sync([(src, dst, PathRules())])
+        assert not report.removed
+        assert dst.read_text() == "alias ls='lsd'\n"
+
+
+def test_running_from_another_directory_removes_nothing():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        (tmp / "Builder").mkdir()
+        _tree(tmp / "home" / ".config", {"kitty/kitty.conf": "font_size 11\n"})
+        dst, state = tmp / "deployed" / ".config", tmp / "state"
+        # Относительный путь, как в FileSystemManager._dotfile_entries
+        entries = [(Path("./home/.config"), dst, PathRules())]
+
+        cwd = os.getcwd()
+        try:
+            os.chdir(tmp)
+            DotfileSync(state).load().sync(entries)
+            record = DotfileSync(state).load().files[str(dst / "kitty" / "kitty.conf")]
+            assert Path(record["source"]).is_absolute()
+
+            # cd Builder && python install.py: источники не найдены, удалять нельзя
+            os.chdir(tmp / "Builder")
+            report = DotfileSync(state).load().sync(entries)
+            assert not report.removed
+            assert (dst / "kitty" / "kitty.conf").exists()
+            assert str(dst / "kitty" / "kitty.conf") in DotfileSync(state).load().files
+        finally:
+            os.chdir(cwd)
+
+
+def test_modes_are_recorded_and_restored_per_file():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        src, dst, state = tmp / "repo", tmp / "home", tmp / "state"
+        _tree(src, {
+            ".config/kitty/kitty.conf": "font_size 11\n",
+            ".config/polybar/launch.sh": "#!/bin/bash\npolybar main\n",
+            ".local/bin/color-scripts/bars": "echo bars\n",
+        })
+        (src / ".config" / "kitty" / "kitty.conf").chmod(0o755)
+        entries = [(src / ".config", dst / ".config", PathRules()), (src / ".local", dst / ".local", PathRules())]
+
+        DotfileSync(state).load().sync(entries)
+        modes = {
+            path: (dst / path).stat().st_mode & 0o777
+            for path in [".config/kitty/kitty.conf", ".config/polybar/launch.sh", ".local/bin/color-scripts/bars"]
+        }
+        assert modes == {
+            ".config/kitty/kitty.conf": 0o755,
+            ".config/polybar/launch.sh": 0o755,
+            ".local/bin/color-scripts/bars": 0o755,
+        }
+
+        (src / ".config" / "kitty" / "kitty.conf").chmod(0o644)
+        (src / ".config" / "kitty" / "kitty.conf").write_text("font_size 12\n")
+        (dst / ".config" / "polybar" / "launch.sh").chmod(0o600)
+        DotfileSync(state).load().sync(entries)
+        assert (dst / ".config" / "kitty" / "kitty.conf").stat().st_mode & 0o777 == 0o644
+        assert (dst / ".config" / "polybar" / "launch.sh").stat().st_mode & 0o777 == 0o755
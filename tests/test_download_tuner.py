@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from Builder.utils.download_tuner import DownloadTuner
+
+MIB = 1024 * 1024
+
+
+def test_parallelism_follows_the_lookup_table():
+    assert DownloadTuner.choose(0.5 * MIB) == 3
+    assert DownloadTuner.choose(2 * MIB) == 5
+    assert DownloadTuner.choose(10 * MIB) == 8
+    assert DownloadTuner.choose(30 * MIB) == 12
+    assert DownloadTuner.choose(110 * MIB) == 16
+
+
+def test_throughput_is_measured_from_cache_growth():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = Path(tmp)
+        (cache / "old-1-1-any.pkg.tar.zst").write_bytes(b"x" * MIB)
+        tuner = DownloadTuner(cache)
+
+        def download():
+            (cache / "cava-1-1-x86_64.pkg.tar.zst").write_bytes(b"x" * 3 * MIB)
+            (cache / "btop-1-1-x86_64.pkg.tar.zst").write_bytes(b"x" * 2 * MIB)
+            time.sleep(0.1)
+
+        throughput = tuner.measure(download)
+        assert throughput is not None and throughput <= 5 * MIB / 0.1
+
+        assert tuner.measure(lambda: None) is None, "A warm cache gives no sample"
+
+
+def test_render_config_replaces_or_adds_parallel_downloads():
+    assert DownloadTuner.render_config("[options]\n#ParallelDownloads = 5\nColor\n", 12) == (
+        "[options]\nParallelDownloads = 12\nColor\n"
+    )
+    assert DownloadTuner.render_config("[options]\nColor\n", 3) == "[options]\nColor\nParallelDownloads = 3\n"
+
+    # Закомментированная строка вне [options] не трогается
+    content = "[options]\nColor\n\n[core]\n#ParallelDownloads = 5\nInclude = /etc/pacman.d/mirrorlist\n"
+    assert DownloadTuner.render_config(content, 8) == (
+        "[options]\nColor\nParallelDownloads = 8\n\n[core]\n#ParallelDownloads = 5\nInclude = /etc/pacman.d/mirrorlist\n"
+    )
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from Builder.managers.chaotic_aur_manager import ChaoticAurManager
+from Builder.utils.mirror_probe import MirrorProbe, MirrorResult, arch_probe_url, parse_mirrorlist, render_mirrorlist
+
+
+def _start_mirror(delay: float = 0.0, status: int = 200):
+    """Local stand-in for a mirror that answers after `delay` seconds"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(delay)
+            body = b"x" * 64 * 1024
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def test_mirrors_are_ranked_and_budget_is_enforced():
+    servers = [_start_mirror(0.3), _start_mirror(0.0), _start_mirror(status=404), _start_mirror(5.0)]
+    slow, fast, broken, hanging = [url for _, url in servers]
+    try:
+        started = time.monotonic()
+        ranked, results = MirrorProbe(time_budget=1.0).rank(
+            {mirror: f"{mirror}/core.db" for mirror in [slow, broken, hanging, fast]}
+        )
+        elapsed = time.monotonic() - started
+
+        assert elapsed < 2.0, "The overall time budget must bound the probe"
+        assert ranked == [fast, slow, broken, hanging]
+        by_mirror = {r.mirror: r for r in results}
+        assert by_mirror[fast].ok and by_mirror[fast].throughput > 0
+        assert "404" in by_mirror[broken].error
+        assert not by_mirror[hanging].ok
+    finally:
+        for server, _ in servers:
+            server.shutdown()
+
+
+def test_chaotic_mirrors_use_the_same_probe():
+    servers = [_start_mirror(0.3), _start_mirror(0.0)]
+    slow, fast = [url for _, url in servers]
+    original = ChaoticAurManager.MIRRORS
+    try:
+        ChaoticAurManager.MIRRORS = [slow, fast]
+        assert ChaoticAurManager.rank_mirrors(MirrorProbe(time_budget=2.0)) == [fast, slow]
+    finally:
+        ChaoticAurManager.MIRRORS = original
+        for server, _ in servers:
+            server.shutdown()
+
+
+def test_mirrorlist_parsing():
+    active, commented = parse_mirrorlist(
+        "## Germany\nServer = https://a.example/$repo/os/$arch\n#Server = https://b.example/$repo/os/$arch\n"
+    )
+    assert active == ["https://a.example/$repo/os/$arch"]
+    assert commented == ["https://b.example/$repo/os/$arch"]
+    url = arch_probe_url(active[0])
+    assert url.startswith("https://a.example/core/os/") and url.endswith("/core.db")
+
+
+def test_ranked_mirrorlist_keeps_unprobed_servers_and_header():
+    original = (
+        "##\n## Arch Linux repository mirrorlist\n## Generated on 2024-09-01\n##\n\n"
+        "## Germany\nServer = https://a.example/\nServer = https://b.example/\nServer = https://c.example/\n"
+        "#Server = https://d.example/\n"
+    )
+    results = [MirrorResult("https://b.example/", 0.01, 2 * 1024 * 1024), MirrorResult("https://a.example/", error="timeout")]
+    rendered = render_mirrorlist(
+        ["https://b.example/", "https://a.example/"], results, original=original, unprobed=["https://c.example/"]
+    )
+
+    assert rendered.startswith("##\n## Arch Linux repository mirrorlist\n## Generated on 2024-09-01\n##\n## Ranked by")
+    assert parse_mirrorlist(rendered) == (
+        ["https://b.example/", "https://a.example/", "https://c.example/"],
+        ["https://d.example/"],
+    )
+    assert "## Germany\n" in rendered
+
+    # Повторное ранжирование не копит отметки
+    again = render_mirrorlist(["https://a.example/"], [], original=rendered)
+    assert again.count("## Ranked by") == 1
+    assert again.count("# not ranked") == 1 and "KiB/s" not in again
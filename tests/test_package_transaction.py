@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from Builder.managers.package_manager import PackageManager
+
+
+def _fake_install_batch_factory(bad: set, calls: list):
+    def _fake_install_batch(packages_batch, aur=None):
+        calls.append(list(packages_batch))
+        return not (set(packages_batch) & bad)
+    return _fake_install_batch
+
+
+def _run_with_bad(packages, bad):
+    calls = []
+    original = PackageManager._install_batch
+    PackageManager._install_batch = staticmethod(_fake_install_batch_factory(bad, calls))
+    try:
+        failed = PackageManager.install_packages(packages, single_transaction=True)
+    finally:
+        PackageManager._install_batch = original
+    return failed, calls
+
+
+def test_single_transaction_when_everything_installs():
+    packages = [f"pkg{i}" for i in range(150)]
+    failed, calls = _run_with_bad(packages, set())
+
+    assert failed == []
+    assert calls == [packages], "The whole list must be installed in one transaction"
+
+
+def test_bisection_reports_exact_bad_packages():
+    packages = [f"pkg{i}" for i in range(150)]
+    bad = {"pkg7", "pkg120"}
+    failed, calls = _run_with_bad(packages, bad)
+
+    assert sorted(failed) == sorted(bad)
+    # O(k log n): far fewer transactions than retrying every package
+    assert len(calls) <= 2 * len(bad) * 8 + 1
+
+
+def test_bisection_keeps_order_and_handles_empty_list():
+    failed, calls = _run_with_bad([], {"x"})
+    assert failed == [] and calls == []
+
+    failed, _ = _run_with_bad(["a", "b", "c", "d"], {"d", "a"})
+    assert failed == ["a", "d"]
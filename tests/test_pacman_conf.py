@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from Builder.managers.chaotic_aur_manager import ChaoticAurManager
+from Builder.managers.drivers_manager import ChdwManager
+from Builder.managers.package_manager import PackageManager
+from Builder.utils.pacman_conf import PacmanConf, PacmanConfTransaction
+from Builder.utils.plan import run_unprivileged
+
+ARCH_CONF = """#
+# /etc/pacman.conf
+#
+[options]
+#RootDir     = /
+HoldPkg     = pacman glibc
+Architecture = auto
+#IgnorePkg   =
+
+# Misc options
+#UseSyslog
+#Color
+#NoProgressBar
+CheckSpace
+#VerbosePkgLists
+ParallelDownloads = 5
+
+SigLevel    = Required DatabaseOptional
+
+# REPOSITORIES
+[core]
+Include = /etc/pacman.d/mirrorlist
+
+[extra]
+Include = /etc/pacman.d/mirrorlist
+
+#[multilib]
+#Include = /etc/pacman.d/mirrorlist
+
+# An example of a custom package repository.
+#[custom]
+#SigLevel = Optional TrustAll
+#Server = file:///home/custompkgs
+"""
+
+
+class _Transaction(PacmanConfTransaction):
+    def __init__(self, path: Path):
+        super().__init__(path)
+        self.commands = []
+
+    def _run_sudo(self, command):
+        self.commands.append(command)
+        return run_unprivileged(command)
+
+
+def test_unedited_model_renders_the_original():
+    conf = PacmanConf(ARCH_CONF)
+    assert conf.render() == ARCH_CONF
+    assert conf.get("options", "ParallelDownloads") == "5"
+    assert conf.get("options", "Color") is None
+    assert conf.get("core", "Include") == "/etc/pacman.d/mirrorlist"
+    assert not conf.has_section("multilib")
+    conf.validate()
+
+
+def test_edits_touch_only_their_lines():
+    PackageManager.parallel_downloads = 8
+    try:
+        lines = PackageManager.render_pacman_conf(ARCH_CONF.splitlines(keepends=True), enable_multilib=True)
+    finally:
+        PackageManager.parallel_downloads = 5
+    conf = PacmanConf("".join(lines))
+
+    assert conf.get("options", "ParallelDownloads") == "8"
+    assert conf.get("options", "Color") == ""
+    assert conf.get("options", "ILoveCandy") == ""
+    # Закомментированный multilib включается на месте, без второй секции
+    assert "[multilib]\nInclude = /etc/pacman.d/mirrorlist\n" in conf.render()
+    assert "#[multilib]" not in conf.render()
+    assert "#NoProgressBar\n" in conf.render() and "#[custom]\n" in conf.render()
+
+    rendered = ChaoticAurManager.render_pacman_conf(conf.render())
+    assert rendered.endswith("\n# Chaotic AUR - Binary AUR packages\n[chaotic-aur]\nInclude = /etc/pacman.d/chaotic-mirrorlist\n")
+    assert ChaoticAurManager.render_pacman_conf(rendered) == rendered
+
+
+def test_local_repository_goes_before_core():
+    conf = PacmanConf(ARCH_CONF)
+    chwd = ChdwManager()
+    chwd.configure_pacman_conf(conf)
+    name = chwd.LOCAL_REPO_NAME
+    assert (
+        f"# REPOSITORIES\n[{name}]\nSigLevel = Optional TrustAll\n"
+        f"Server = file://{chwd.repo_path}\n\n[core]\n"
+    ) in conf.render()
+    assert [s.name for s in conf.sections][1:4] == ["options", name, "core"]
+    assert not conf.add_section(name, [("Server", "file:///other")], before="core")
+
+
+def test_validation_rejects_broken_configs():
+    for content, problem in [
+        ("[options]\n[core]\nInclude = x\n[core]\nInclude = y\n", "duplicate section [core]"),
+        ("[core]\nInclude = x\n", "no [options] section"),
+        ("[options]\n[local]\nSigLevel = Never\n", "[local] has neither Server nor Include"),
+        ("[options]\nColor\n<<<<<<< HEAD\n", "unexpected line"),
+    ]:
+        try:
+            PacmanConf(content).validate()
+        except ValueError as e:
+            assert problem in str(e)
+        else:
+            raise AssertionError(f"{problem} was not detected")
+
+
+def test_transaction_writes_once_with_one_backup():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "pacman.conf"
+        path.write_text(ARCH_CONF)
+
+        transaction = _Transaction(path)
+        transaction.stage("options", lambda conf: PackageManager.configure_pacman_conf(conf, enable_multilib=True))
+        transaction.stage("Chaotic AUR", ChaoticAurManager.configure_pacman_conf)
+        transaction.stage("local", lambda conf: conf.add_section("local", [("Server", "file:///repo")], before="core"))
+        assert transaction.commit()
+
+        conf = PacmanConf(path.read_text())
+        assert conf.has_section("multilib") and conf.has_section("chaotic-aur") and conf.has_section("local")
+        assert [c[0] for c in transaction.commands] == ["cp", "cp", "mv"]
+        names = sorted(p.name for p in Path(tmp).iterdir())
+        assert len(names) == 2 and names[1].startswith("pacman.conf.meowrch.bak.")
+        assert (Path(tmp) / names[1]).read_text() == ARCH_CONF
+
+        # Повторный запуск ничего не меняет и не пишет
+        transaction.commands.clear()
+        transaction.stage("options", lambda conf: PackageManager.configure_pacman_conf(conf, enable_multilib=True))
+        assert transaction.commit()
+        assert transaction.commands == []
+
+
+def test_invalid_result_is_not_written():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "pacman.conf"
+        path.write_text(ARCH_CONF)
+
+        transaction = _Transaction(path)
+        transaction.stage("broken", lambda conf: conf.add_section("local", [("SigLevel", "Never")]))
+        assert not transaction.commit()
+        assert path.read_text() == ARCH_CONF
+        assert transaction.commands == []
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+import gzip
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from Builder.managers.package_manager import PackageManager
+from Builder.utils.pacman_db import LocalPackageIndex, SyncDatabase, parse_desc
+
+
+def _write_local_package(db: Path, name: str, version: str, provides=()) -> None:
+    pkg_dir = db / f"{name}-{version}"
+    pkg_dir.mkdir()
+    content = f"%NAME%\n{name}\n\n%VERSION%\n{version}\n\n"
+    if provides:
+        content += "%PROVIDES%\n" + "\n".join(provides) + "\n\n"
+    (pkg_dir / "desc").write_text(content)
+
+
+def test_parse_desc_blocks():
+    fields = parse_desc("%NAME%\nyay-bin\n\n%PROVIDES%\nyay=12.3\nfoo\n\n%DEPENDS%\npacman>5\n")
+    assert fields["NAME"] == ["yay-bin"]
+    assert fields["PROVIDES"] == ["yay=12.3", "foo"]
+    assert fields["DEPENDS"] == ["pacman>5"]
+
+
+def test_local_index_lookups_and_invalidation():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Path(tmp)
+        _write_local_package(db, "dracut", "105-1")
+        _write_local_package(db, "yay-bin", "12.3.5-1", provides=["yay=12.3.5"])
+
+        index = LocalPackageIndex(db)
+        assert index.is_installed("dracut")
+        assert index.get_version("yay-bin") == "12.3.5-1"
+        assert not index.is_installed("yay"), "is_installed matches package names only"
+        assert index.is_satisfied("yay"), "pacman -Q semantics: provides count"
+        assert index.is_satisfied("yay>=12")
+        assert index.get_providers("yay") == ["yay-bin"]
+        assert not index.is_installed("mkinitcpio")
+
+        _write_local_package(db, "mkinitcpio", "39-1")
+        # Make sure the directory mtime moves even on coarse-grained filesystems
+        stat = os.stat(db)
+        os.utime(db, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+        assert index.is_installed("mkinitcpio"), "Index must be rebuilt after the DB changes"
+
+
+def test_check_package_installed_accepts_providers():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Path(tmp)
+        _write_local_package(db, "yay-bin", "12.3.5-1", provides=["yay=12.3.5"])
+
+        original = PackageManager.local_index
+        PackageManager.local_index = LocalPackageIndex(db)
+        try:
+            # Иначе установщик ставит yay поверх yay-bin и получает конфликт
+            assert PackageManager.check_package_installed("yay")
+            assert PackageManager.check_package_installed("yay-bin")
+            assert not PackageManager.check_package_installed("paru")
+        finally:
+            PackageManager.local_index = original
+
+
+def _write_sync_db(path: Path, packages: dict, compression: str = "gz") -> None:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as archive:
+        for name, (version, extra) in packages.items():
+            data = f"%NAME%\n{name}\n\n%VERSION%\n{version}\n\n{extra}".encode()
+            info = tarfile.TarInfo(f"{name}-{version}/desc")
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+
+    raw = buffer.getvalue()
+    if compression == "gz":
+        path.write_bytes(gzip.compress(raw))
+    else:
+        path.write_bytes(subprocess.run(["zstd", "-q", "-c"], input=raw, capture_output=True, check=True).stdout)
+
+
+def test_sync_db_classify_and_route():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Path(tmp)
+        _write_sync_db(db / "core.db", {
+            "base-devel": ("1-2", ""),
+            "mkinitcpio": ("39-1", ""),
+        })
+        _write_sync_db(db / "extra.db", {
+            "cava": ("0.10-1", ""),
+            "xorg-server": ("21.1-1", "%GROUPS%\nxorg\n\n"),
+            "ttf-nerd": ("1-1", "%PROVIDES%\nttf-hack-nerd=3\n\n"),
+        }, compression="zstd" if shutil.which("zstd") else "gz")
+
+        sync_db = SyncDatabase(db)
+        classes = sync_db.classify(["cava", "xorg", "ttf-hack-nerd", "yay", "gone"], aur_packages={"yay"})
+        assert classes == {
+            "cava": SyncDatabase.REPO,
+            "xorg": SyncDatabase.REPO,
+            "ttf-hack-nerd": SyncDatabase.REPO,
+            "yay": SyncDatabase.AUR,
+            "gone": SyncDatabase.MISSING,
+        }
+        assert sync_db.get_repo("cava") == "extra"
+
+        pacman, aur, missing = sync_db.route(
+            ["base-devel", "hyprprop", "gone"], ["cava", "yay"], aur_packages={"hyprprop", "yay"}
+        )
+        assert pacman == ["base-devel", "cava"]
+        assert aur == ["hyprprop", "yay"]
+        assert missing == ["gone"]
+
+        # Without AUR information nothing is reported as missing
+        _, aur, missing = sync_db.route(["gone"], [], aur_packages=None)
+        assert aur == ["gone"] and missing == []
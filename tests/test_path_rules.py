@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from Builder.utils.path_rules import PathRules
+from Builder.utils.snapshot_backup import SnapshotBackup
+
+
+def test_anchored_and_unanchored_patterns():
+    rules = PathRules(["/hypr/", "*.log", "Code/**/Cache/", "!keep.log", "# comment", ""])
+
+    assert rules.match("hypr", is_dir=True)
+    assert not rules.match("meowrch/hypr", is_dir=True), "Anchored patterns only match at the root"
+    assert not rules.match("hypr", is_dir=False), "Directory patterns do not match files"
+    assert rules.match("kitty/debug.log", is_dir=False)
+    assert not rules.match("kitty/keep.log", is_dir=False), "The last matching pattern wins"
+    assert rules.match("Code/Cache", is_dir=True)
+    assert rules.match("Code/User/workspaceStorage/Cache", is_dir=True)
+    assert not rules.match("Other/Cache", is_dir=True)
+    assert rules.is_excluded("hypr/hyprland.conf")
+    assert not PathRules()
+
+
+def test_walk_prunes_excluded_directories():
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        for path in ["hypr/hyprland.conf", "meowrch/hypr/theme.conf", "Code/Cache/data_0", "Code/User/settings.json"]:
+            (root / path).parent.mkdir(parents=True, exist_ok=True)
+            (root / path).write_text("x")
+
+        scanned = []
+        original_scandir = os.scandir
+
+        def scandir(path):
+            scanned.append(os.path.relpath(path, root))
+            return original_scandir(path)
+
+        os.scandir = scandir
+        try:
+            found = sorted(relative for _, relative in PathRules(["/hypr/", "Cache/"]).walk(root))
+        finally:
+            os.scandir = original_scandir
+
+        assert found == ["Code/User/settings.json", "meowrch/hypr/theme.conf"]
+        assert "hypr" not in scanned and "Code/Cache" not in scanned
+
+
+def test_backup_skips_cache_directories():
+    with tempfile.TemporaryDirectory() as tmp:
+        home = Path(tmp) / "home"
+        for path in [".config/Code/Cache/data_0", ".config/Code/User/settings.json", ".bashrc"]:
+            (home / path).parent.mkdir(parents=True, exist_ok=True)
+            (home / path).write_text("x")
+
+        snapshot = SnapshotBackup(Path(tmp) / "backup").create(
+            home, [".config", ".bashrc"], PathRules(["/.config/**/Cache/"])
+        )
+
+        assert (snapshot / ".config/Code/User/settings.json").exists()
+        assert not (snapshot / ".config/Code/Cache").exists()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+import socket
+import sys
+import tempfile
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from Builder.managers.peer_cache_manager import PeerCacheManager
+from Builder.utils.pacman_conf import PacmanConfTransaction
+from Builder.utils.peer_cache import PeerCache, PeerCacheServer, render_pacman_conf, strip_peers
+from Builder.utils.plan import run_unprivileged
+
+
+def _free_udp_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _fetch(url: str):
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, b""
+
+
+def test_two_instances_share_repository_packages_only():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        cache_a, cache_b = tmp / "a-pkg", tmp / "b-pkg"
+        cache_a.mkdir()
+        cache_b.mkdir()
+        (cache_a / "cava-0.10.2-1-x86_64.pkg.tar.zst").write_bytes(b"cava package")
+        (cache_a / "core.db").write_bytes(b"database")
+
+        discovery_port = _free_udp_port()
+        server_a = PeerCacheServer([cache_a], port=0, discovery_port=discovery_port, bind="127.0.0.1")
+        server_b = PeerCacheServer([cache_b], port=0, discovery_port=None, bind="127.0.0.1")
+        server_a.start()
+        server_b.start()
+        try:
+            peers = PeerCache.discover(
+                [f"127.0.0.1:{server_b.port}"],
+                timeout=0.5,
+                discovery_port=discovery_port,
+                broadcast_address="127.0.0.1",
+                exclude_id=server_b.instance_id,
+            )
+            assert peers == [f"127.0.0.1:{server_a.port}"], "B finds A and skips itself"
+
+            mirror = f"http://{peers[0]}/extra/os/x86_64"
+            assert _fetch(f"{mirror}/cava-0.10.2-1-x86_64.pkg.tar.zst") == (200, b"cava package")
+            assert _fetch(f"{mirror}/btop-1.4.0-1-x86_64.pkg.tar.zst")[0] == 404, "Misses fall back to mirrors"
+            assert _fetch(f"{mirror}/core.db")[0] == 404, "Databases always come from the mirrors"
+            assert _fetch(f"{mirror}/..%2F..%2Fetc%2Fpasswd")[0] == 404
+
+            # Собранные AUR пакеты ничем не подписаны и пирам не отдаются
+            assert _fetch(f"http://{peers[0]}/aur/yay/abc123/")[0] == 404
+            assert server_a.served_files == 1
+        finally:
+            server_a.stop()
+            server_b.stop()
+
+
+def test_peers_are_added_first_to_every_repository_and_removed_again():
+    content = (
+        "[options]\nParallelDownloads = 5\n\n"
+        "[core]\nInclude = /etc/pacman.d/mirrorlist\n\n"
+        "[chaotic-aur]\nInclude = /etc/pacman.d/chaotic-mirrorlist\n"
+    )
+    rendered = render_pacman_conf(content, ["10.0.0.2:7878"])
+
+    assert rendered.count("Server = http://10.0.0.2:7878/$repo/os/$arch") == 2
+    assert "[core]\nServer = http://10.0.0.2:7878" in rendered
+    assert "[options]\nParallelDownloads" in rendered
+    assert render_pacman_conf(rendered, ["10.0.0.2:7878"]) == rendered
+    assert strip_peers(rendered) == content
+
+
+class _Transaction(PacmanConfTransaction):
+    def _run_sudo(self, command):
+        return run_unprivileged(command)
+
+
+def test_manager_edits_pacman_conf_with_a_backup():
+    content = "[options]\nParallelDownloads = 5\n\n[core]\nInclude = /etc/pacman.d/mirrorlist\n"
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "pacman.conf"
+        path.write_text(content)
+
+        manager = PeerCacheManager(serve=False)
+        manager._transaction = lambda: _Transaction(path)
+        manager.client.peers = ["10.0.0.2:7878"]
+
+        assert manager.activate()
+        assert "[core]\nServer = http://10.0.0.2:7878/$repo/os/$arch" in path.read_text()
+        assert any(p.name.startswith("pacman.conf.meowrch.bak.") for p in Path(tmp).iterdir())
+
+        assert manager.deactivate()
+        assert path.read_text() == content
+
+
+def test_manager_serves_only_the_pacman_cache():
+    # Локально собранные yay-bin/paru совпадают по имени со сборками Chaotic AUR
+    assert PeerCacheManager.CACHE_DIRS == [Path("/var/cache/pacman/pkg")]
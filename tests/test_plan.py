@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from Builder.managers.chaotic_aur_manager import ChaoticAurManager
+from Builder.managers.package_manager import PackageManager
+from Builder.utils.mkinitcpio_config import MkinitcpioConfigEditor
+from Builder.utils.plan import InstallPlan, ScratchCopy, run_unprivileged, unified_diff
+
+
+def test_pacman_conf_render_is_pure():
+    before = "[options]\n#Color\n#ParallelDownloads = 5\n\n[core]\nInclude = /etc/pacman.d/mirrorlist\n"
+    after = "".join(PackageManager.render_pacman_conf(before.splitlines(keepends=True), enable_multilib=True))
+    after = ChaoticAurManager.render_pacman_conf(after)
+
+    diff = unified_diff("/etc/pacman.conf", before, after)
+    assert "-#Color" in diff and "+Color" in diff
+    assert "+ParallelDownloads = 5" in diff
+    assert "+[multilib]" in diff and "+[chaotic-aur]" in diff
+    assert unified_diff("/etc/pacman.conf", after, after) == []
+
+
+def test_scratch_copy_reports_editor_changes_without_touching_original():
+    with tempfile.TemporaryDirectory() as tmp:
+        original = Path(tmp) / "mkinitcpio.conf"
+        original.write_text("MODULES=()\nHOOKS=(base udev autodetect modconf block filesystems fsck)\n")
+
+        with ScratchCopy(original) as scratch:
+            editor = MkinitcpioConfigEditor(scratch.copy)
+            editor._run_sudo = run_unprivileged
+            editor.add_hook("plymouth", "after", "modconf")
+            diff = scratch.diff()
+
+        assert "+HOOKS=(base udev autodetect modconf plymouth block filesystems fsck)" in diff
+        assert "plymouth" not in original.read_text()
+
+
+def test_plan_render_lists_every_section():
+    plan = InstallPlan(
+        pacman_packages=["cava"],
+        dotfiles={"new": ["/home/u/.bashrc"], "changed": []},
+        config_edits={"/etc/pacman.conf": ["+Color"]},
+        services=["sddm.service"],
+    )
+    report = plan.render()
+    assert "==> Packages to install (pacman): 1\n    cava" in report
+    assert "==> New dotfiles: 1" in report
+    assert "==> System services to enable: 1\n    sddm.service" in report
+    assert "      +Color" in report
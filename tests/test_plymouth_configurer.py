@@ -10,8 +10,12 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 import Builder.managers.custom_apps.plymouth as plymouth_mod
+import Builder.utils.initramfs as initramfs_mod
 from Builder.managers.custom_apps.plymouth import PlymouthConfigurer
+from Builder.utils.initramfs import InitramfsManager
+from Builder.utils.initramfs_fingerprint import InitramfsFingerprint
 from Builder.utils.mkinitcpio_config import MkinitcpioConfigEditor
+from Builder.utils.post_actions import PostAction, PostActionQueue
 
 
 def _fake_run_sudo_factory(calls):
@@ -286,6 +290,165 @@ def test_dracut_config_written_and_dracut_runs():
         assert any(cmd[0] == "dracut" for cmd in calls), "dracut must be called to regenerate initramfs"
 
 
+def test_post_actions_are_coalesced_until_flush():
+    """With a shared queue, initramfs and grub.cfg are regenerated once at flush time."""
+    queue = PostActionQueue()
+    calls = []
+
+    pc = PlymouthConfigurer(post_actions=queue)
+    pc._run_sudo = _fake_run_sudo_factory(calls)
+    pc.initramfs_tool = "mkinitcpio"
+    pc._bootloader_type = lambda: "systemd-boot"
+
+    editor = MkinitcpioConfigEditor(Path("/nonexistent"), post_actions=queue)
+    editor._run_sudo = _fake_run_sudo_factory(calls)
+
+    pc.run_post_commands()
+    pc.run_post_commands()
+    editor.apply_hooks()
+
+    assert calls == [], "Nothing must run before the queue is flushed"
+
+    queue.flush()
+    assert [c for c in calls if c[:2] == ["mkinitcpio", "-P"]] == [["mkinitcpio", "-P"]]
+
+    queue.flush()
+    assert len(calls) == 1, "A flushed queue must not run actions again"
+
+
+def test_flush_reports_failed_actions():
+    """A failed regeneration is returned so the steps that requested it stay undone."""
+    queue = PostActionQueue()
+    calls = []
+
+    def failing_grub():
+        raise subprocess.CalledProcessError(1, ["grub-mkconfig"])
+
+    queue.schedule(PostAction.INITRAMFS, lambda: calls.append("initramfs"))
+    queue.schedule(PostAction.GRUB_CONFIG, failing_grub)
+    queue.schedule(PostAction.GRUB_CONFIG, lambda: calls.append("grub"))
+    assert queue.requests() == {PostAction.INITRAMFS: 1, PostAction.GRUB_CONFIG: 2}
+
+    assert queue.flush() == [PostAction.GRUB_CONFIG]
+    assert calls == ["initramfs"]
+    assert queue.flush() == [] and queue.requests() == {}
+
+
+def test_mkinitcpio_session_reads_and_writes_once():
+    """All plymouth edits go through one session: one cat, one cp, one rebuild."""
+    hooks = "base udev autodetect microcode modconf keyboard keymap consolefont kms block encrypt filesystems fsck"
+    test_file = _create_test_mkinitcpio_file(hooks)
+    queue = PostActionQueue()
+
+    try:
+        editor = MkinitcpioConfigEditor(test_file, post_actions=queue)
+        mock = _mock_run_sudo_for_file(test_file)
+        calls = []
+
+        def _counting_run_sudo(command, input=None):
+            calls.append(list(command))
+            return mock(command, input)
+
+        editor._run_sudo = _counting_run_sudo
+        InitramfsManager().configure_mkinitcpio_for_plymouth(editor, rebuild=True)
+
+        assert [c[0] for c in calls] == ["cat", "cp"]
+        final_hooks = editor.list_hooks()
+        assert final_hooks.index("kms") < final_hooks.index("plymouth") < final_hooks.index("sd-encrypt")
+        assert "dm_crypt" in editor.list_modules()
+        assert "BINARIES=()\nFILES=()\n" in test_file.read_text()
+
+        queue.flush()
+        assert [c for c in calls if c[0] == "mkinitcpio"] == [["mkinitcpio", "-P"]]
+
+        # Без изменений файл не переписывается и образы не пересобираются
+        calls.clear()
+        with editor.session() as session:
+            session.add_hook("plymouth")
+            session.add_items("FILES", [])
+        assert [c[0] for c in calls] == ["cat"]
+
+        # Исключение внутри сессии отменяет запись
+        try:
+            with editor.session() as session:
+                session.add_items("FILES", ["/etc/crypttab"])
+                raise RuntimeError("abort")
+        except RuntimeError:
+            pass
+        assert "FILES=()" in test_file.read_text()
+    finally:
+        test_file.unlink()
+
+
+def test_initramfs_rebuild_skipped_when_inputs_unchanged():
+    """A second rebuild with the same inputs is skipped unless forced."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir)
+        files = {
+            "etc/mkinitcpio.conf": "MODULES=()\nHOOKS=(base systemd plymouth filesystems)\nCOMPRESSION=\"zstd\"\n",
+            "etc/mkinitcpio.d/linux.preset": "PRESETS=('default')\ndefault_image=\"/boot/initramfs-linux.img\"\n"
+                                             "#fallback_image=\"/boot/initramfs-linux-fallback.img\"\n",
+            "usr/lib/modules/6.10.1-arch1-1/vmlinuz": "kernel",
+            "etc/plymouth/plymouthd.conf": "[Daemon]\nTheme=meowrch\n",
+            "usr/share/plymouth/themes/meowrch/meowrch.script": "image = 1;\n",
+            "var/lib/pacman/local/intel-ucode-20240910-1/desc": "%NAME%\nintel-ucode\n\n%VERSION%\n20240910-1\n",
+        }
+        for name, content in files.items():
+            (root / name).parent.mkdir(parents=True, exist_ok=True)
+            (root / name).write_text(content)
+        (root / "boot").mkdir()
+
+        calls = []
+
+        def _mock_run_sudo(cmd, input=None):
+            calls.append(list(cmd))
+            if cmd[0] == "cat":
+                if not Path(cmd[1]).exists():
+                    raise subprocess.CalledProcessError(1, cmd, "", "No such file")
+                return Path(cmd[1]).read_text()
+            if cmd[0] == "tee":
+                Path(cmd[1]).write_text(input)
+            if cmd == ["mkinitcpio", "-P"]:
+                (root / "boot/initramfs-linux.img").write_text("image")
+            return ""
+
+        original = initramfs_mod.InitramfsFingerprint
+        initramfs_mod.InitramfsFingerprint = lambda tool, **kwargs: InitramfsFingerprint(tool, root=root, **kwargs)
+        manager = InitramfsManager()
+        rebuilds = lambda: [c for c in calls if c[0] == "mkinitcpio"]
+        try:
+            manager.rebuild_initramfs("mkinitcpio", _mock_run_sudo)
+            assert rebuilds() == [["mkinitcpio", "-P"]]
+            assert (root / "boot/.meowrch-mkinitcpio.fingerprint").exists()
+
+            manager.rebuild_initramfs("mkinitcpio", _mock_run_sudo)
+            assert len(rebuilds()) == 1, "Unchanged inputs must not be rebuilt"
+
+            manager.rebuild_initramfs("mkinitcpio", _mock_run_sudo, force=True)
+            assert len(rebuilds()) == 2, "force must rebuild anyway"
+
+            # Изменение темы Plymouth, нового ядра или удаление образа требуют пересборки
+            for change in (
+                lambda: (root / "usr/share/plymouth/themes/meowrch/meowrch.script").write_text("image = 2;\n"),
+                lambda: shutil.copytree(root / "usr/lib/modules/6.10.1-arch1-1", root / "usr/lib/modules/6.11.0-arch1-1"),
+                lambda: (root / "boot/initramfs-linux.img").unlink(),
+            ):
+                count = len(rebuilds())
+                change()
+                manager.rebuild_initramfs("mkinitcpio", _mock_run_sudo)
+                assert len(rebuilds()) == count + 1
+
+            # Каталог без vmlinuz и комментарии в конфиге не влияют на отпечаток
+            count = len(rebuilds())
+            (root / "usr/lib/modules/6.9.0-arch1-1").mkdir()
+            conf = root / "etc/mkinitcpio.conf"
+            conf.write_text("# comment\n" + conf.read_text().replace("HOOKS=(", "HOOKS=(\n  "))
+            manager.rebuild_initramfs("mkinitcpio", _mock_run_sudo)
+            assert len(rebuilds()) == count
+        finally:
+            initramfs_mod.InitramfsFingerprint = original
+
+
 if __name__ == "__main__":
     # Run tests manually for ad-hoc execution
     tests = [
@@ -297,6 +460,10 @@ if __name__ == "__main__":
         test_systemd_replaces_encrypt_with_sd_encrypt,
         test_udev_replaced_with_systemd_and_encrypt_migrated,
         test_dracut_config_written_and_dracut_runs,
+        test_post_actions_are_coalesced_until_flush,
+        test_flush_reports_failed_actions,
+        test_mkinitcpio_session_reads_and_writes_once,
+        test_initramfs_rebuild_skipped_when_inputs_unchanged,
     ]
     ok = 0
     for t in tests:
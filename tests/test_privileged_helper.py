@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from Builder.utils import privileged_helper
+from Builder.utils.privileged_helper import PrivilegedHelper, handle, serve
+
+
+def test_write_is_atomic_and_keeps_mode():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "grub"
+        path.write_text("old\n")
+        os.chmod(path, 0o600)
+
+        assert handle({"op": "write", "path": str(path), "data": "new\n"}) == {"ok": True}
+        assert path.read_text() == "new\n"
+        assert path.stat().st_mode & 0o777 == 0o600
+        # Временные файлы не остаются рядом
+        assert os.listdir(tmp) == ["grub"]
+
+        assert handle({"op": "read", "path": str(path)}) == {"ok": True, "data": "new\n"}
+
+
+def test_copy_mkdir_chmod_remove():
+    with tempfile.TemporaryDirectory() as tmp:
+        src = Path(tmp) / "pacman.conf"
+        src.write_text("[options]\n")
+        os.chmod(src, 0o640)
+        os.utime(src, (1_000_000, 1_000_000))
+
+        repo = Path(tmp) / "repo"
+        assert handle({"op": "mkdir", "path": str(repo)})["ok"]
+        assert handle({"op": "chmod", "path": str(repo), "mode": 0o755})["ok"]
+        assert repo.stat().st_mode & 0o777 == 0o755
+
+        # Копия в каталог, как cp --preserve=all
+        assert handle({"op": "copy", "src": str(src), "dst": str(repo), "preserve": True})["ok"]
+        copied = repo / "pacman.conf"
+        assert copied.read_text() == "[options]\n"
+        assert copied.stat().st_mode & 0o777 == 0o640
+        assert copied.stat().st_mtime == 1_000_000
+
+        assert handle({"op": "remove", "path": str(repo)})["ok"]
+        assert not repo.exists()
+        assert handle({"op": "remove", "path": str(repo)})["ok"]
+
+
+def test_errors_are_returned_and_tools_are_allowlisted():
+    response = handle({"op": "read", "path": "/nonexistent/meowrch"})
+    assert not response["ok"] and "FileNotFoundError" in response["error"]
+
+    response = handle({"op": "run", "argv": ["bash", "-c", "id"]})
+    assert not response["ok"] and response["returncode"] == 126
+
+    assert not handle({"op": "format"})["ok"]
+
+
+def test_serve_handles_batches():
+    with tempfile.TemporaryDirectory() as tmp:
+        requests = [
+            {"op": "mkdir", "path": f"{tmp}/a/b"},
+            {"batch": [
+                {"op": "write", "path": f"{tmp}/a/b/one", "data": "1"},
+                {"op": "read", "path": f"{tmp}/a/b/one"},
+                {"op": "read", "path": f"{tmp}/missing"},
+            ]},
+        ]
+        stdin = io.StringIO("".join(json.dumps(r) + "\n" for r in requests) + "not json\n")
+        stdout = io.StringIO()
+        serve(stdin, stdout)
+
+        responses = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        assert responses[0] == {"ok": True}
+        batch = responses[1]["batch"]
+        assert batch[0]["ok"] and batch[1]["data"] == "1" and not batch[2]["ok"]
+        assert not responses[2]["ok"]
+
+
+def test_serve_runs_in_an_isolated_interpreter():
+    # Как sudo python -I, но без root; loguru скрыт, как у интерпретатора root
+    script = (
+        "import importlib.util, sys\n"
+        "sys.modules['loguru'] = None\n"
+        "spec = importlib.util.spec_from_file_location('helper', sys.argv[1])\n"
+        "helper = importlib.util.module_from_spec(spec)\n"
+        "spec.loader.exec_module(helper)\n"
+        "helper.serve()\n"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        requests = [
+            {"op": "write", "path": f"{tmp}/hooks", "data": "HOOKS=(base)\n"},
+            {"op": "read", "path": f"{tmp}/hooks"},
+        ]
+        result = subprocess.run(
+            [sys.executable, "-I", "-c", script, privileged_helper.__file__],
+            input="".join(json.dumps(r) + "\n" for r in requests),
+            capture_output=True,
+            text=True,
+            timeout=30,
+        )
+
+        assert result.returncode == 0, result.stderr
+        responses = [json.loads(line) for line in result.stdout.splitlines()]
+        assert responses == [{"ok": True}, {"ok": True, "data": "HOOKS=(base)\n"}]
+
+
+def test_translate_sudo_commands():
+    translate = PrivilegedHelper.translate
+    assert translate(["cat", "/etc/default/grub"], text=True, capture_output=True, check=True) == {
+        "op": "read", "path": "/etc/default/grub"
+    }
+    assert translate(["tee", "/etc/x"], input="data") == {"op": "write", "path": "/etc/x", "data": "data"}
+    assert translate(["cp", "--preserve=all", "/a", "/b"])["preserve"]
+    assert translate(["chmod", "755", "/x"]) == {"op": "chmod", "path": "/x", "mode": 0o755}
+    assert translate(["mkdir", "-p", "/x"]) == {"op": "mkdir", "path": "/x"}
+    assert translate(["rm", "-rf", "/x"]) == {"op": "remove", "path": "/x"}
+    assert translate(["mv", "/a", "/b"]) == {"op": "rename", "src": "/a", "dst": "/b"}
+    assert translate(["mkinitcpio", "-P"], capture_output=True)["op"] == "run"
+
+    # Вывод в терминал, незнакомые команды и флаги остаются за sudo
+    assert translate(["mkinitcpio", "-P"], check=True) is None
+    assert translate(["pacman", "-Sy"], capture_output=True) is None
+    assert translate(["cp", "-r", "/a", "/b"]) is None
+    assert translate(["cat", "/x"], stderr=subprocess.DEVNULL) is None
+
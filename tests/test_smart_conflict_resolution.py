@@ -8,7 +8,7 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from Builder.utils.mkinitcpio_config import MkinitcpioConfigEditor
-from Builder.utils.mkinitcpio_rules import MkinitcpioRules
+from Builder.utils.mkinitcpio_rules import MkinitcpioRules, OrderCycleError, solve_order
 
 
 def create_test_mkinitcpio_file(hooks: str) -> Path:
@@ -270,6 +270,65 @@ def test_editor_adds_required_modules_for_encrypt():
         test_file.unlink()
 
 
+def test_solver_keeps_unknown_hooks_in_place():
+    """Неизвестные хуки не уезжают в конец, известные упорядочиваются по правилам"""
+    rules = MkinitcpioRules()
+
+    hooks = ["base", "udev", "custom-hook", "autodetect", "modconf", "block", "filesystems", "fsck", "plymouth"]
+    sorted_hooks = rules.sort_hooks_by_priority(hooks)
+    assert sorted_hooks == [
+        "base", "udev", "custom-hook", "autodetect", "modconf", "plymouth", "block", "filesystems", "fsck"
+    ]
+
+    messy_hooks = ["fsck", "plymouth", "base", "encrypt", "systemd"]
+    assert rules.sort_hooks_by_priority(messy_hooks) == ["base", "systemd", "plymouth", "encrypt", "fsck"]
+    assert rules.validate_hook_order(rules.sort_hooks_by_priority(messy_hooks)) == []
+
+    issues = rules.validate_hook_order(["base", "block", "plymouth", "kms"])
+    assert {"plymouth"} == {issue["hook"] for issue in issues}
+    assert {issue.get("should_be_after") or issue.get("should_be_before") for issue in issues} == {"block", "kms"}
+
+
+def test_solver_orders_modules_and_reports_cycles():
+    """Модули упорядочиваются тем же решателем, циклы называются явно"""
+    rules = MkinitcpioRules()
+    assert rules.sort_modules_by_priority(["dm_crypt", "custom", "nvidia_drm", "nvidia"]) == [
+        "custom", "nvidia", "nvidia_drm", "dm_crypt"
+    ]
+
+    rules.hook_dependencies["kms"] = {"must_be_after": ["plymouth"]}
+    try:
+        rules.sort_hooks_by_priority(["base", "kms", "plymouth"])
+    except OrderCycleError as e:
+        assert e.cycle[0] == e.cycle[-1]
+        assert set(e.cycle) == {"kms", "plymouth"}
+        assert "kms must be after plymouth" in str(e)
+    else:
+        raise AssertionError("the cycle was not detected")
+
+    assert solve_order(["c", "a", "b"], {}) == ["c", "a", "b"]
+
+
+def test_priority_levels_are_linked_through_barriers():
+    """Соседние уровни приоритета связаны через барьер: рёбер линейно, а не квадратично"""
+    priorities = {f"low{i}": 10 for i in range(50)}
+    priorities.update({f"high{i}": 20 for i in range(50)})
+    items = [f"high{i}" for i in range(50)] + [f"low{i}" for i in range(50)]
+
+    constraints = MkinitcpioRules._priority_constraints(items, priorities)
+    assert len(constraints) == 100
+    assert solve_order(items, constraints) == items[50:] + items[:50]
+
+    rules = MkinitcpioRules()
+    rules.hook_dependencies["kms"] = {"must_be_after": ["plymouth"]}
+    try:
+        rules.sort_hooks_by_priority(["base", "kms", "plymouth"])
+    except OrderCycleError as e:
+        assert "kms (50) has a lower priority than plymouth (55)" in str(e)
+    else:
+        raise AssertionError("the cycle was not detected")
+
+
 if __name__ == "__main__":
     print("Тестирование умной системы разрешения конфликтов")
     print("ВНИМАНИЕ: Используются тестовые файлы!")
@@ -282,6 +341,9 @@ if __name__ == "__main__":
         test_rules_directly()
         test_required_modules_for_encrypt_hooks()
         test_editor_adds_required_modules_for_encrypt()
+        test_solver_keeps_unknown_hooks_in_place()
+        test_solver_orders_modules_and_reports_cycles()
+        test_priority_levels_are_linked_through_barriers()
         
         print("\n🎉 Все тесты завершены успешно!")
         
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+import os
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from Builder.utils.snapshot_backup import SnapshotBackup
+
+
+def _home(root: Path) -> Path:
+    home = root / "home"
+    (home / ".config" / "kitty").mkdir(parents=True)
+    (home / ".config" / "kitty" / "kitty.conf").write_text("font_size 11\n")
+    (home / ".config" / "kitty" / "theme.conf").write_text("background #1e1e2e\n")
+    (home / ".config" / "kitty" / "theme-link.conf").symlink_to("theme.conf")
+    (home / ".bashrc").write_text("alias ls='ls --color'\n")
+    (home / ".bashrc").chmod(0o600)
+    return home
+
+
+def test_unchanged_files_are_hard_links_to_shared_objects():
+    with tempfile.TemporaryDirectory() as tmp:
+        home = _home(Path(tmp))
+        backups = SnapshotBackup(Path(tmp) / "backup", keep=2)
+        items = [".config", ".bashrc", ".xinitrc"]
+
+        first = backups.create(home, items)
+        (home / ".bashrc").write_text("alias ls='lsd'\n")
+        second = backups.create(home, items)
+
+        assert first != second
+        kitty = ".config/kitty/kitty.conf"
+        assert (first / kitty).stat().st_ino == (second / kitty).stat().st_ino
+        assert (first / ".bashrc").read_text() == "alias ls='ls --color'\n"
+        assert (second / ".bashrc").read_text() == "alias ls='lsd'\n"
+        assert os.readlink(second / ".config/kitty/theme-link.conf") == "theme.conf"
+
+        third = backups.create(home, items)
+        assert backups.list_snapshots() == [second, third], "Only the newest snapshots are kept"
+        objects = list((backups.objects).glob("*/*"))
+        assert len(objects) == 3, "The object of the old .bashrc is collected"
+
+
+def test_restore_brings_back_contents_modes_and_links():
+    with tempfile.TemporaryDirectory() as tmp:
+        home = _home(Path(tmp))
+        backups = SnapshotBackup(Path(tmp) / "backup")
+        snapshot = backups.create(home, [".config", ".bashrc"])
+        mtime = (home / ".bashrc").stat().st_mtime_ns
+
+        shutil.rmtree(home / ".config")
+        (home / ".bashrc").write_text("broken\n")
+        (home / ".bashrc").chmod(0o644)
+
+        assert backups.restore(backups.find("latest")) == 4
+        assert (home / ".config" / "kitty" / "kitty.conf").read_text() == "font_size 11\n"
+        assert os.readlink(home / ".config" / "kitty" / "theme-link.conf") == "theme.conf"
+        assert (home / ".bashrc").read_text() == "alias ls='ls --color'\n"
+        assert (home / ".bashrc").stat().st_mode & 0o777 == 0o600
+        assert (home / ".bashrc").stat().st_mtime_ns == mtime
+        assert backups.find(snapshot.name) == snapshot
+
+
+def test_export_streams_a_tar_zst_archive():
+    if shutil.which("zstd") is None:
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        home = _home(Path(tmp))
+        backups = SnapshotBackup(Path(tmp) / "backup")
+        snapshot = backups.create(home, [".config", ".bashrc"])
+        archive = Path(tmp) / "backup.tar.zst"
+
+        backups.export(snapshot, archive)
+
+        tar_data = subprocess.run(["zstd", "-dc", str(archive)], capture_output=True, check=True).stdout
+        tar_path = Path(tmp) / "backup.tar"
+        tar_path.write_bytes(tar_data)
+        with tarfile.open(tar_path) as tar:
+            members = {m.name: m for m in tar.getmembers()}
+        assert members[".bashrc"].mode == 0o600
+        assert members[".config/kitty/theme-link.conf"].issym()
+        assert ".meowrch-snapshot.json" not in members
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from Builder.utils.step_journal import StepJournal
+
+
+class _LocalJournal(StepJournal):
+    """Journal that writes without sudo"""
+
+    def _write(self) -> None:
+        self.path.write_text(json.dumps({"steps": self._steps}))
+
+
+def test_journal_resumes_only_steps_with_same_inputs():
+    with tempfile.TemporaryDirectory() as tmp:
+        journal = _LocalJournal(Path(tmp)).load()
+        packages_hash = StepJournal.hash_inputs("rev1", (["git", "cava"], ["yay"]), "yay")
+        journal.mark_done("packages", packages_hash)
+
+        resumed = _LocalJournal(Path(tmp)).load()
+        assert resumed.is_done("packages", packages_hash)
+        assert not resumed.is_done("dotfiles", packages_hash)
+
+        changed = StepJournal.hash_inputs("rev1", (["git", "cava", "btop"], ["yay"]), "yay")
+        assert not resumed.is_done("packages", changed), "Changed inputs must rerun the step"
+
+        resumed.forget("packages")
+        assert not _LocalJournal(Path(tmp)).load().is_done("packages", packages_hash)
+
+
+def test_unreadable_journal_starts_from_scratch():
+    with tempfile.TemporaryDirectory() as tmp:
+        (Path(tmp) / StepJournal.FILE_NAME).write_text("{broken")
+        journal = _LocalJournal(Path(tmp)).load()
+        assert not journal.is_done("packages", StepJournal.hash_inputs())
+
+
+def test_file_hash_follows_uncommitted_edits():
+    with tempfile.TemporaryDirectory() as tmp:
+        packages = Path(tmp) / "packages.py"
+        packages.write_text('common = ["git"]\n')
+        before = StepJournal.hash_files(packages)
+        assert StepJournal.hash_files(packages) == before
+
+        packages.write_text('common = ["git", "btop"]\n')
+        assert StepJournal.hash_files(packages) != before
+        assert StepJournal.hash_files(Path(tmp) / "missing.py") != before